@@ -1,15 +1,26 @@
 """
-seed_loader.py
+Logger.py
 Mehran Ali Banka - Sep 2023
 ----------------------------
 This is a Logging class created by using the logging library in python
 For this purpose of this project, this will only output to a local file
+In queue mode, records are handed off to a background writer thread,
+which formats and writes them in batches, so logging never stalls the
+crawl. The queue is bounded, info records that do not fit are dropped
+and counted. Warnings, errors and the records logged with summary()
+are never dropped, they wait for room on the queue. Records logged
+after close are appended to the file directly.
+The json format writes one json object per line.
 """
+import atexit
+import json
 import logging
+import queue
+import threading
 
 class Logger:
-    def __init__(self, name, log_file=None):
-        
+    def __init__(self, name, log_file=None, queue_mode=False, queue_size=10000, json_format=False, flush_interval=1.0):
+
         # create an instance of the logging object
         # with a specific name
         self.logger = logging.getLogger(name)
@@ -17,34 +28,176 @@ class Logger:
         self.logger.setLevel(logging.DEBUG)
 
         # Create a formatter for the log messages
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        if json_format: formatter = JsonFormatter()
+        else: formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
         # Create the file handler. The code ensures that a log file is supplied
         # It takes the default value from the Parameters.py file if not overriden
-        
-        fh = logging.FileHandler(log_file)
+
+        if queue_mode:
+            fh = BatchingHandler(log_file, queue_size, flush_interval)
+            atexit.register(fh.close)
+        else:
+            fh = logging.FileHandler(log_file)
         fh.setFormatter(formatter)
+        self.handler = fh
         self.logger.addHandler(fh)
-        
-    def warning(self, message):
-        self.logger.warning(message)
 
-    def info(self, message):
-        self.logger.info(message)
-    
-    def critical(self, message):
-        self.logger.critical(message)
+    # The message can be a format string with {} fields, filled in
+    # with args only when the record is written
+    def warning(self, message, *args):
+        self.logger.warning(lazy_message(message, args))
+
+    def info(self, message, *args):
+        self.logger.info(lazy_message(message, args))
+
+    # An info record that is never dropped, e.g. the crawl summary
+    def summary(self, message, *args):
+        self.logger.info(lazy_message(message, args), extra={"keep": True})
 
-    def error(self, message):
-        self.logger.error(message)
+    def critical(self, message, *args):
+        self.logger.critical(lazy_message(message, args))
+
+    def error(self, message, *args):
+        self.logger.error(lazy_message(message, args))
 
     def end_section(self):
-        self.logger.info(("=")*100)    
+        self.summary(("=")*100)
+
+    # Write what is left and detach the file, so a logger of the same
+    # name made by a later crawl of the process does not write twice
+    def close(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+        if isinstance(self.handler, BatchingHandler): atexit.unregister(self.handler.close)
+
+    # No of records dropped because the queue was full
+    def dropped(self):
+        return getattr(self.handler, "dropped", 0)
+
+
+def lazy_message(message, args):
+    if len(args) == 0: return message
+    return BraceMessage(message, args)
+
+
+class BraceMessage:
+    # str.format is only run when the record is written
+    def __init__(self, fmt, args):
+        self.fmt = fmt
+        self.args = args
+
+    def __str__(self):
+        return self.fmt.format(*self.args)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({"time": record.created,
+                           "name": record.name,
+                           "level": record.levelname,
+                           "message": record.getMessage()})
+
+
+class BatchingHandler(logging.Handler):
+    # Puts the records on a bounded queue. A background thread writes
+    # them to the file in batches, flushing once per batch
+    def __init__(self, log_file, queue_size, flush_interval, batch_size=500):
+        super().__init__()
+        self.path = log_file
+        self.stream = open(log_file, 'a', encoding='utf-8')
+        self.records = queue.Queue(maxsize=queue_size)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.dropped = 0
+        # emit runs on every thread that logs
+        self.dropped_lock = threading.Lock()
+        self.closed = False
+        self.write_lock = threading.Lock()
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def emit(self, record):
+        # after close, e.g. a record logged at exit, write it directly
+        if self.closed:
+            self.append([record])
+            return
+        # warnings, errors and the summary wait for room instead of being dropped
+        if record.levelno >= logging.WARNING or getattr(record, "keep", False):
+            self.records.put(record)
+            return
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.drop()
+
+    def drop(self):
+        with self.dropped_lock:
+            self.dropped = self.dropped + 1
+
+    def write_loop(self):
+        while True:
+            try:
+                record = self.records.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self.closed: return
+                continue
+            # the writer is told to stop with a None
+            if record is None: return
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.records.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    self.write_batch(batch)
+                    return
+                batch.append(record)
+            self.write_batch(batch)
+
+    def write_batch(self, batch):
+        text = self.format_batch(batch)
+        with self.write_lock:
+            if self.stream.closed: return
+            self.stream.write(text)
+            self.stream.flush()
+
+    # Append records to the file once the stream is closed
+    def append(self, batch):
+        text = self.format_batch(batch)
+        with self.write_lock:
+            with open(self.path, 'a', encoding='utf-8') as file: file.write(text)
+
+    def format_batch(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.format(record) + "\n")
+            except Exception:
+                self.handleError(record)
+        return "".join(lines)
+
+    # Write what is left on the queue, stop the writer and close the file
+    def close(self):
+        if self.closed: return
+        self.closed = True
+        self.records.put(None)
+        self.writer.join()
+        with self.write_lock:
+            self.stream.close()
+        # records put on the queue while it was closing
+        leftover = []
+        while True:
+            try:
+                record = self.records.get_nowait()
+            except queue.Empty:
+                break
+            if record is not None: leftover.append(record)
+        if len(leftover) > 0: self.append(leftover)
+        super().close()
 
-    
 
 if __name__ == '__main__':
     # Create an instance of the logger
     logger = Logger('my_logger', 'my_log.log')
-
-
@@ -19,15 +19,45 @@ max_number_of_seeds = 20
 # Seeding strategy (number assigned to different strategies)
 seeding_strategy = "READ_FROM_PRE_CREATED_LIST"
 
-# Seed file path
+# Seed file path. A plain text file with one url per line, or the
+# same compressed with gzip or zstd (zstd needs the zstandard package)
 seed_file_path = r"C:/Search_Engines/Crawler/seed_files/seeds.txt.txt"
 
+# Crawlers reading the same seed list in parallel each take one shard:
+# seed_shard_index of seed_shard_count, split by host
+seed_shard_index = 0
+seed_shard_count = 1
+
+# Seeds are deduped in a bloom filter sized for seed_dedup_capacity
+# urls (or max_number_of_seeds, if fewer), with a share
+# seed_dedup_error_rate of new urls taken for dups
+seed_dedup_capacity = 1 << 24
+seed_dedup_error_rate = 0.001
+
+# GET_FROM_SEARCH_ENGINE seeding: every query is sent to the endpoint,
+# which answers with up to search_engine_results_per_query urls.
+# Run seed_loader.py <url file> [port] for a local stand-in service
+search_engine_endpoint = "http://127.0.0.1:8765/search"
+search_engine_queries = ["news", "weather", "recipes", "travel", "sports", "music"]
+search_engine_results_per_query = 50
+search_engine_timeout = 10
+
 # Max pages to sample
 max_number_of_pages_to_sample = 15000
 
 # Max no of pages to sample per seed
 max_pages_per_seed = 2000 # was 3k
 
+# Max seconds a seed is crawled for, from when it is started
+max_seconds_per_seed = 1800
+
+# No of seeds crawled at once. They take turns, each getting
+# seed_time_quantum seconds of crawling per turn (deficit round robin),
+# and the progress of every seed is logged every seed_progress_interval seconds
+max_active_seeds = 4
+seed_time_quantum = 1.0
+seed_progress_interval = 60
+
 # Root folder to save the downloaded files
 file_download_root = r"C:/Search_Engines/Crawler/crawled_files/"
 
@@ -44,8 +74,206 @@ max_pages_per_domain = 20
 ls = [".gov",".uk",".mil",".ca",".eu",".state",".org"]
 urls_to_avoid = set(ls)
 
+# Public suffix list (https://publicsuffix.org/list/public_suffix_list.dat),
+# used to find the registered domain of a host (e.g. bbc.co.uk, not co.uk).
+# Without it the domain is the last two labels of the host
+public_suffix_list_path = r"C:/Search_Engines/Crawler/geo/public_suffix_list.dat"
+
+# max no of hosts whose domain and filter verdicts are kept in memory
+url_filter_max_hosts = 100000
+
 # crawl max requests per second. To prevent from being marked as a DDoS
 max_requests_per_second = 4
 
 # max children that we fetch per page
-max_child_per_page = 10
\ No newline at end of file
+max_child_per_page = 10
+
+# Crawl mode. "SYNC" fetches one url at a time, "ASYNC" drives
+# the frontier with an asyncio engine and several requests in flight,
+# "DISTRIBUTED" splits the hosts over several worker processes
+crawl_mode = "SYNC"
+
+# max no of http requests in flight at once, in the ASYNC crawl mode
+max_in_flight_requests = 16
+
+# Pages fetched while scoring a url are kept for reuse when it is parsed.
+# Max no of pages kept, max total size of their bodies (bytes), and
+# max age (seconds) before a kept page is dropped and fetched again
+response_store_max_entries = 2000
+response_store_max_bytes = 256*1024*1024
+response_store_max_age = 900
+
+# robots.txt cache: seconds a host's rules are kept, seconds an
+# unreachable robots.txt is remembered, and max no of hosts kept
+robots_cache_ttl = 3600
+robots_cache_negative_ttl = 300
+robots_cache_max_entries = 10000
+
+# Geolocation strategy. "LOCAL_TABLE" looks the country up in the
+# ip -> country csv file below, "IPINFO_API" asks ipinfo.io once for
+# every ip (kept for as many ips as the DNS cache keeps hosts).
+# If the file cannot be read, every country is 'NA', or with
+# geolocation_fallback_to_api the crawl asks ipinfo.io instead
+geolocation_strategy = "LOCAL_TABLE"
+geolocation_fallback_to_api = False
+
+# ip -> country table, csv rows of start_ip,end_ip,country
+geo_ip_table_path = r"C:/Search_Engines/Crawler/geo/ip_to_country.csv"
+
+# DNS cache: seconds a resolved ip is kept, seconds a failed
+# lookup is remembered, and max no of hosts kept
+dns_cache_ttl = 3600
+dns_cache_negative_ttl = 300
+dns_cache_max_entries = 50000
+
+# Politeness is per host: max_requests_per_second is the rate of each
+# host's token bucket, and a host can take this many requests in a burst
+politeness_burst_size = 1
+
+# Adaptive rate of every host: cut by politeness_backoff on a 429, 503
+# or timeout (once per url, its retries are only paused for their
+# Retry-After), grown back by politeness_rate_increase requests per
+# second after every success, within [politeness_min_rate,
+# politeness_max_rate]. The time spent waiting for hosts is the
+# politeness_wait stage of the metrics
+politeness_min_rate = 1
+politeness_max_rate = 8
+politeness_rate_increase = 0.5
+politeness_backoff = 0.5
+
+# Timeout (seconds) of the requests to a host, from its observed latency,
+# within [fetch_timeout_min, fetch_timeout_max]. fetch_timeout_default
+# is used for a host not seen yet
+fetch_timeout_default = 3
+fetch_timeout_min = 1
+fetch_timeout_max = 10
+
+# No of times a request is tried again after a 429, 5xx or timeout,
+# and the longest Retry-After (seconds) the crawler waits for
+max_fetch_retries = 2
+max_retry_wait = 10
+
+# max no of hosts whose token buckets are kept in memory
+politeness_max_tracked_hosts = 100000
+
+# how deep into the frontier to look for a url whose host has budget
+frontier_scan_depth = 64
+
+# HTTP connection pool: max open connections per host, max no of hosts
+# with kept alive connections, and seconds before an idle host is closed
+max_connections_per_host = 2
+http_pool_max_hosts = 1000
+http_pool_idle_timeout = 60
+
+# Visited set type. "EXACT" keeps every url fingerprint in a hash table,
+# "BLOOM" keeps a scalable bloom filter (much smaller, with a false
+# positive rate of visited_set_error_rate), "MEMORY" a plain python set
+# that is not saved. "EXACT" and "BLOOM" are saved at visited_set_path,
+# so a crawl resumed from its checkpoint (see below) does not refetch
+# urls already seen. A crawl that does not resume starts from an empty set
+visited_set_type = "EXACT"
+visited_set_path = r"C:/Search_Engines/Crawler/state/visited_urls"
+visited_set_initial_capacity = 1 << 20
+visited_set_error_rate = 0.001
+
+# Frontier type. "TIERED" weighs each url once, when queued, and spills
+# to disk (see below). "INDEXED" groups the queued urls by their (country,
+# language, domain) feature class and re-scores a class as soon as the
+# counts of its features change, but keeps every url in memory, so it
+# only suits crawls whose frontier fits in memory
+frontier_type = "TIERED"
+
+# Frontier: max no of entries kept in memory per seed, the rest
+# spill to sorted segment files in frontier_spill_dir. Segments are
+# merged into one when there are more than frontier_max_segments
+frontier_hot_capacity = 100000
+frontier_max_segments = 32
+frontier_spill_dir = r"C:/Search_Engines/Crawler/state/frontier"
+
+# Checkpoint of the crawl state (frontier, domain/language/country
+# counts, counters), saved every checkpoint_interval seconds
+# (0 to disable). resume_from_checkpoint carries on from it on start,
+# unless the crawl it was saved in ran to the end
+checkpoint_path = r"C:/Search_Engines/Crawler/state/checkpoint.json"
+checkpoint_interval = 60
+resume_from_checkpoint = True
+
+# html extractor. "STREAMING" pulls the title and links out of the html
+# in one regex pass, "BEAUTIFULSOUP" builds the full DOM with html.parser
+html_extractor = "STREAMING"
+
+# With the STREAMING extractor, stop reading a page after this many
+# anchors (once its title is found). 0 reads the whole page
+extractor_max_anchor_scan = 0
+
+# No of worker processes for html parsing and language detection.
+# 0 runs them in the crawler process. Most useful with crawl_mode
+# "ASYNC", where several fetch threads hand pages to the pool at once
+cpu_pool_size = 0
+
+# Language detection of the titles: seed of langdetect (fixed, so the
+# same title always gets the same language), no of titles whose result
+# is cached, and the no of characters looked at. Once a domain has
+# language_prior_min_pages pages, its languages are favoured for its
+# ambiguous titles, by language_prior_weight (0 to disable)
+language_detection_seed = 0
+language_cache_size = 100000
+language_max_text_length = 200
+language_prior_weight = 1.0
+language_prior_min_pages = 3
+
+# DISTRIBUTED crawl mode: no of worker processes, no of child urls
+# sent to another worker at once, and max seconds a url waits to be sent.
+# max_number_of_pages_to_sample is split evenly between the workers
+distributed_workers = 4
+distributed_batch_size = 64
+distributed_flush_interval = 0.5
+
+# How the sampled pages are stored. "FILES" saves one file per page,
+# named after its title, "SEGMENTS" packs them into large append only
+# segment files (with a url index) under file_download_root/segments
+storage_format = "SEGMENTS"
+
+# Size (bytes) at which a new segment file is started, and whether
+# page bodies are compressed in the segments
+segment_max_bytes = 1024*1024*1024
+segment_compress = True
+
+# Fetch mode. "STREAMING" checks the content type on the page GET itself
+# (from its headers, or sniffed from the first bytes), "HEAD_THEN_GET"
+# sends a HEAD request first, as before
+fetch_mode = "STREAMING"
+
+# A page download is dropped once the body is bigger than max_page_bytes,
+# or takes longer than max_download_seconds
+max_page_bytes = 5*1024*1024
+max_download_seconds = 10
+
+# Logging. In queue mode, log records are written by a background
+# thread in batches (at least every log_flush_interval seconds), and
+# dropped if more than log_queue_size are waiting. log_format is
+# "TEXT", or "JSON" for one json object per line
+log_queue_mode = True
+log_queue_size = 10000
+log_format = "TEXT"
+log_flush_interval = 1.0
+
+# Incremental recrawl. The ETag, Last-Modified, body hash and simhash of
+# every page are saved in recrawl_db_path (sqlite), the next crawl sends
+# conditional GETs, and pages that did not change are neither parsed nor
+# stored again. Pages within near_duplicate_distance bits (simhash, at
+# most 3) of a page under another url are not sampled
+incremental_recrawl = False
+recrawl_db_path = r"C:/Search_Engines/Crawler/state/recrawl.sqlite"
+near_duplicate_distance = 3
+
+# Metrics of every pipeline stage are written to metrics_snapshot_path
+# with .prom (Prometheus text) and .json extensions, every
+# metrics_snapshot_interval seconds (0 to disable)
+metrics_snapshot_path = r"C:/Search_Engines/Crawler/log_files/crawler_metrics"
+metrics_snapshot_interval = 15
+
+# Seed of the random sampling of links,
+# so that two crawls of the same pages pick the same links.
+# None leaves it unseeded
+random_seed = None
@@ -0,0 +1,116 @@
+"""
+async_engine.py
+----------------------------
+This is an asyncio based fetch engine for the crawler.
+It drives the same priority queue frontier as the synchronous loop in
+crawler.py, but keeps several requests in flight at once.
+The blocking fetch/parse helpers of the crawler are run on a bounded
+thread pool, so the number of requests in flight is capped by
+max_in_flight_requests. Politeness is per host: a host has at most one
+url being fetched at a time, and the frontier hands out urls of hosts
+that have budget left in the HostScheduler (see politeness.py).
+The frontier is any object with push/pop/__len__, e.g. the
+TieredFrontier of frontier.py.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from politeness import pop_ready
+
+
+class AsyncFetchEngine:
+    # score_node(url) -> pq entry (-weight, url, ...) or None
+    # parse_node(url) -> set of child urls
+    # is_new_node(url) -> True if the url was never queued before
+    # mark_visited(url) -> records that the url has been queued
+    # host_key(url) -> the politeness key of the url's host
+    # host_wait_time(url) -> seconds till the url's host has budget
+    # on_progress(frontier, child_count) -> called after every parsed page
+    def __init__(self, score_node, parse_node, is_new_node, mark_visited,
+                 host_key, host_wait_time, max_in_flight, max_scan,
+                 max_pages, time_limit, on_progress=None):
+        self.score_node = score_node
+        self.parse_node = parse_node
+        self.is_new_node = is_new_node
+        self.mark_visited = mark_visited
+        self.host_key = host_key
+        self.host_wait_time = host_wait_time
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_scan = max_scan
+        self.max_pages = max_pages
+        self.time_limit = time_limit
+        self.on_progress = on_progress
+
+    # Crawl starting from a seed, till the frontier is empty or the
+    # page/time budget is used. Returns the no of pages parsed.
+    # A frontier that is not empty resumes a checkpointed crawl
+    # of the seed, child_count pages into it
+    def crawl(self, seed, frontier, child_count=0):
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            return asyncio.run(self.crawl_seed(seed, frontier, child_count, executor))
+
+    async def crawl_seed(self, seed, frontier, child_count, executor):
+        loop = asyncio.get_running_loop()
+        # one request at a time per host
+        host_locks = defaultdict(asyncio.Lock)
+        # wakes up idle workers when the frontier grows or a worker finishes
+        wakeup = asyncio.Event()
+        state = {"child_count": child_count, "active": 0}
+        time_seed_st = time.time()
+
+        def budget_left():
+            return (state["child_count"] <= self.max_pages) and (time.time() - time_seed_st <= self.time_limit)
+
+        def wait_time_of(url):
+            key = self.host_key(url)
+            if key in host_locks and host_locks[key].locked(): return 0.05
+            return self.host_wait_time(url)
+
+        async def score(url):
+            async with host_locks[self.host_key(url)]:
+                entry = await loop.run_in_executor(executor, self.score_node, url)
+            if entry is not None:
+                frontier.push(entry)
+                wakeup.set()
+
+        async def worker():
+            while budget_left():
+                if len(frontier) == 0:
+                    # nothing left to do, and nobody can add more
+                    if state["active"] == 0:
+                        wakeup.set()
+                        return
+                    wakeup.clear()
+                    await wakeup.wait()
+                    continue
+
+                next_node, wait = pop_ready(frontier, wait_time_of, self.max_scan)
+                if next_node is None:
+                    # every host near the top of the frontier is busy
+                    await asyncio.sleep(wait)
+                    continue
+
+                state["active"] = state["active"] + 1
+                state["child_count"] = state["child_count"] + 1
+                try:
+                    async with host_locks[self.host_key(next_node[1])]:
+                        child_nodes = await loop.run_in_executor(executor, self.parse_node, next_node[1])
+                    new_children = []
+                    for child_node in child_nodes or []:
+                        if not self.is_new_node(child_node): continue
+                        # Add to visited before scoring, so that
+                        # other workers do not queue it again
+                        self.mark_visited(child_node)
+                        new_children.append(child_node)
+                    await asyncio.gather(*(score(child_node) for child_node in new_children))
+                    if self.on_progress is not None: self.on_progress(frontier, state["child_count"])
+                except Exception as e:
+                    print(e)
+                finally:
+                    state["active"] = state["active"] - 1
+                    wakeup.set()
+
+        if len(frontier) == 0 and child_count == 0: await score(seed)
+        await asyncio.gather(*(worker() for _ in range(self.max_in_flight)))
+        return state["child_count"]
@@ -0,0 +1,307 @@
+"""
+crawl_throughput.py
+----------------------------
+This is an offline benchmark of the whole crawler. It serves a synthetic
+web graph from local hosts (one port each) and runs a Crawler against
+it in a child process, from a seed file, with Parameters overridden so
+every file of the run goes to a scratch folder.
+The size of the graph, the links per page, the page sizes, the latency,
+the robots.txt rules, the share of 429 and 5xx answers and the languages
+of the titles can all be set. The graph is generated from --seed and the
+crawler's link sampling is seeded with it too, so two runs with the same
+settings crawl the same pages (in the SYNC crawl mode, the other modes
+interleave requests by timing).
+It prints pages/sec, bytes/sec, peak RSS and CPU time of the crawl, and
+the time spent in each stage (from the metrics snapshot, see metrics.py).
+
+Run: python benchmarks/crawl_throughput.py [--pages-per-host N] [--mode ASYNC] ...
+     (--help lists every setting)
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:
+    # not on windows, peak RSS and CPU time are not reported
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# a few titles per language, so the language detection has real text
+TITLES = {
+    "en": ["A short guide to the history of the old city",
+           "How to grow tomatoes in a small garden",
+           "The best hiking trails near the mountains"],
+    "fr": ["Un petit guide de l'histoire de la vieille ville",
+           "Comment cultiver des tomates dans un petit jardin",
+           "Les meilleurs sentiers de randonnée près des montagnes"],
+    "de": ["Ein kurzer Führer durch die Geschichte der Altstadt",
+           "Wie man Tomaten in einem kleinen Garten anbaut",
+           "Die schönsten Wanderwege in der Nähe der Berge"],
+    "es": ["Una breve guía de la historia de la ciudad vieja",
+           "Cómo cultivar tomates en un jardín pequeño",
+           "Las mejores rutas de senderismo cerca de las montañas"],
+    "ru": ["Краткий путеводитель по истории старого города",
+           "Как вырастить помидоры в маленьком саду",
+           "Лучшие пешеходные маршруты рядом с горами"],
+    "ja": ["旧市街の歴史への短いガイド",
+           "小さな庭でトマトを育てる方法",
+           "山の近くの最高のハイキングコース"],
+}
+
+FILLER = ("<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
+          "tempor incididunt ut labore et dolore magna aliqua.</p>\n").encode("utf-8")
+
+
+class WebGraph:
+    # Every page is generated up front from the seed: its title, links,
+    # size, and the status it is served with
+    def __init__(self, hosts, pages_per_host, out_degree, page_bytes, locality,
+                 disallowed_rate, throttle_rate, error_rate, languages, seed):
+        rng = random.Random(seed)
+        self.hosts = hosts
+        self.pages_per_host = pages_per_host
+        # (host, page) -> path, pages behind robots.txt live under /private/
+        self.paths = {}
+        for host in range(hosts):
+            for page in range(pages_per_host):
+                private = page > 0 and rng.random() < disallowed_rate
+                self.paths[(host, page)] = "/private/page/{}".format(page) if private else "/page/{}".format(page)
+        # (host, path) -> (status, title, links, size)
+        self.pages = {}
+        for (host, page), path in self.paths.items():
+            status = 200
+            if page > 0:
+                draw = rng.random()
+                if draw < throttle_rate: status = 429
+                elif draw < throttle_rate + error_rate: status = 503
+            title = "{} {}".format(rng.choice(TITLES[rng.choice(languages)]), page)
+            links = []
+            for _ in range(out_degree):
+                target = host if rng.random() < locality else rng.randrange(hosts)
+                links.append((target, rng.randrange(pages_per_host)))
+            size = max(512, int(rng.expovariate(1.0 / page_bytes)))
+            self.pages[(host, path)] = (status, title, links, size)
+        self.ports = []
+
+
+class GraphHandler(BaseHTTPRequestHandler):
+    graph = None
+    latency = 0
+    lock = threading.Lock()
+    # what was served, for the report
+    served = {"pages": 0, "bytes": 0, "robots": 0, "errors": 0}
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        host = self.server.host_index
+        if self.path == "/robots.txt":
+            self.count("robots", 0)
+            self.reply(200, "text/plain", b"User-agent: *\nDisallow: /private/\n")
+            return
+        page = self.graph.pages.get((host, self.path))
+        if page is None:
+            self.count("errors", 0)
+            self.reply(404, "text/html", b"<html><head><title>Not Found</title></head></html>")
+            return
+        status, title, links, size = page
+        if status != 200:
+            self.count("errors", 0)
+            self.reply(status, "text/html", b"<html><head><title>Error</title></head></html>")
+            return
+        anchors = "".join('<a href="http://127.0.0.1:{}{}">link</a>\n'.format(self.graph.ports[target], self.graph.paths[(target, target_page)])
+                          for target, target_page in links)
+        head = "<html><head><title>{}</title></head><body>\n{}".format(title, anchors).encode("utf-8")
+        padding = max(0, size - len(head) - len(b"</body></html>"))
+        body = head + (FILLER * (padding // len(FILLER) + 1))[:padding] + b"</body></html>"
+        self.count("pages", len(body))
+        self.reply(200, "text/html; charset=utf-8", body)
+
+    def do_HEAD(self):
+        page = self.graph.pages.get((self.server.host_index, self.path))
+        status = page[0] if page is not None else 404
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.end_headers()
+
+    def reply(self, status, content_type, body):
+        self.send_response(status)
+        if status == 429: self.send_header("Retry-After", "1")
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def count(self, name, size):
+        with self.lock:
+            self.served[name] = self.served[name] + 1
+            if name == "pages": self.served["bytes"] = self.served["bytes"] + size
+
+    def log_message(self, *args):
+        pass
+
+
+def start_hosts(graph, base_port):
+    servers = []
+    for host in range(graph.hosts):
+        # fixed ports, so the urls (and the crawl order) are the same on every run
+        server = ThreadingHTTPServer(("127.0.0.1", base_port + host if base_port else 0), GraphHandler)
+        server.daemon_threads = True
+        server.host_index = host
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        graph.ports.append(server.server_address[1])
+    GraphHandler.graph = graph
+    return servers
+
+
+# Parameters of the crawl under test, every path under scratch
+def crawl_settings(options, scratch, seed_file):
+    return {
+        "seeding_strategy": "READ_FROM_PRE_CREATED_LIST",
+        "seed_file_path": seed_file,
+        "max_number_of_seeds": options.seeds,
+        "max_pages_per_seed": options.max_pages,
+        "max_number_of_pages_to_sample": options.max_pages * options.seeds,
+        "max_pages_per_domain": options.max_pages * options.seeds,
+        "max_requests_per_second": options.rate,
+        "crawl_mode": options.mode,
+        "cpu_pool_size": options.cpu_pool_size,
+        "random_seed": options.seed,
+        "file_download_root": os.path.join(scratch, "crawled_files") + "/",
+        "log_file_path": os.path.join(scratch, "log_files"),
+        "geo_ip_table_path": os.path.join(scratch, "geo.csv"),
+        "visited_set_path": os.path.join(scratch, "state", "visited_urls"),
+        "frontier_spill_dir": os.path.join(scratch, "state", "frontier"),
+        "checkpoint_path": os.path.join(scratch, "state", "checkpoint.json"),
+        "checkpoint_interval": 0,
+        "resume_from_checkpoint": False,
+        "metrics_snapshot_path": os.path.join(scratch, "metrics"),
+        "metrics_snapshot_interval": 5,
+    }
+
+
+# Runs in the child process: a Crawler with the Parameters overridden
+def run_child(settings_path):
+    with open(settings_path, "r", encoding="utf-8") as file: settings = json.load(file)
+    sys.path.insert(0, ROOT)
+    from crawler import Crawler
+    stats = Crawler(**settings["parameters"]).run()
+    with open(settings["result_path"], "w", encoding="utf-8") as file:
+        json.dump({"pages_explored": stats["pages_explored"],
+                   "pages_sampled": stats["pages_sampled"],
+                   "urls_seen": stats["urls_seen"]}, file)
+
+
+# Stage timings of the crawl, adding up the snapshots of every
+# worker in the DISTRIBUTED crawl mode
+def load_stages(metrics_path):
+    stages = {}
+    for path in glob.glob(metrics_path + "*.json"):
+        with open(path, "r", encoding="utf-8") as file: snapshot = json.load(file)
+        for stage, stats in snapshot["stages"].items():
+            total = stages.setdefault(stage, {"count": 0, "total_seconds": 0.0})
+            total["count"] = total["count"] + stats["count"]
+            total["total_seconds"] = total["total_seconds"] + stats["total_seconds"]
+    return stages
+
+
+def run_benchmark(options):
+    graph = WebGraph(options.hosts, options.pages_per_host, options.out_degree, options.page_bytes,
+                     options.locality, options.disallowed_rate, options.throttle_rate, options.error_rate,
+                     options.languages.split(","), options.seed)
+    GraphHandler.latency = options.latency
+    servers = start_hosts(graph, options.base_port)
+
+    scratch = tempfile.mkdtemp(prefix="crawl_bench_")
+    os.makedirs(os.path.join(scratch, "log_files"))
+    seed_file = os.path.join(scratch, "seeds.txt")
+    with open(seed_file, "w") as file:
+        for host in range(options.seeds):
+            file.write("http://127.0.0.1:{}/page/0\n".format(graph.ports[host % graph.hosts]))
+    with open(os.path.join(scratch, "geo.csv"), "w") as file:
+        file.write("127.0.0.0,127.255.255.255,ZZ\n")
+    settings_path = os.path.join(scratch, "settings.json")
+    result_path = os.path.join(scratch, "result.json")
+    parameters = crawl_settings(options, scratch, seed_file)
+    with open(settings_path, "w", encoding="utf-8") as file:
+        json.dump({"parameters": parameters, "result_path": result_path}, file)
+
+    # fixed hash seed, so sets of urls are iterated in the same order
+    env = dict(os.environ, PYTHONHASHSEED=str(options.seed))
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+    started = time.time()
+    subprocess.run([sys.executable, os.path.abspath(__file__), "--child", settings_path], env=env, cwd=ROOT)
+    elapsed = time.time() - started
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+    for server in servers: server.shutdown()
+
+    if not os.path.exists(result_path):
+        print("The crawl failed, see the logs under {}".format(scratch))
+        return
+    with open(result_path, "r", encoding="utf-8") as file: result = json.load(file)
+    stages = load_stages(parameters["metrics_snapshot_path"])
+    served = GraphHandler.served
+
+    print("mode {}, seed {}, {} hosts x {} pages, out degree {}, latency {}s".format(
+        options.mode, options.seed, options.hosts, options.pages_per_host, options.out_degree, options.latency))
+    print("pages visited {:>7}, sampled {:>7}, urls seen {:>7}".format(
+        result["pages_explored"], result["pages_sampled"], result["urls_seen"]))
+    print("pages served  {:>7}, errors {:>7}, robots.txt {:>5}".format(served["pages"], served["errors"], served["robots"]))
+    print("wall time     {:9.2f}s".format(elapsed))
+    print("pages/sec     {:9.1f}".format(served["pages"] / elapsed))
+    print("bytes/sec     {:9.0f}".format(served["bytes"] / elapsed))
+    if resource:
+        # ru_maxrss is in kilobytes on linux, bytes on macos
+        peak_rss = usage_after.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        cpu_time = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+        print("peak RSS      {:9.1f} MB".format(peak_rss / (1 << 20)))
+        print("CPU time      {:9.2f}s ({:.0f}% of wall time)".format(cpu_time, 100 * cpu_time / elapsed))
+    print("stage breakdown:")
+    for stage, stats in sorted(stages.items(), key=lambda item: -item[1]["total_seconds"]):
+        print("  {:<20} {:>7} calls {:9.3f}s {:6.1f}% of wall time".format(
+            stage, stats["count"], stats["total_seconds"], 100 * stats["total_seconds"] / elapsed))
+
+    if options.keep: print("files of the run kept under {}".format(scratch))
+    else: shutil.rmtree(scratch, ignore_errors=True)
+
+
+def parse_options(argv):
+    parser = argparse.ArgumentParser(description="Offline crawl benchmark over a synthetic web graph")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--seed", type=int, default=42, help="seed of the graph and of the crawl")
+    parser.add_argument("--hosts", type=int, default=8)
+    parser.add_argument("--pages-per-host", type=int, default=250)
+    parser.add_argument("--out-degree", type=int, default=12, help="links per page")
+    parser.add_argument("--locality", type=float, default=0.7, help="share of links to the same host")
+    parser.add_argument("--page-bytes", type=int, default=16 * 1024, help="mean page size")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds added to every request")
+    parser.add_argument("--disallowed-rate", type=float, default=0.05, help="share of pages behind robots.txt")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="share of pages answering 429")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of pages answering 503")
+    parser.add_argument("--languages", default="en,fr,de,es,ru,ja", help="languages of the titles")
+    parser.add_argument("--seeds", type=int, default=2, help="no of seed urls")
+    parser.add_argument("--max-pages", type=int, default=300, help="max pages per seed")
+    parser.add_argument("--rate", type=float, default=50, help="max requests per second per host")
+    parser.add_argument("--mode", default="SYNC", choices=["SYNC", "ASYNC", "DISTRIBUTED"])
+    parser.add_argument("--cpu-pool-size", type=int, default=0)
+    parser.add_argument("--base-port", type=int, default=18400, help="port of the first host, 0 for any free port")
+    parser.add_argument("--keep", action="store_true", help="keep the logs and files of the run")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    options = parse_options(sys.argv[1:])
+    if options.child: run_child(options.child)
+    else: run_benchmark(options)
@@ -0,0 +1,73 @@
+"""
+distributed_scaling.py
+----------------------------
+This is a benchmark of the distributed crawl mode (see distributed.py).
+It serves the synthetic web graph of crawl_throughput.py from local
+hosts, crawls it with a Crawler in the DISTRIBUTED crawl mode with
+1, 2, 4 ... worker processes, and prints the pages/sec reached with each.
+The workers run the same code as a real crawl (run_partition and
+Crawler.crawl_partition), with every file of a run in a scratch folder,
+so the numbers show how the shipped crawler scales.
+
+Run: python benchmarks/distributed_scaling.py [--max-workers N] [options of crawl_throughput.py]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import crawl_throughput
+from crawl_throughput import ROOT, GraphHandler, WebGraph, crawl_settings, start_hosts
+
+sys.path.insert(0, ROOT)
+from crawler import Crawler
+
+
+# Crawl the graph with the given no of workers, returns
+# (stats of the crawl, pages served, seconds)
+def run_crawl(options, graph, workers):
+    scratch = tempfile.mkdtemp(prefix="crawl_scaling_")
+    os.makedirs(os.path.join(scratch, "log_files"))
+    seed_file = os.path.join(scratch, "seeds.txt")
+    with open(seed_file, "w") as file:
+        for host in range(options.seeds):
+            file.write("http://127.0.0.1:{}/page/0\n".format(graph.ports[host % graph.hosts]))
+    with open(os.path.join(scratch, "geo.csv"), "w") as file:
+        file.write("127.0.0.0,127.255.255.255,ZZ\n")
+    parameters = crawl_settings(options, scratch, seed_file)
+    parameters.update(crawl_mode="DISTRIBUTED", distributed_workers=workers,
+                      metrics_snapshot_interval=0)
+
+    served_before = GraphHandler.served["pages"]
+    started = time.time()
+    stats = Crawler(**parameters).run()
+    elapsed = time.time() - started
+    shutil.rmtree(scratch, ignore_errors=True)
+    return stats, GraphHandler.served["pages"] - served_before, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scaling of the DISTRIBUTED crawl mode over a synthetic web graph",
+                                     epilog="Any other option is passed to crawl_throughput.py, e.g. --hosts 16")
+    parser.add_argument("--max-workers", type=int, default=4)
+    scaling_options, rest = parser.parse_known_args(sys.argv[1:])
+    # one seed per host by default, so every worker has hosts to start from
+    options = crawl_throughput.parse_options(rest)
+    if "--seeds" not in rest: options.seeds = options.hosts
+
+    graph = WebGraph(options.hosts, options.pages_per_host, options.out_degree, options.page_bytes,
+                     options.locality, options.disallowed_rate, options.throttle_rate, options.error_rate,
+                     options.languages.split(","), options.seed)
+    GraphHandler.latency = options.latency
+    servers = start_hosts(graph, options.base_port)
+
+    workers = 1
+    while workers <= scaling_options.max_workers:
+        stats, served, elapsed = run_crawl(options, graph, workers)
+        print("workers {:>2}: {:>5} pages visited, {:>5} served in {:6.2f}s, {:7.1f} pages/sec, {:>6} urls seen".format(
+            workers, stats["pages_explored"], served, elapsed, served / elapsed, stats["urls_seen"]))
+        workers = workers * 2
+    for server in servers: server.shutdown()
@@ -0,0 +1,115 @@
+"""
+cpu_stage.py
+----------------------------
+This is the CPU bound stage of the crawler: extracting the title and the
+links of a page, detecting the language of its title and, for the
+near duplicate detection, the simhash of its text.
+The language candidates of the title come from a LanguageIdentifier
+(see language_id.py): the crawler's own one in process, and one per
+worker process in the pool, each with its cache of titles.
+With pool_size > 0 the fetched bodies are handed to a pool of worker
+processes, which send back a compact PageSummary (title, language,
+sampled links, size), so one crawl node can use all of its cores while
+the fetch loop keeps going. With pool_size = 0 it runs in process.
+The workers are spawned, not forked: by the time the pool starts its
+first worker the crawler runs threads (log writer, metrics exporter,
+fetch threads), and a process forked while threads hold locks can
+deadlock. Spawned workers start from a fresh interpreter instead.
+Run cpu_stage.py directly to compare the throughput of both.
+"""
+import multiprocessing
+import random
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from link_extractor import extract_streaming, extract_from_soup, header_encoding
+from recrawl_store import simhash
+from language_id import LanguageIdentifier
+
+# The LanguageIdentifier of a worker process, made by init_worker
+worker_identifier = None
+
+
+def init_worker(identifier_settings):
+    global worker_identifier
+    worker_identifier = LanguageIdentifier(*identifier_settings)
+
+
+# Runs in the worker processes, so it only takes and returns plain,
+# picklable data: the body, and the settings of the extractor.
+# With a random_seed the links sampled only depend on the seed and the
+# body, not on which worker process gets the page or in what order.
+# identifier is None in the worker processes, which use their own
+def analyze_page(content, encoding, extractor, max_links, max_anchor_scan, random_seed=None, with_simhash=False, identifier=None):
+    started = time.perf_counter()
+    rng = random.Random(random_seed * 0x100000000 + zlib.crc32(content)) if random_seed is not None else random
+    if extractor == "STREAMING":
+        page = extract_streaming(content, encoding, max_links, max_anchor_scan, rng)
+    else:
+        from bs4 import BeautifulSoup
+        page = extract_from_soup(BeautifulSoup(content, 'html.parser'), max_links, rng)
+    parsed = time.perf_counter()
+    # the crawler picks the language among the candidates, with its domain prior
+    page.language_scores = (identifier or worker_identifier).scores(page.title)
+    page.language = page.language_scores[0][0] if len(page.language_scores) > 0 else 'NA'
+    page.size = len(content)
+    # sent back with the page, as the worker processes have no metrics of their own
+    page.timings = {"html_parse": parsed - started, "language_detection": time.perf_counter() - parsed}
+    if with_simhash:
+        detected = time.perf_counter()
+        page.simhash = simhash(content, encoding)
+        page.timings["simhash"] = time.perf_counter() - detected
+    return page
+
+
+class CpuStage:
+    def __init__(self, pool_size, extractor, max_links, max_anchor_scan, random_seed=None, with_simhash=False, identifier=None):
+        self.pool_size = pool_size
+        self.extractor = extractor
+        self.max_links = max_links
+        self.max_anchor_scan = max_anchor_scan
+        self.random_seed = random_seed
+        self.with_simhash = with_simhash
+        self.identifier = identifier or LanguageIdentifier()
+        self.pages = 0
+        self.executor = None
+        if pool_size > 0:
+            self.executor = ProcessPoolExecutor(max_workers=pool_size,
+                                                mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=init_worker,
+                                                initargs=(self.identifier.settings(),))
+
+    # Title, language and sampled links of a fetched response. Only a
+    # charset the Content-Type header declares is passed on, the page's
+    # own <meta> charset is looked for otherwise (see link_extractor.py)
+    def analyze(self, response):
+        self.pages = self.pages + 1
+        args = (response.content, header_encoding(response.headers.get("content-type")), self.extractor, self.max_links, self.max_anchor_scan, self.random_seed, self.with_simhash)
+        if self.executor is None: return analyze_page(*args, self.identifier)
+        return self.executor.submit(analyze_page, *args).result()
+
+    def close(self):
+        if self.executor is not None: self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Compare pages/sec of the in process path against a process pool
+if __name__ == '__main__':
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    class SamplePage:
+        headers = {"content-type": "text/html; charset=utf-8"}
+        content = ("<html><head><title>Sample page for the benchmark</title></head><body>"
+                   + "".join('<p>paragraph {0}</p><a href="/link/{0}">link {0}</a>'.format(i) for i in range(2000))
+                   + "</body></html>").encode("utf-8")
+
+    pages = 400
+    for pool_size in (0, os.cpu_count() or 1):
+        stage = CpuStage(pool_size, "STREAMING", 10, 0)
+        started = time.time()
+        # several fetch threads hand pages to the stage at once, like the ASYNC crawl mode
+        with ThreadPoolExecutor(max_workers=max(1, pool_size)) as threads:
+            list(threads.map(lambda _: stage.analyze(SamplePage), range(pages)))
+        elapsed = time.time() - started
+        stage.close()
+        print("pool size {:>3}: {:.1f} pages/sec".format(pool_size, pages / elapsed))
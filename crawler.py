@@ -0,0 +1,1180 @@
+"""
+crawler.py
+----------------------------
+This is the crawler, as an object that can be imported and run from
+other code (workers, tests, notebooks) as well as from crawler_main.py.
+A Crawler takes its settings from Parameters.py, and any of them can be
+overridden when it is created, e.g. Crawler(crawl_mode="ASYNC",
+max_pages_per_seed=100). Importing this module has no side effects:
+nothing is read, opened or started until run() is called, and the heavy
+libraries (requests, bs4, langdetect, asyncio) are only imported by the
+code that first needs them. Everything a crawl opens (log files, the process
+pool, the metrics exporter, the stores) is closed when run() returns,
+so a process can run one crawl after the other.
+"""
+import functools
+import itertools
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import types
+import weakref
+from collections import OrderedDict
+from urllib.parse import urlparse
+import Logger
+import Parameters
+import seed_loader
+from response_store import ResponseStore
+from robots_cache import RobotsCache
+from dns_cache import DnsCache
+from geo_locator import GeoLocator
+from politeness import HostScheduler, LatencyTracker, parse_retry_after
+from http_pool import HttpPool, FetchAborted, is_transient_error
+from visited_set import create_visited_set, fingerprint
+from frontier import TieredFrontier, IndexedFrontier
+from cpu_stage import CpuStage
+from language_id import LanguageIdentifier
+from segment_store import SegmentWriter
+from metrics import Metrics, MetricsExporter
+from url_filter import UrlFilter, PublicSuffixList
+from seed_scheduler import SeedScheduler
+from recrawl_store import RecrawlStore, content_hash
+
+# status codes of an overloaded host, the request is tried again later
+TRANSIENT_STATUS_CODES = {429, 502, 503, 504}
+
+# This logger will only log files that get sampled
+logger_name = 'Python-Web-Crawl-1.log'
+
+# check if we want to log all files explored
+sec_logger_name = 'Python-Web-Crawl-all-explored-urls.log'
+
+
+# The settings of a crawl: every value of Parameters.py, with the
+# given overrides. An unknown name is an error, not a new setting
+def new_settings(overrides):
+    settings = types.SimpleNamespace(**{name: value for name, value in vars(Parameters).items()
+                                        if not name.startswith("_") and not isinstance(value, types.ModuleType)})
+    for name, value in overrides.items():
+        if not hasattr(settings, name): raise ValueError("Unknown parameter: {}".format(name))
+        setattr(settings, name, value)
+    return settings
+
+
+class Crawler:
+    # seeds is the list of seed urls, or None to stream them with the
+    # seeding_strategy. search_source is what GET_FROM_SEARCH_ENGINE
+    # gets them from (see seed_loader.py), by default the service at
+    # search_engine_endpoint. worker_id is set in the worker processes of
+    # the DISTRIBUTED crawl mode, which keep files of their own.
+    # Any other keyword overrides a Parameters value
+    def __init__(self, seeds=None, search_source=None, worker_id=None, **overrides):
+        self.params = new_settings(overrides)
+        self.seeds = seeds
+        self.search_source = search_source
+        self.worker_id = worker_id
+        self.is_open = False
+
+    # Crawl with the crawl_mode, then close everything the crawl opened.
+    # Returns the counts of the crawl, see stats
+    def run(self):
+        self.open()
+        try:
+            if(self.params.crawl_mode == "ASYNC"): self.start_crawling_async()
+            elif(self.params.crawl_mode == "DISTRIBUTED"): self.start_crawling_distributed()
+            else: self.start_crawling()
+            return self.stats()
+        finally:
+            self.close()
+
+    def stats(self):
+        return {"pages_explored": self.pages_explored, "pages_sampled": self.pages_sampled,
+                "urls_seen": self.urls_seen(),
+                "seen_languages": self.seen_languages, "seen_geographies": self.seen_geographies,
+                "domain_frequency": self.domain_frequency}
+
+    # No of urls seen, here and by the worker processes of the DISTRIBUTED crawl mode
+    def urls_seen(self):
+        return len(self.visited_nodes) + self.worker_urls_seen
+
+    # Set up the state of a new crawl
+    def open(self):
+        params = self.params
+        suffix = self.file_suffix()
+
+        # Record the start of the crawler
+        self.time_start = time.time()
+
+        # To keep track of visited nodes, by url fingerprint. Kept in a
+        # memory mapped file, so a crawl resumed from the checkpoint of an
+        # interrupted crawl does not revisit them. Any other crawl starts
+        # over, from an empty set (an incremental recrawl fetches every
+        # page again, with conditional GETs)
+        self.visited_nodes = create_visited_set(params.visited_set_type,
+                                                params.visited_set_path + suffix,
+                                                params.visited_set_initial_capacity,
+                                                params.visited_set_error_rate,
+                                                reset=(self.read_checkpoint() is None))
+
+        # To keep track of languages already seen
+        self.seen_languages = {}
+
+        # To keep track of geographies already seen
+        self.seen_geographies = {}
+
+        # To keep a track of visited domains, and their count, in memory
+        self.domain_frequency = {}
+
+        # To keep track of sites that may have been affected by crawling
+        self.do_not_visit_list = set()
+        # Seeds crawled at once by start_crawling, for the summary
+        self.seed_scheduler = None
+
+        # The index of the subfolder where the current file is downloading.
+        # Max no of files under a subfolder is controlled by the
+        # max_files_downloaded_in_same_path parameter
+        self.current_folder_idx = -1
+        self.current_folder_count = 0
+
+        # Keep track of pages sampled
+        self.pages_sampled = 0
+
+        # Keep track of pages explored, useful for
+        # stats as well as PQ weight function
+        self.pages_explored = 0
+
+        # Urls seen by the worker processes, in the DISTRIBUTED crawl mode
+        self.worker_urls_seen = 0
+
+        # Guards the shared counters and maps above, as the ASYNC
+        # crawl mode updates them from several fetch threads
+        self.state_lock = threading.Lock()
+
+        # Pages fetched while scoring a url, reused when the url is parsed
+        self.response_store = ResponseStore(params.response_store_max_entries,
+                                            params.response_store_max_bytes,
+                                            params.response_store_max_age)
+
+        # Seed the sampling of links, so that runs with the same
+        # random_seed crawl the same pages (see benchmarks/crawl_throughput.py)
+        if(params.random_seed is not None): random.seed(params.random_seed)
+
+        # Language of the titles, cached per title, with the
+        # languages seen on each domain as priors
+        self.language_id = LanguageIdentifier(params.language_detection_seed,
+                                              params.language_cache_size,
+                                              params.language_max_text_length,
+                                              params.url_filter_max_hosts,
+                                              params.language_prior_weight,
+                                              params.language_prior_min_pages)
+
+        # Title/link extraction and language detection, run in a pool of
+        # cpu_pool_size worker processes (in process if 0). The workers
+        # are spawned, as the crawler already runs threads (see cpu_stage.py)
+        self.cpu_stage = self.new_cpu_stage()
+
+        # Packs the sampled pages into large segment files, when
+        # storage_format is "SEGMENTS"
+        self.segment_writer = None
+        if(params.storage_format == "SEGMENTS"):
+            segments_dir = params.file_download_root + "segments"
+            if(self.worker_id is not None): segments_dir = segments_dir + "/worker-{}".format(self.worker_id)
+            self.segment_writer = SegmentWriter(segments_dir,
+                                                params.segment_max_bytes,
+                                                params.segment_compress)
+
+        self.recrawl_store = self.new_recrawl_store(params.recrawl_db_path + suffix)
+
+        # Timings of every stage of the pipeline, and rejection counts
+        self.metrics = Metrics()
+
+        # Shared keep-alive connections, used by every request of the crawler
+        self.http_pool = HttpPool(params.max_connections_per_host,
+                                  params.http_pool_max_hosts,
+                                  params.http_pool_idle_timeout)
+
+        # robots.txt rules per scheme + host, so each is fetched once per TTL
+        self.robots_cache = RobotsCache(params.robots_cache_ttl,
+                                        params.robots_cache_negative_ttl,
+                                        params.robots_cache_max_entries,
+                                        http_get=self.http_pool.get)
+
+        # ip address per host, so each host is resolved once per TTL
+        self.dns_cache = DnsCache(params.dns_cache_ttl,
+                                  params.dns_cache_negative_ttl,
+                                  params.dns_cache_max_entries)
+
+        # Initialize the logger
+        self.log_path = params.log_file_path + "/" + logger_name + suffix
+        self.logger = self.new_logger(logger_name + suffix, self.log_path)
+
+        # Parses every url once and runs the is_parsible rules on it, cheapest
+        # first. Registered domains come from the public suffix list
+        self.url_filter = UrlFilter(PublicSuffixList.load(params.public_suffix_list_path, self.logger),
+                                    params.url_filter_max_hosts)
+        self.add_filter_rules()
+
+        # token bucket per host, so that each host gets at most
+        # max_requests_per_second requests to start with. The rate of a host
+        # is cut when it is overloaded, and grows back on success
+        self.host_scheduler = HostScheduler(params.max_requests_per_second,
+                                            params.politeness_burst_size,
+                                            params.politeness_max_tracked_hosts,
+                                            params.politeness_min_rate,
+                                            params.politeness_max_rate,
+                                            params.politeness_rate_increase,
+                                            params.politeness_backoff)
+
+        # timeout of the requests to every host, from its observed latency
+        self.latency_tracker = LatencyTracker(params.fetch_timeout_default,
+                                              params.fetch_timeout_min,
+                                              params.fetch_timeout_max,
+                                              params.politeness_max_tracked_hosts)
+
+        # Frontiers in use, re-scored when the crawl counts change
+        self.live_frontiers = weakref.WeakSet()
+        self.last_checkpoint_time = time.time()
+
+        # Write a snapshot of the metrics every metrics_snapshot_interval seconds
+        self.metrics_exporter = self.new_metrics_exporter(params.metrics_snapshot_path + suffix)
+
+        # Load the ip -> country table, used to find the geography of a page
+        # without a network call
+        self.geo_locator = None
+        self.geolocation_strategy = params.geolocation_strategy
+        if(self.geolocation_strategy == "LOCAL_TABLE"):
+            try:
+                self.geo_locator = GeoLocator.from_csv(params.geo_ip_table_path)
+                self.logger.info("Loaded {} ip ranges from {}".format(len(self.geo_locator), params.geo_ip_table_path))
+            except OSError as e:
+                # without the table every country is 'NA', unless asking
+                # ipinfo.io instead was allowed
+                if(params.geolocation_fallback_to_api):
+                    self.logger.warning("Failed to load the ip -> country table, using ipinfo.io instead: {}".format(e))
+                    self.geolocation_strategy = "IPINFO_API"
+                else:
+                    self.logger.warning("Failed to load the ip -> country table, every country is 'NA': {}".format(e))
+
+        # Countries found with ipinfo.io, per ip, least recently used first,
+        # so an ip is asked for once, not for every page on it
+        self.ip_countries = OrderedDict()
+        self.ip_country_hits = 0
+        self.ip_country_misses = 0
+        self.is_open = True
+
+    # Added to the paths of the files a worker process keeps for itself
+    def file_suffix(self):
+        if(self.worker_id is None): return ""
+        return ".worker-{}".format(self.worker_id)
+
+    # Close everything the crawl opened, the counts stay readable
+    def close(self):
+        if(not(self.is_open)): return
+        self.is_open = False
+        self.cpu_stage.close()
+        if(self.segment_writer is not None): self.segment_writer.close()
+        if(self.recrawl_store is not None): self.recrawl_store.close()
+        if(self.metrics_exporter is not None): self.metrics_exporter.stop()
+        # the saved visited sets are memory mapped, the plain set has nothing to close
+        if(hasattr(self.visited_nodes, "close")): self.visited_nodes.close()
+        self.http_pool.close()
+        self.logger.close()
+
+    # The seeds, streamed with the seeding strategy. Every call starts over
+    # from the first seed, in the same order
+    def seed_list(self):
+        params = self.params
+        if(self.seeds is not None): return iter(self.seeds)
+        search_source = self.search_source
+        if(search_source is None and params.seeding_strategy == "GET_FROM_SEARCH_ENGINE"):
+            search_source = seed_loader.SearchEngineSource(params.search_engine_endpoint,
+                                                           params.search_engine_queries,
+                                                           params.search_engine_results_per_query,
+                                                           params.search_engine_timeout,
+                                                           self.logger)
+        return seed_loader.get_seeder_list(params.seed_file_path, params.seeding_strategy,
+                                           params.max_number_of_seeds,
+                                           params.seed_shard_index, params.seed_shard_count,
+                                           params.seed_dedup_capacity, params.seed_dedup_error_rate,
+                                           search_source)
+
+    # Where the seeds come from, for the log
+    def seed_source(self):
+        params = self.params
+        if(self.seeds is not None): source = "a list of {} seeds".format(len(self.seeds)) if hasattr(self.seeds, "__len__") else "the seeds given"
+        elif(params.seeding_strategy == "GET_FROM_SEARCH_ENGINE"): source = params.search_engine_endpoint if self.search_source is None else type(self.search_source).__name__
+        else: source = params.seed_file_path
+        return "Seeding Strategy : {} , Source : {} , Max Seeds : {} , Shard : {} of {}.".format(
+            params.seeding_strategy, source, params.max_number_of_seeds, params.seed_shard_index, params.seed_shard_count)
+
+    def new_cpu_stage(self):
+        return CpuStage(self.params.cpu_pool_size,
+                        self.params.html_extractor,
+                        self.params.max_child_per_page,
+                        self.params.extractor_max_anchor_scan,
+                        self.params.random_seed,
+                        self.params.incremental_recrawl,
+                        self.language_id)
+
+    # ETag, Last-Modified, body hash and simhash of every page fetched,
+    # kept from crawl to crawl in the incremental_recrawl mode
+    def new_recrawl_store(self, path):
+        if(not(self.params.incremental_recrawl)): return None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return RecrawlStore(path)
+
+    def new_logger(self, name, path):
+        return Logger.Logger(name, path,
+                             queue_mode=self.params.log_queue_mode,
+                             queue_size=self.params.log_queue_size,
+                             json_format=(self.params.log_format == "JSON"),
+                             flush_interval=self.params.log_flush_interval)
+
+    def new_metrics_exporter(self, path):
+        if(self.params.metrics_snapshot_interval <= 0): return None
+        exporter = MetricsExporter(self.metrics, path, self.params.metrics_snapshot_interval)
+        exporter.start()
+        return exporter
+
+    def dump_summary_stats(self):
+        logger = self.logger
+        time_end = time.time()
+        elapsed_time = time_end - self.time_start
+        logger.summary("Stopping Crawler ...")
+        # save the visited set and the buffered pages to disk
+        if(hasattr(self.visited_nodes, "flush")): self.visited_nodes.flush()
+        if(self.segment_writer is not None): self.segment_writer.flush()
+        if(self.recrawl_store is not None): self.recrawl_store.flush()
+        logger.summary(f"Crawling Runtime: {elapsed_time:.6f} seconds")
+        logger.summary("Crawl Mode: {} , CPU Pool Size: {} , Pages/sec: {:.3f}".format(self.params.crawl_mode, self.params.cpu_pool_size, self.pages_explored/elapsed_time if elapsed_time > 0 else 0))
+        logger.end_section()
+
+        logger.summary("---------------- Crawler Statistics: -----------------")
+        logger.summary("Pages Visited : {} , Pages Sampled : {} , Urls Seen : {}.".format(self.pages_explored, self.pages_sampled, self.urls_seen()))
+        logger.summary("Unique Languages : {} , Unique Countries: {} , Unique Domains: {}.".format(len(self.seen_languages), len(self.seen_geographies), len(self.domain_frequency)))
+        logger.summary("Response Store Hits : {} , Misses : {} , Evictions : {}.".format(self.response_store.hits, self.response_store.misses, self.response_store.evictions))
+        logger.summary("Robots Cache Hits : {} , Misses : {} , Unreachable : {}.".format(self.robots_cache.hits, self.robots_cache.misses, self.robots_cache.negative_entries))
+        logger.summary("DNS Cache Hits : {} , Misses : {}.".format(self.dns_cache.hits, self.dns_cache.misses))
+        logger.summary("Geolocation Strategy : {} , Ip Ranges : {} , ipinfo.io Cache Hits : {} , Misses : {}.".format(
+            self.geolocation_strategy, len(self.geo_locator) if self.geo_locator is not None else 0, self.ip_country_hits, self.ip_country_misses))
+        logger.summary("Language Cache Hits : {} , Misses : {} , Script Shortcuts : {} , Domain Priors : {}.".format(self.language_id.hits, self.language_id.misses, self.language_id.script_shortcuts, len(self.language_id.priors)))
+        logger.summary("URL Filter Host Hits : {} , Misses : {} , Public Suffix Rules : {}.".format(self.url_filter.host_hits, self.url_filter.host_misses, self.url_filter.suffixes.rules))
+        logger.summary("Politeness Waits : {} , Hosts Tracked : {} , Backoffs : {} , Slowed Hosts : {}.".format(self.host_scheduler.waits, len(self.host_scheduler.buckets), self.host_scheduler.backoffs, self.host_scheduler.slowed_hosts()))
+        pool_stats = self.http_pool.stats()
+        logger.summary("HTTP Requests : {} , Connections Opened : {} , Reuse Ratio : {:.3f} , Open Connections : {} , Hosts : {}.".format(
+            pool_stats["requests"], pool_stats["connections_opened"], pool_stats["reuse_ratio"], pool_stats["open_connections"], pool_stats["hosts"]))
+        logger.summary("Downloads Aborted : {}.".format(pool_stats["aborted"]))
+        logger.summary("Log Records Dropped : {}.".format(logger.dropped()))
+        if(self.seed_scheduler is not None):
+            logger.summary("Seed Details: ")
+            logger.summary("-----------------")
+            for line in self.seed_scheduler.progress_lines(): logger.summary(line)
+        logger.summary("Stage Details: ")
+        logger.summary("-----------------")
+        for line in self.metrics.summary_lines(): logger.summary(line)
+        logger.summary("Language Details: ")
+        logger.summary("-----------------")
+        for key, value in self.seen_languages.items():
+            logger.summary(f"Language: {key}, Count: {value}")
+        logger.summary("Country Details: ")
+        logger.summary("-----------------")
+        for key, value in self.seen_geographies.items():
+            logger.summary(f"Country: {key}, Count: {value}")
+
+    # Define a method which will return back in a reasonable time
+    # The body is streamed, and the download dropped as soon as the page is
+    # not html, bigger than max_page_bytes or slower than max_download_seconds.
+    # An overloaded host (429, 5xx, timeout) is slowed down and the request
+    # tried again, up to max_fetch_retries times, instead of blacklisting it
+    def submit_http_request(self, url):
+        params = self.params
+        host = self.get_domain_name(url)
+        # If-None-Match/If-Modified-Since of the page saved by the last crawl
+        headers = self.recrawl_store.conditional_headers(url) if self.recrawl_store is not None else None
+        # the rate of the host is cut once per url, the retries of a url
+        # that keeps failing only wait for its Retry-After
+        throttled = False
+        for attempt in range(params.max_fetch_retries + 1):
+            try:
+                # wait till the host has budget for one more request
+                self.wait_for_host(host)
+                # the timeout follows the latency seen from the host
+                with self.metrics.timer("get"):
+                    response = self.http_pool.get_limited(url, self.latency_tracker.timeout(host),
+                                                          params.max_page_bytes,
+                                                          params.max_download_seconds,
+                                                          params.supported_crawl_types,
+                                                          headers)
+            except FetchAborted as e:
+                # not a page we want, but the host is fine
+                self.host_scheduler.on_success(host)
+                return None
+            except Exception as e:
+                if not(is_transient_error(e)):
+                    self.do_not_visit_list.add(url)
+                    return None
+                if(not(throttled)): self.host_scheduler.on_throttle(host)
+                throttled = True
+                self.metrics.count("fetch_retries", "timeout")
+                continue
+            self.latency_tracker.record(host, response.elapsed.total_seconds())
+            if(response.status_code in TRANSIENT_STATUS_CODES):
+                retry_after = parse_retry_after(response.headers.get('retry-after'))
+                if(throttled): self.host_scheduler.pause(host, retry_after)
+                else: self.host_scheduler.on_throttle(host, retry_after)
+                throttled = True
+                self.metrics.count("fetch_retries", str(response.status_code))
+                # do not hold the crawl up for a long pause, the host's
+                # other urls wait in the frontier till it is over
+                if(retry_after is not None and retry_after > params.max_retry_wait): return None
+                continue
+            self.host_scheduler.on_success(host)
+            # Check if the request was successful
+            if response.status_code >= 400:
+                self.do_not_visit_list.add(url)
+                return None
+            return response
+        # still overloaded after the retries, the url is given up for now
+        return None
+
+    # Wait till the host has budget for one more request, the
+    # time spent waiting goes to the politeness_wait metric
+    def wait_for_host(self, host):
+        delay = self.host_scheduler.acquire(host)
+        if(delay > 0): self.metrics.observe("politeness_wait", delay)
+
+    def not_supported_or_responsive_type(self, url):
+        # Check if the content is of one of the supported types
+        try:
+            if(self.request_not_allowed(url)): return True
+            # The content type is checked on the GET itself, no HEAD needed
+            if(self.params.fetch_mode == "STREAMING"): return False
+            host = self.get_domain_name(url)
+            self.wait_for_host(host)
+            try:
+                with self.metrics.timer("head"):
+                    response = self.http_pool.head(url,timeout=self.latency_tracker.timeout(host))
+            except Exception as e:
+                if(is_transient_error(e)): self.host_scheduler.on_throttle(host)
+                raise
+            self.latency_tracker.record(host, response.elapsed.total_seconds())
+            if(response.status_code in TRANSIENT_STATUS_CODES):
+                self.host_scheduler.on_throttle(host, parse_retry_after(response.headers.get('retry-after')))
+            else: self.host_scheduler.on_success(host)
+            # The server is not responsive
+            if(self.is_bad_response(response,url)): return True
+            content_type = response.headers.get('content-type').split(";")[0]
+            # Check if the Content-Type header indicates HTML
+            if not(content_type and content_type.lower() in self.params.supported_crawl_types): return True
+        except Exception as e:
+            print(e)
+            return True
+        return False
+
+    def not_allowed_to_crawl(self, url):
+        # Check the robot status, the robots.txt file
+        # is fetched once per host and cached
+        try:
+            # Check if the URL can be crawled
+            with self.metrics.timer("robots"):
+                allowed = self.robots_cache.can_fetch(url)
+            if not(allowed): return True
+        except Exception as e: return True
+        return False
+
+    # True if the host is under one of the top level domains to avoid
+    def is_sensitive(self, record):
+        for label in record.host.split("."):
+            if("." + label in self.params.urls_to_avoid): return True
+        return False
+
+    # The registered domain of the url, the key used by domain_frequency
+    # and by the per host politeness
+    def get_domain_name(self, url):
+        return self.url_filter.domain_of(url)
+
+    def domain_frequency_exceeded(self, record):
+        return self.domain_frequency.get(record.domain, 0) >= self.params.max_pages_per_domain
+
+    # The rules of is_parsible, by cost: string checks, then lookups that
+    # are decided once per host, then the rules needing a network call
+    def add_filter_rules(self):
+        url_filter = self.url_filter
+        # if the length of the url is greater than 100
+        url_filter.add_rule("too_long", 0, lambda record: len(record.url) > 100)
+        # Check if it is a query string, or a useless link
+        url_filter.add_rule("query_string", 0, lambda record: "?" in record.url or "#" in record.url or "%" in record.url or "@" in record.url)
+        # if in no visit list, dont visit
+        # maybe moved there due to rate limit voilations
+        url_filter.add_rule("do_not_visit", 1, lambda record: self.request_not_allowed(record.url))
+        # If the url is password protected, do not crawl, catch it only the fly ig
+        url_filter.add_rule("sensitive", 1, self.is_sensitive, memo="HOST")
+        # a domain that reached its cap stays capped
+        url_filter.add_rule("domain_cap", 1, self.domain_frequency_exceeded, memo="REJECTION")
+        # The robot.txt file does not allow to crawl
+        # The robot.txt file is cached per host, see robots_cache.py
+        url_filter.add_rule("robots_disallowed", 2, lambda record: self.not_allowed_to_crawl(record.url))
+        # The url is either not one of the supported types (like .html)
+        # or is not responsive, or is password protected
+        url_filter.add_rule("unsupported_or_unresponsive", 3, lambda record: self.not_supported_or_responsive_type(record.url))
+
+    # Check against the rules of url_filter, see add_filter_rules
+    def is_parsible(self, node):
+        try:
+
+            if(self.params.log_all_explored_files):
+                self.logger.info(" visited ========>{}", node)
+            with self.state_lock:
+                self.pages_explored = self.pages_explored + 1
+
+            reason = self.url_filter.check(node)
+            if(reason is not None): return self.reject(reason)
+        except Exception as e:
+            print(e)
+        return True
+
+    # Count the reason a url was rejected, for the metrics
+    def reject(self, reason):
+        self.metrics.count("rejected", reason)
+        return False
+
+    # Save and log the file
+    def download_file(self, page, response, url):
+        try:
+            # pages without a title are not saved
+            if(page.title is None): raise ValueError("No title found in " + url)
+
+            if(self.segment_writer is not None):
+                # append the page to the current segment
+                with self.metrics.timer("disk_write"):
+                    self.segment_writer.write(url, response.status_code, response.headers, response.content, page.title)
+            else:
+                with self.metrics.timer("disk_write"): self.save_page_file(page,response,url)
+
+            with self.state_lock:
+                self.pages_sampled = self.pages_sampled + 1
+            # Log the url entry
+            self.logger.info("URL Sampled: {}, Size: {}", url, len(response.content))
+
+            # remembered for the next crawl only once it is stored
+            if(self.recrawl_store is not None):
+                self.recrawl_store.save(url, response.headers.get('etag'), response.headers.get('last-modified'),
+                                        content_hash(response.content), page.simhash, page)
+
+        except Exception as e:
+            print(e)
+
+    # Save the page as a file of its own, named after its title
+    def save_page_file(self, page, response, url):
+        # determine if we need to create a new subfolder
+        make_new_folder = False
+        with self.state_lock:
+            if((self.current_folder_count >= self.params.max_files_downloaded_in_same_path) or (self.current_folder_idx == -1)):
+                self.current_folder_idx = self.current_folder_idx + 1
+                make_new_folder = True
+                self.current_folder_count = 0
+            self.current_folder_count = self.current_folder_count + 1
+            folder_path = self.params.file_download_root + str(self.current_folder_idx)
+
+        if(make_new_folder):
+            try:
+                os.makedirs(folder_path, exist_ok=True)  # Create the folder, and don't raise an error if it already exists
+            except OSError as e:
+                # there is no point saving the page
+                self.logger.error("Failed to create the dir to save the crawled files --- exiting ")
+                raise
+
+        file_name = str(page.title)
+        # remove all whitespaces for windows safety
+        file_name = "".join(file_name.split())
+
+        # check it contains illegal windows filename chars
+        illegal_file_pattern = r'[<>:"/\\|?*]'
+
+        # if its illegal, store it with a temp name
+        if re.search(illegal_file_pattern, file_name): file_name = "file-" + str(self.pages_explored) + ".html"
+        file_path = folder_path + "/" + str(file_name)
+
+        with open(file_path, mode='wb') as localfile: localfile.write(response.content)
+
+    # Country of the ip from ipinfo.io, cached per ip. A failed
+    # lookup gives 'NA' and is asked again the next time
+    def ipinfo_country(self, ip):
+        with self.state_lock:
+            if(ip in self.ip_countries):
+                self.ip_countries.move_to_end(ip)
+                self.ip_country_hits = self.ip_country_hits + 1
+                return self.ip_countries[ip]
+            self.ip_country_misses = self.ip_country_misses + 1
+        geolocation_url = f"https://ipinfo.io/{ip}/json"
+        location_response = self.http_pool.get(geolocation_url,timeout=1)
+        if location_response.status_code != 200: return 'NA'
+        country = location_response.json().get('country')
+        with self.state_lock:
+            self.ip_countries[ip] = country
+            while(len(self.ip_countries) > self.params.dns_cache_max_entries): self.ip_countries.popitem(last=False)
+        return country
+
+    # Update the stats for the crawled URL
+    def work_statistics(self, response, page, url, log_entry):
+
+        country = 'NA'
+
+        # Domain
+        domain_name_cleaned = self.get_domain_name(url)
+
+        # Language, the candidates found by the cpu stage along with the
+        # title, weighed by the languages already seen on the domain
+        if(page.language_scores is not None): language = self.language_id.choose(page.language_scores, domain_name_cleaned)
+        elif(page.language is not None): language = page.language
+        else: language = self.language_id.detect(page.title, domain_name_cleaned)
+
+        # Geography
+        try:
+            # Try to get the geography of the node
+            with self.metrics.timer("dns"):
+                ip = self.dns_cache.resolve(urlparse(url).hostname)
+            if(ip is None): country = 'NA'
+            elif(self.geolocation_strategy == "LOCAL_TABLE"):
+                # look up the local ip -> country table
+                with self.metrics.timer("geolocation"):
+                    if(self.geo_locator is not None): country = self.geo_locator.lookup(ip) or 'NA'
+            else:
+                # use ipinfo data to get locations
+                with self.metrics.timer("geolocation"): country = self.ipinfo_country(ip)
+        except Exception as e:
+            country = 'NA'
+            print(e)
+
+        domain_name = domain_name_cleaned
+
+        # Log all this information,only when actually parsing the URL
+        if log_entry:
+            # features seen for the first time, which changes the weight of their classes
+            first_seen = []
+            with self.state_lock:
+                if(not(country) in self.seen_geographies):
+                    self.seen_geographies[country] = 1
+                    first_seen.append((0, country))
+                else: self.seen_geographies[country] = self.seen_geographies[country] + 1
+
+                self.language_id.observe(domain_name, language)
+                if(not(language) in self.seen_languages):
+                    self.seen_languages[language] = 1
+                    first_seen.append((1, language))
+                else: self.seen_languages[language] = self.seen_languages[language] + 1
+
+                if(not(domain_name) in self.domain_frequency):
+                    self.domain_frequency[domain_name] = 1
+                    first_seen.append((2, domain_name))
+                else: self.domain_frequency[domain_name] = self.domain_frequency[domain_name] + 1
+
+                # Log the country and lang for the Url
+                self.logger.info("Country: {}, Language: {}", country, language)
+            self.rescore_frontiers(first_seen)
+
+        # return these for the helper methods
+        return [country,language,domain_name]
+
+    # Return a unique signature for a url, for hashing purposes
+    # Returns a stable 64 bit fingerprint of the URL, the same in every run
+    # Pages with diff URLs, but the same content are caught by their
+    # simhash instead, in the incremental_recrawl mode (see recrawl_store.py)
+    def signature(self, url):
+        return fingerprint(url)
+
+    # Get the title, language and up to max_child_per_page random links
+    # of the page, with the extractor selected by html_extractor
+    def extract_page(self, response):
+        page = self.cpu_stage.analyze(response)
+        for stage, seconds in page.timings.items(): self.metrics.observe(stage, seconds)
+        return page
+
+    # Fetch the url and get its page. In the incremental_recrawl mode, a
+    # page not modified since the last crawl (304, or the same body hash) is
+    # not parsed again: the summary saved then is used, marked unchanged.
+    # Other pages are saved in the recrawl store by download_file, once stored.
+    # Returns (response, page), or (None, None) if the fetch failed
+    def fetch_page(self, url):
+        response = self.submit_http_request(url)
+        if(self.is_bad_response(response,url)): return None, None
+        recrawl_store = self.recrawl_store
+        if(recrawl_store is None): return response, self.extract_page(response)
+
+        if(response.status_code == 304):
+            page = recrawl_store.page(url)
+            if(page is None): return None, None
+            page.unchanged = True
+            self.metrics.count("recrawl", "not_modified")
+            self.metrics.count("recrawl_bytes_saved", "not_modified", page.size or 0)
+            return response, page
+
+        body_hash = content_hash(response.content)
+        if(body_hash == recrawl_store.content_hash_of(url)):
+            page = recrawl_store.page(url)
+            page.unchanged = True
+            self.metrics.count("recrawl", "unchanged")
+            return response, page
+
+        page = self.extract_page(response)
+        # the same content may have been seen under another url
+        if(page.simhash is not None):
+            page.duplicate_of = recrawl_store.find_near_duplicate(url, page.simhash, self.params.near_duplicate_distance)
+            if(page.duplicate_of is not None): self.metrics.count("recrawl", "near_duplicate")
+        return response, page
+
+    # Save the page in the output folder given in params
+    # Find and return the child urls
+    # Add to the Logger
+    # Update languages, domains, and geography maps
+    def parse_node(self, url):
+        # all child nodes to be returned
+        child_nodes = set()
+        # update pages explored
+        try:
+            # Reuse the page fetched while scoring the url, if still stored
+            stored = self.response_store.take(url)
+            if(stored is not None):
+                response, page = stored
+            else:
+                if(self.request_not_allowed(url)): return child_nodes
+                response, page = self.fetch_page(url)
+            # Check if the request was successful
+            # and not password protected
+            if(not(self.is_bad_response(response,url))):
+                # download and save the file, unless saved by a previous
+                # crawl or a near duplicate of a page already seen
+                if(not(page.unchanged) and page.duplicate_of is None): self.download_file(page,response,url)
+                # update geo,language etc
+                self.work_statistics(response,page,url,True)
+
+                for next_node in page.links:
+                    # Get the unique signature for the node
+                    # See if the url is relative,also avoid self loops
+                    if(next_node == '/'): continue
+                    if('http' not in next_node): next_node = url + next_node # it was a relative URL
+                    if(self.signature(next_node) not in self.visited_nodes): child_nodes.add(next_node)
+
+        except Exception as e:
+            print(e)
+            return child_nodes
+        return child_nodes
+
+    # Returns true if the code has blacklisted a url
+    def request_not_allowed(self, url):
+        if(url in self.do_not_visit_list): return True
+        return False
+
+    # Return true if the response was not polite.
+    # Also blacklists aggressive sites
+    def is_bad_response(self, response, url):
+        if(response is None): return True
+        status_code = response.status_code
+        # Have sent too many requests to this URL. The host is
+        # slowed down by submit_http_request, not blacklisted
+        if(status_code == 429): return True
+        if(status_code >= 400): return True
+        return False
+
+    # We need to read the URL, even when adding to the PQ
+    # because the PQ priority function is heavily influenced
+    # by the language of the document
+    def add_node_to_pq(self, priority_queue, url):
+
+        entry = self.score_node(url)
+        if(entry is None): return
+        # Push it to the queue
+        priority_queue.push(entry)
+
+    # Fetch the URL and compute its PQ entry.
+    # Returns None if the node should not be queued
+    def score_node(self, url):
+
+        # Skip completely if the node is not parsible
+        if(not(self.is_parsible(url))): return None
+        # weight of the URL for the priority queue
+        # The more unique the URL, as compared to prev ones
+        # the more weight we try to give it
+        weight = 0
+
+        try:
+            if(self.request_not_allowed(url)): return None
+            response, page = self.fetch_page(url)
+            if(self.is_bad_response(response,url)): return None
+
+        except Exception as e: return None
+
+        # keep the page, so parse_node does not download it again
+        self.response_store.put(url, response, page)
+
+        node_metadata = self.work_statistics(response,page,url,False)
+        feature_class = (node_metadata[0], node_metadata[1], node_metadata[2])
+        weight = self.class_weight(feature_class)
+
+        # weight it by the size of the page, if weight is zero
+        size_weight = math.log(page.size) if page.size else 0
+        if(weight == 0): weight = weight + size_weight
+        # mult by -1 to implement a max heap. The feature class and size
+        # weight let the frontier re-score the entry as the counts change
+        return (-1*weight,url,feature_class,size_weight)
+
+    # Weight of a (country, language, domain) feature class.
+    # The more unique the class, as compared to prev pages
+    # the more weight we try to give it
+    def class_weight(self, feature_class):
+        node_country, node_language, node_domain = feature_class
+        pages_explored = self.pages_explored
+        weight = 0
+
+        geographic_representation = 0
+        lang_representation = 0
+        domain_representation = 0
+
+        if(pages_explored != 0 and node_country in self.seen_geographies):
+            geographic_representation = (self.seen_geographies[node_country]/pages_explored)*100
+
+        if(pages_explored != 0 and node_language in self.seen_languages):
+            lang_representation = (self.seen_languages[node_language]/pages_explored)*100
+
+        if(pages_explored != 0 and node_domain in self.domain_frequency):
+            domain_representation = (self.domain_frequency[node_domain]/pages_explored)*100
+
+        # Give very high weights to potentially fresh links
+        if(node_country not in self.seen_geographies): weight = weight + 10*(100 - geographic_representation)
+        if(node_language not in self.seen_languages): weight = weight + 5*(100 - lang_representation)
+        if(node_domain not in self.domain_frequency): weight = weight + 2.5*(100 - domain_representation)
+        return weight
+
+    # Seconds till the host of the url can be sent a request
+    def host_wait_time(self, url):
+        return self.host_scheduler.wait_time(self.get_domain_name(url))
+
+    # A new frontier, of type frontier_type. "TIERED" keeps the best entries
+    # in memory and spills the rest to sorted files under frontier_spill_dir,
+    # "INDEXED" keeps every entry in memory, grouped by feature class
+    def new_frontier(self, name):
+        params = self.params
+        if(params.frontier_type == "INDEXED"):
+            frontier = IndexedFrontier(self.class_weight, params.frontier_spill_dir, name, self.metrics)
+        else:
+            frontier = TieredFrontier(params.frontier_spill_dir,
+                                      params.frontier_hot_capacity,
+                                      params.frontier_max_segments,
+                                      name, self.metrics)
+        self.live_frontiers.add(frontier)
+        return frontier
+
+    # Recompute the weights of the queued urls sharing a country,
+    # language or domain whose counts changed (only IndexedFrontier can)
+    def rescore_frontiers(self, features):
+        if(len(features) == 0): return
+        for frontier in list(self.live_frontiers):
+            if(hasattr(frontier, "rescore")): frontier.rescore(features)
+
+    # A frontier saved by its checkpoint method
+    def restore_frontier(self, state):
+        params = self.params
+        if(state.get("type") == "INDEXED"):
+            frontier = IndexedFrontier.restore(state, self.class_weight, params.frontier_spill_dir, self.metrics)
+        else:
+            frontier = TieredFrontier.restore(state, params.frontier_spill_dir,
+                                              params.frontier_hot_capacity, params.frontier_max_segments,
+                                              self.metrics)
+        self.live_frontiers.add(frontier)
+        return frontier
+
+    # Save the whole crawl state, so a crashed crawl can be resumed.
+    # seed_idx is the seed being crawled, frontier its frontier
+    # (None once the seed is done), or the SeedScheduler of all active seeds.
+    # completed marks the checkpoint of a crawl that ran to the end
+    def save_checkpoint(self, seed_idx, frontier, child_count, completed=False):
+        checkpoint_path = self.params.checkpoint_path
+        state = {
+            "seed_idx": seed_idx,
+            "completed": completed,
+            "child_count": child_count,
+            "frontier": frontier.checkpoint() if frontier is not None else None,
+            "domain_frequency": self.domain_frequency,
+            "seen_languages": self.seen_languages,
+            "seen_geographies": self.seen_geographies,
+            "pages_explored": self.pages_explored,
+            "pages_sampled": self.pages_sampled,
+            "current_folder_idx": self.current_folder_idx,
+            "current_folder_count": self.current_folder_count,
+        }
+        os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+        tmp_path = checkpoint_path + ".tmp"
+        with self.state_lock:
+            with open(tmp_path, "w", encoding="utf-8") as file: json.dump(state, file)
+        # replace the previous checkpoint in one step
+        os.replace(tmp_path, checkpoint_path)
+        if(frontier is not None): frontier.checkpoint_saved()
+        if(hasattr(self.visited_nodes, "flush")): self.visited_nodes.flush()
+
+    # Save a checkpoint, if checkpoint_interval seconds have gone by
+    def maybe_save_checkpoint(self, seed_idx, frontier, child_count):
+        if(self.params.checkpoint_interval <= 0): return
+        if(time.time() - self.last_checkpoint_time < self.params.checkpoint_interval): return
+        self.last_checkpoint_time = time.time()
+        self.try_save_checkpoint(seed_idx, frontier, child_count)
+
+    # Save a checkpoint now. A checkpoint that cannot be written (disk
+    # full, no permission) is logged and the crawl goes on without it.
+    # Returns True if it was saved
+    def try_save_checkpoint(self, seed_idx, frontier, child_count, completed=False):
+        try:
+            self.save_checkpoint(seed_idx, frontier, child_count, completed)
+            return True
+        except Exception as e:
+            self.logger.error("Failed to save the checkpoint: {}".format(e))
+            return False
+
+    # The crawl ran to the end: mark its checkpoint completed, so the
+    # next crawl starts over instead of resuming after the last seed
+    def complete_checkpoint(self, seed_idx):
+        params = self.params
+        if(params.checkpoint_interval <= 0 and not(os.path.exists(params.checkpoint_path))): return
+        self.try_save_checkpoint(seed_idx, None, 0, completed=True)
+
+    # The state saved by the last checkpoint, or None if there is none
+    # to resume from: resuming is off, or the crawl was completed
+    def read_checkpoint(self):
+        params = self.params
+        if(not(params.resume_from_checkpoint) or not(os.path.exists(params.checkpoint_path))): return None
+        with open(params.checkpoint_path, "r", encoding="utf-8") as file: state = json.load(file)
+        if(state.get("completed", False)): return None
+        return state
+
+    # Restore the crawl state of the last checkpoint.
+    # Returns (seed_idx, frontier or None, child_count) to resume from
+    def load_checkpoint(self):
+        params = self.params
+        state = self.read_checkpoint()
+        if(state is None): return 0, None, 0
+        self.domain_frequency.update(state["domain_frequency"])
+        self.seen_languages.update(state["seen_languages"])
+        self.seen_geographies.update(state["seen_geographies"])
+        self.pages_explored = state["pages_explored"]
+        self.pages_sampled = state["pages_sampled"]
+        self.current_folder_idx = state["current_folder_idx"]
+        self.current_folder_count = state["current_folder_count"]
+        frontier = None
+        if(state["frontier"] is not None and state["frontier"].get("type") == "SEEDS"):
+            if(params.crawl_mode == "SYNC"):
+                frontier = self.new_seed_scheduler()
+                frontier.resume(state["frontier"], self.restore_frontier)
+            elif(len(state["frontier"]["active"]) > 0):
+                # the other modes crawl one seed at a time, restart the first active one
+                state["seed_idx"] = min(crawl["idx"] for crawl in state["frontier"]["active"])
+                state["child_count"] = 0
+            else: state["seed_idx"] = state["frontier"]["next_seed"]
+        elif(state["frontier"] is not None):
+            frontier = self.restore_frontier(state["frontier"])
+        self.logger.info("Resuming from the checkpoint at seed {}, {} pages into it".format(state["seed_idx"], state["child_count"]))
+        return state["seed_idx"], frontier, state["child_count"]
+
+    # The seeds crawled max_active_seeds at a time
+    def new_seed_scheduler(self):
+        return SeedScheduler(self.seed_list(), self.new_frontier, self.start_seed,
+                             self.params.max_active_seeds,
+                             self.params.max_pages_per_seed,
+                             self.params.max_seconds_per_seed,
+                             self.params.seed_time_quantum)
+
+    # Queue a seed in its frontier. False if a previous seed crawled over it
+    def start_seed(self, seed, frontier):
+        if(self.signature(seed) in self.visited_nodes): return False
+        # Add the seed to the pq and start the traversal
+        # Need a separate function for this as determining the
+        # priority is based on a few criterias
+        self.add_node_to_pq(frontier,seed)
+        # update visited list
+        self.visited_nodes.add(self.signature(seed))
+        return True
+
+    def start_crawling(self):
+        params = self.params
+        logger = self.logger
+        try:
+            # Log that the following seeds are loaded:
+            logger.info("Starting Crawler ({} seeds at a time) ...".format(params.max_active_seeds))
+            logger.info(self.seed_source())
+            logger.end_section()
+
+            resume_idx, resume_frontier, resume_child_count = self.load_checkpoint()
+
+            # The seeds are crawled max_active_seeds at a time, every seed with
+            # its own budgets, taking turns for the crawler's time
+            if(isinstance(resume_frontier, SeedScheduler)):
+                self.seed_scheduler = resume_frontier
+            else:
+                self.seed_scheduler = self.new_seed_scheduler()
+                self.seed_scheduler.next_seed = resume_idx
+                # carry on the seed the checkpoint was taken in
+                if(resume_frontier is not None):
+                    resume_seed = next(itertools.islice(self.seed_list(), resume_idx, None))
+                    self.seed_scheduler.resume_seed(resume_idx, resume_seed, resume_frontier, resume_child_count)
+            seed_scheduler = self.seed_scheduler
+            seed_scheduler.fill()
+            last_progress_time = time.time()
+
+            # Iterate till every seed is done: its pq is empty or it has
+            # exceeded the max pages or seconds we can crawl per seed
+            while (len(seed_scheduler) > 0):
+
+                # deque the next node of the seed whose turn it is, whose host has budget left
+                next_node, wait = seed_scheduler.pop_ready(self.host_wait_time, params.frontier_scan_depth)
+                if(next_node is None):
+                    # every host near the top of the queues was just visited
+                    self.metrics.observe("politeness_wait", wait)
+                    time.sleep(wait)
+                    continue
+
+                # parses the node and returns all its child nodes
+                # also add it to the visited nodes
+                # log the entry as well
+                time_page_st = time.time()
+                child_nodes = self.parse_node(next_node[1])
+
+                for child_node in child_nodes:
+                    # Add to visited
+                    self.visited_nodes.add(self.signature(child_node))
+                    self.add_node_to_pq(seed_scheduler,child_node)
+
+                finished = seed_scheduler.page_done(time.time() - time_page_st)
+                for crawl in finished:
+                    logger.info("Seed {} done ({}), {} pages in {:.0f} seconds".format(crawl.idx, crawl.stop_reason, crawl.pages, crawl.elapsed))
+                # the seeds done are not needed anymore, once the checkpoint leaves them
+                # out. If it could not be saved, they are kept till one is
+                saved = True
+                if(len(finished) > 0 and params.checkpoint_interval > 0): saved = self.try_save_checkpoint(seed_scheduler.next_seed, seed_scheduler, 0)
+                if(saved): seed_scheduler.close_finished()
+
+                self.maybe_save_checkpoint(seed_scheduler.next_seed, seed_scheduler, 0)
+                if(time.time() - last_progress_time >= params.seed_progress_interval):
+                    last_progress_time = time.time()
+                    for line in seed_scheduler.progress_lines(): logger.info(line)
+
+            # every seed is done
+            self.complete_checkpoint(seed_scheduler.next_seed)
+            seed_scheduler.close()
+
+        except Exception as e: print(e)
+        finally:
+            self.dump_summary_stats()
+
+    # Same traversal as start_crawling, but each seed is crawled by the
+    # asyncio engine, with max_in_flight_requests requests in flight
+    def start_crawling_async(self):
+        # asyncio is only imported by the crawl modes using it
+        from async_engine import AsyncFetchEngine
+        params = self.params
+        logger = self.logger
+        try:
+            logger.info("Starting Crawler (async, {} requests in flight) ...".format(params.max_in_flight_requests))
+            logger.info(self.seed_source())
+            logger.end_section()
+
+            resume_idx, resume_frontier, resume_child_count = self.load_checkpoint()
+
+            next_idx = resume_idx
+            for seed_idx, next_seed in enumerate(self.seed_list()):
+                # seeds done before the checkpoint
+                if(seed_idx < resume_idx): continue
+                next_idx = seed_idx + 1
+
+                engine = AsyncFetchEngine(self.score_node, self.parse_node,
+                                          lambda url: self.signature(url) not in self.visited_nodes,
+                                          lambda url: self.visited_nodes.add(self.signature(url)),
+                                          self.get_domain_name, self.host_wait_time,
+                                          params.max_in_flight_requests,
+                                          params.frontier_scan_depth,
+                                          params.max_pages_per_seed, params.max_seconds_per_seed,
+                                          lambda frontier, child_count, seed_idx=seed_idx: self.maybe_save_checkpoint(seed_idx, frontier, child_count))
+
+                if(seed_idx == resume_idx and resume_frontier is not None):
+                    # carry on the seed the checkpoint was taken in
+                    frontier = resume_frontier
+                    engine.crawl(next_seed, frontier, resume_child_count)
+                else:
+                    # If a previous seed crawled over this seed too
+                    if(self.signature(next_seed) in self.visited_nodes): continue
+                    self.visited_nodes.add(self.signature(next_seed))
+                    frontier = self.new_frontier("seed-{}".format(seed_idx))
+                    engine.crawl(next_seed, frontier)
+
+                # the seed is done, its frontier is not needed anymore
+                if(params.checkpoint_interval > 0): self.try_save_checkpoint(seed_idx + 1, None, 0)
+                frontier.close()
+
+            # every seed is done
+            self.complete_checkpoint(next_idx)
+
+        except Exception as e: print(e)
+        finally:
+            self.dump_summary_stats()
+
+    # Crawl the partition of a worker process of the DISTRIBUTED crawl
+    # mode (see run_partition). The worker owns the hosts hashed to it,
+    # and the politeness, robots and domain counters of this crawler are
+    # only used for them
+    def crawl_partition(self, worker):
+        frontier = self.new_frontier("worker-{}".format(worker.worker_id))
+        try:
+            worker.run(frontier, self.score_node, self.parse_node,
+                       lambda url: self.signature(url) not in self.visited_nodes,
+                       lambda url: self.visited_nodes.add(self.signature(url)),
+                       self.host_wait_time, self.get_domain_name)
+        finally:
+            frontier.close()
+        return self.stats()
+
+    # Crawl with distributed_workers processes, each owning the
+    # hosts whose registered domain hashes to it
+    def start_crawling_distributed(self):
+        from distributed import LocalCoordinator
+        params = self.params
+        try:
+            self.logger.info("Starting Crawler (distributed, {} workers) ...".format(params.distributed_workers))
+            self.logger.info(self.seed_source())
+            self.logger.end_section()
+
+            coordinator = LocalCoordinator(params.distributed_workers, self.get_domain_name,
+                                           params.distributed_batch_size,
+                                           params.distributed_flush_interval,
+                                           params.max_number_of_pages_to_sample // params.distributed_workers,
+                                           params.max_seconds_per_seed, params.frontier_scan_depth)
+            # the workers build their own crawler from the settings,
+            # this one is open and cannot be sent to them
+            all_stats = coordinator.run(self.seed_list(), functools.partial(run_partition, vars(self.params)))
+
+            # add up the stats of the workers, for the summary
+            for stats in all_stats:
+                if(len(stats) == 0): continue
+                self.pages_explored = self.pages_explored + stats["pages_explored"]
+                self.pages_sampled = self.pages_sampled + stats["pages_sampled"]
+                self.worker_urls_seen = self.worker_urls_seen + stats["urls_seen"]
+                for counts, worker_counts in ((self.seen_languages, stats["seen_languages"]),
+                                              (self.seen_geographies, stats["seen_geographies"]),
+                                              (self.domain_frequency, stats["domain_frequency"])):
+                    for key, value in worker_counts.items(): counts[key] = counts.get(key, 0) + value
+
+        except Exception as e: print(e)
+        finally:
+            self.dump_summary_stats()
+
+
+# Runs in every worker process of the DISTRIBUTED crawl mode. The
+# worker's Crawler is made here, from the settings of the crawl, with
+# its own log, metrics, visited set, process pool and segments
+def run_partition(settings, worker):
+    crawler = Crawler(worker_id=worker.worker_id, **settings)
+    crawler.open()
+    try:
+        return crawler.crawl_partition(worker)
+    finally:
+        crawler.close()
@@ -0,0 +1,246 @@
+"""
+distributed.py
+----------------------------
+This is a set of classes to run one crawl over several worker processes.
+Every url is owned by one worker, picked by hashing the url's partition
+key (its host's registered domain), so each worker owns the politeness,
+robots and domain counters of its hosts and no two workers crawl the
+same host. Child urls found by a worker are forwarded to their owner
+in batches.
+LocalCoordinator is a stand-in for the coordination service: it starts
+the workers as local processes connected by queues, hands out the seeds,
+detects when every worker has run out of work and collects their stats.
+The workers are spawned (the default on windows, and safe when the
+parent runs threads), so what they run is pickled: a module level
+function, or a functools.partial of one with plain settings, which
+builds its crawler in the worker.
+"""
+import multiprocessing
+import queue
+import time
+from politeness import pop_ready
+from visited_set import fingerprint
+
+# max no of seeds sent to a worker in one message
+SEED_BATCH_SIZE = 10000
+
+
+class PartitionWorker:
+    def __init__(self, worker_id, n_workers, inboxes, control,
+                 batch_size, flush_interval, max_pages, time_limit, max_scan):
+        self.worker_id = worker_id
+        self.n_workers = n_workers
+        self.inboxes = inboxes
+        self.control = control
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pages = max_pages
+        self.time_limit = time_limit
+        self.max_scan = max_scan
+        # urls waiting to be forwarded, per owner
+        self.outboxes = [[] for _ in range(n_workers)]
+        self.last_flush = time.time()
+        self.sent = 0
+        self.received = 0
+        self.pages = 0
+        self.idle = False
+        self.stopping = False
+
+    def owner_of(self, url):
+        return owner_of(self.partition_key(url), self.n_workers)
+
+    # score_node(url) -> pq entry or None, parse_node(url) -> child urls,
+    # is_new_node/mark_visited -> visited set of this worker,
+    # host_wait_time(url) -> seconds till the url's host has budget,
+    # partition_key(url) -> the key the url is owned by, the same as the coordinator's
+    def run(self, frontier, score_node, parse_node, is_new_node, mark_visited, host_wait_time, partition_key):
+        self.started = time.time()
+        self.partition_key = partition_key
+        self.score_node = score_node
+        self.is_new_node = is_new_node
+        self.mark_visited = mark_visited
+        self.frontier = frontier
+
+        while not self.stopping:
+            self.drain_inbox(block=False)
+            if self.stopping: break
+
+            if self.budget_left() and len(frontier) > 0:
+                next_node, wait = pop_ready(frontier, host_wait_time, self.max_scan)
+                if next_node is None:
+                    time.sleep(wait)
+                    continue
+                child_nodes = parse_node(next_node[1])
+                self.pages = self.pages + 1
+                for child_node in child_nodes or []: self.route(child_node)
+                if time.time() - self.last_flush >= self.flush_interval: self.flush()
+                continue
+
+            # Out of work: send what is left, tell the coordinator,
+            # and wait for more urls
+            self.flush()
+            if not self.idle:
+                self.idle = True
+                self.report()
+            self.drain_inbox(block=True)
+
+        return self.pages
+
+    def budget_left(self):
+        return self.pages < self.max_pages and time.time() - self.started <= self.time_limit
+
+    # Queue a url here if this worker owns it, otherwise forward it
+    def route(self, url):
+        owner = self.owner_of(url)
+        if owner == self.worker_id:
+            self.add_url(url)
+            return
+        self.outboxes[owner].append(url)
+        if len(self.outboxes[owner]) >= self.batch_size: self.flush_outbox(owner)
+
+    def add_url(self, url):
+        # the budget is used, urls are still received but dropped
+        if not self.budget_left(): return
+        if not self.is_new_node(url): return
+        self.mark_visited(url)
+        entry = self.score_node(url)
+        if entry is not None: self.frontier.push(entry)
+
+    def flush(self):
+        for owner in range(self.n_workers): self.flush_outbox(owner)
+        self.last_flush = time.time()
+
+    def flush_outbox(self, owner):
+        batch = self.outboxes[owner]
+        if len(batch) == 0: return
+        self.outboxes[owner] = []
+        self.sent = self.sent + len(batch)
+        self.inboxes[owner].put(("URLS", batch))
+
+    def drain_inbox(self, block):
+        while True:
+            try:
+                message = self.inboxes[self.worker_id].get(block=block, timeout=self.flush_interval if block else None)
+            except queue.Empty:
+                return
+            block = False
+            kind, urls = message
+            if kind == "STOP":
+                self.stopping = True
+                return
+            if self.idle:
+                # back to work, the coordinator must know before the counts move
+                self.idle = False
+                self.report()
+            self.received = self.received + len(urls)
+            for url in urls: self.add_url(url)
+
+    def report(self):
+        self.control.put(("STATUS", self.worker_id, self.idle, self.sent, self.received))
+
+
+# The worker a partition key belongs to
+def owner_of(key, n_workers):
+    return fingerprint(key) % n_workers
+
+
+# Entry point of a worker process. target(worker) runs the crawl
+# and returns the stats of the worker. target is pickled, see above
+def worker_main(target, worker_id, n_workers, inboxes, control, settings):
+    worker = PartitionWorker(worker_id, n_workers, inboxes, control, **settings)
+    try:
+        stats = target(worker)
+    except Exception as e:
+        print(e)
+        stats = {}
+    control.put(("DONE", worker_id, stats))
+
+
+class LocalCoordinator:
+    # partition_key(url) -> the key owning the url, used to hand out the
+    # seeds. It is not sent to the workers, target gives them their own
+    def __init__(self, n_workers, partition_key, batch_size, flush_interval,
+                 max_pages, time_limit, max_scan):
+        self.n_workers = n_workers
+        self.partition_key = partition_key
+        self.context = multiprocessing.get_context("spawn")
+        self.settings = {"batch_size": batch_size,
+                         "flush_interval": flush_interval,
+                         "max_pages": max_pages,
+                         "time_limit": time_limit,
+                         "max_scan": max_scan}
+        self.flush_interval = flush_interval
+
+    # Crawl from the seeds with n_workers processes running target.
+    # Returns the list of stats returned by the workers
+    def run(self, seeds, target):
+        inboxes = [self.context.Queue() for _ in range(self.n_workers)]
+        control = self.context.Queue()
+        processes = [self.context.Process(target=worker_main,
+                                          args=(target, i, self.n_workers, inboxes, control, self.settings))
+                     for i in range(self.n_workers)]
+        for process in processes: process.start()
+
+        # hand out the seeds to their owners, a batch at a time, as
+        # the seeds may be streamed from a file too big to hold
+        batches = [[] for _ in range(self.n_workers)]
+        sent = 0
+        for seed in seeds:
+            owner = owner_of(self.partition_key(seed), self.n_workers)
+            batches[owner].append(seed)
+            if len(batches[owner]) < SEED_BATCH_SIZE: continue
+            inboxes[owner].put(("URLS", batches[owner]))
+            sent = sent + len(batches[owner])
+            batches[owner] = []
+        for owner, batch in enumerate(batches):
+            if len(batch) == 0: continue
+            inboxes[owner].put(("URLS", batch))
+            sent = sent + len(batch)
+
+        # worker -> (idle, sent, received), as last reported
+        status = {}
+        stats = {}
+        balanced_since = None
+        stop_sent = False
+        while len(stats) < self.n_workers:
+            try:
+                message = control.get(timeout=self.flush_interval)
+            except queue.Empty:
+                message = None
+            if message is not None:
+                balanced_since = None
+                if message[0] == "STATUS": status[message[1]] = message[2:]
+                elif message[0] == "DONE":
+                    stats[message[1]] = message[2]
+                    # a worker stopped on its own (it failed), the urls
+                    # it owns cannot be crawled, so stop the others too
+                    if not stop_sent: stop_sent = self.stop(inboxes)
+                continue
+            if stop_sent: continue
+            if not self.all_done(status, sent): continue
+            # Every worker is idle and every url sent was received,
+            # and nothing changed over a whole flush interval: stop
+            if balanced_since is None: balanced_since = time.time()
+            else: stop_sent = self.stop(inboxes)
+
+        # urls still queued keep the feeder threads of the
+        # workers busy, so drain the queues while they exit
+        while any(process.is_alive() for process in processes):
+            for inbox in inboxes:
+                try:
+                    while True: inbox.get_nowait()
+                except queue.Empty:
+                    pass
+            for process in processes: process.join(timeout=0.1)
+        return [stats[i] for i in sorted(stats)]
+
+    def stop(self, inboxes):
+        for inbox in inboxes: inbox.put(("STOP", None))
+        return True
+
+    def all_done(self, status, seeds_sent):
+        if len(status) < self.n_workers: return False
+        if not all(worker_status[0] for worker_status in status.values()): return False
+        sent = seeds_sent + sum(worker_status[1] for worker_status in status.values())
+        received = sum(worker_status[2] for worker_status in status.values())
+        return sent == received
@@ -0,0 +1,52 @@
+"""
+dns_cache.py
+----------------------------
+This is a class to cache the ip address of every host resolved by the
+crawler, so that a host is resolved once per TTL instead of once for
+every page crawled on it. Failed lookups are cached for a shorter TTL,
+and the least recently used hosts are evicted once the cache is full.
+"""
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+
+class DnsCache:
+    def __init__(self, ttl, negative_ttl, max_entries):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # host -> (expiry time, ip or None if it did not resolve)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Returns the ip of the host, or None if it does not resolve
+    # (or there is no host, e.g. the url could not be parsed)
+    def resolve(self, host):
+        if not host: return None
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(host)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(host)
+                self.hits = self.hits + 1
+                return entry[1]
+            self.misses = self.misses + 1
+
+        try:
+            ip = socket.gethostbyname(host)
+        except (OSError, UnicodeError):
+            ip = None
+        ttl = self.ttl if ip is not None else self.negative_ttl
+        with self.lock:
+            self.entries[host] = (time.monotonic() + ttl, ip)
+            self.entries.move_to_end(host)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return ip
+
+    def __len__(self):
+        return len(self.entries)
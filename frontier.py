@@ -0,0 +1,438 @@
+"""
+frontier.py
+----------------------------
+This is a set of classes for the crawl frontier, a priority queue of
+(-weight, url, feature class, size weight) entries.
+
+TieredFrontier can grow beyond the memory of the crawler.
+The best entries are kept in an in memory heap. When the heap holds more
+than hot_capacity entries, its worse half is written, in priority order,
+to a segment file on disk. Segments are merged back lazily: only the
+head entry of every segment is held in memory, and the next line is read
+when the head is popped. When there are too many segments they are
+merged into one, so the no of open files stays bounded.
+
+IndexedFrontier keeps its entries grouped by feature class, the
+(country, language, domain) of the page, with an index from every
+country, language and domain to the classes holding it. The weight of
+a class is looked up when needed, so when the crawl counts of a country,
+language or domain change, only the classes holding it are re-scored,
+each in O(log n), and queued urls never keep a stale weight.
+
+Both can be checkpointed to disk and restored after a crash.
+"""
+import heapq
+import json
+import os
+import threading
+
+
+class Segment:
+    # A sorted file of entries, read one line at a time
+    def __init__(self, path, offset=0, remaining=None):
+        self.path = path
+        self.file = open(path, "r", encoding="utf-8")
+        self.file.seek(offset)
+        self.remaining = remaining
+        if self.remaining is None: self.remaining = count_lines(self.file, offset)
+        self.head = None
+        self.head_offset = offset
+        self.advance()
+
+    # Read the next entry of the file into head
+    def advance(self):
+        self.head_offset = self.file.tell()
+        line = self.file.readline()
+        if not line:
+            self.head = None
+            return
+        self.head = to_entry(json.loads(line))
+
+    def close(self):
+        self.file.close()
+
+
+def count_lines(file, offset):
+    count = sum(1 for _ in file)
+    file.seek(offset)
+    return count
+
+
+class TieredFrontier:
+    def __init__(self, spill_dir, hot_capacity, max_segments, name="frontier", metrics=None):
+        self.spill_dir = spill_dir
+        # times push and pop, when given (see metrics.py)
+        self.metrics = metrics
+        self.hot_capacity = max(2, hot_capacity)
+        self.max_segments = max(2, max_segments)
+        self.name = name
+        self.hot = []
+        self.segments = []
+        # (head entry, segment no) of every segment with entries left
+        self.segment_heads = []
+        self.next_segment_id = 0
+        # segments already read till the end. Their files are only removed
+        # at the next checkpoint, as the last checkpoint may still use them
+        self.finished_segments = []
+        # the hot heap saved by the last checkpoint
+        self.hot_snapshot = None
+        # files of the previous checkpoint, removed once the next is saved
+        self.pending_removal = []
+        self.spilled_entries = 0
+
+    def push(self, entry):
+        if self.metrics is None: return self.push_entry(entry)
+        with self.metrics.timer("frontier_push"): self.push_entry(entry)
+
+    def pop(self):
+        if self.metrics is None: return self.pop_entry()
+        with self.metrics.timer("frontier_pop"): return self.pop_entry()
+
+    def push_entry(self, entry):
+        heapq.heappush(self.hot, entry)
+        if len(self.hot) > self.hot_capacity: self.spill()
+
+    def pop_entry(self):
+        if len(self.segment_heads) > 0 and (len(self.hot) == 0 or self.segment_heads[0][0] < self.hot[0]):
+            head, idx = heapq.heappop(self.segment_heads)
+            segment = self.segments[idx]
+            segment.remaining = segment.remaining - 1
+            segment.advance()
+            if segment.head is not None: heapq.heappush(self.segment_heads, (segment.head, idx))
+            else: self.finish_segment(idx)
+            return head
+        return heapq.heappop(self.hot)
+
+    def peek(self):
+        if len(self.segment_heads) > 0 and (len(self.hot) == 0 or self.segment_heads[0][0] < self.hot[0]):
+            return self.segment_heads[0][0]
+        return self.hot[0]
+
+    def __len__(self):
+        return len(self.hot) + sum(segment.remaining for segment in self.segments if segment is not None)
+
+    def new_segment_path(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, "{}-{:06d}.seg".format(self.name, self.next_segment_id))
+        self.next_segment_id = self.next_segment_id + 1
+        return path
+
+    # Keep the best half of the heap in memory, write the rest to a segment
+    def spill(self):
+        self.hot.sort()
+        keep = self.hot_capacity // 2
+        self.add_segment(write_segment(self.new_segment_path(), self.hot[keep:]))
+        self.spilled_entries = self.spilled_entries + len(self.hot) - keep
+        # a sorted list is a valid heap
+        del self.hot[keep:]
+        if len(self.segment_heads) > self.max_segments: self.compact()
+
+    def add_segment(self, path, offset=0, remaining=None):
+        segment = Segment(path, offset, remaining)
+        self.segments.append(segment)
+        idx = len(self.segments) - 1
+        if segment.head is not None: heapq.heappush(self.segment_heads, (segment.head, idx))
+        else: self.finish_segment(idx)
+
+    def finish_segment(self, idx):
+        self.segments[idx].close()
+        self.finished_segments.append(self.segments[idx].path)
+        self.segments[idx] = None
+
+    # Merge all the segments into a single one
+    def compact(self):
+        live = [segment for segment in self.segments if segment is not None]
+        path = self.new_segment_path()
+        with open(path, "w", encoding="utf-8") as out:
+            for entry in heapq.merge(*(iterate_segment(segment) for segment in live)):
+                out.write(json.dumps(entry) + "\n")
+        for idx, segment in enumerate(self.segments):
+            if segment is not None: self.finish_segment(idx)
+        self.segments = []
+        self.segment_heads = []
+        self.add_segment(path)
+
+    # Save the frontier, returns a json-able description used by restore.
+    # Call checkpoint_saved once the description is safely on disk
+    def checkpoint(self):
+        hot_path = write_segment(self.new_segment_path(), sorted(self.hot))
+        segments = [{"path": segment.path, "offset": segment.head_offset, "remaining": segment.remaining}
+                    for segment in self.segments if segment is not None]
+        self.pending_removal = self.finished_segments
+        if self.hot_snapshot is not None: self.pending_removal.append(self.hot_snapshot)
+        self.finished_segments = []
+        self.hot_snapshot = hot_path
+        return {"name": self.name, "hot": hot_path, "segments": segments, "next_segment_id": self.next_segment_id}
+
+    # The new checkpoint is saved, the files only the previous one used can go
+    def checkpoint_saved(self):
+        remove_files(self.pending_removal)
+        self.pending_removal = []
+
+    @classmethod
+    def restore(cls, state, spill_dir, hot_capacity, max_segments, metrics=None):
+        frontier = cls(spill_dir, hot_capacity, max_segments, state["name"], metrics)
+        frontier.next_segment_id = state["next_segment_id"]
+        for segment in state["segments"]:
+            frontier.add_segment(segment["path"], segment["offset"], segment["remaining"])
+        frontier.hot_snapshot = state["hot"]
+        for entry in iterate_file(state["hot"]): frontier.push(entry)
+        return frontier
+
+    # Close and remove all the files of the frontier
+    def close(self):
+        for idx, segment in enumerate(self.segments):
+            if segment is not None: self.finish_segment(idx)
+        remove_files(self.finished_segments + self.pending_removal)
+        if self.hot_snapshot is not None: remove_files([self.hot_snapshot])
+        self.finished_segments = []
+        self.pending_removal = []
+        self.hot_snapshot = None
+        self.segments = []
+        self.segment_heads = []
+        self.hot = []
+
+
+def remove_files(paths):
+    for path in paths:
+        if os.path.exists(path): os.remove(path)
+
+
+def write_segment(path, entries):
+    with open(path, "w", encoding="utf-8") as out:
+        for entry in entries: out.write(json.dumps(entry) + "\n")
+    return path
+
+
+# json turns the tuples of an entry into lists, turn them back
+def to_entry(values):
+    return tuple(tuple(value) if isinstance(value, list) else value for value in values)
+
+
+def iterate_segment(segment):
+    while segment.head is not None:
+        yield segment.head
+        segment.advance()
+
+
+def iterate_file(path):
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            yield to_entry(json.loads(line))
+
+
+class IndexedHeap:
+    # A binary min heap of items and their keys, with the position of
+    # every item indexed, so the key of any item changes in O(log n)
+    def __init__(self):
+        self.items = []
+        self.keys = []
+        self.position = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def peek(self):
+        return self.items[0], self.keys[0]
+
+    # Add the item, or change its key if already in the heap
+    def set(self, item, key):
+        idx = self.position.get(item)
+        if idx is None:
+            self.items.append(item)
+            self.keys.append(key)
+            self.position[item] = len(self.items) - 1
+            self.sift_up(len(self.items) - 1)
+            return
+        old_key = self.keys[idx]
+        self.keys[idx] = key
+        if key < old_key: self.sift_up(idx)
+        else: self.sift_down(idx)
+
+    def remove(self, item):
+        idx = self.position.pop(item)
+        last = len(self.items) - 1
+        if idx != last:
+            self.items[idx] = self.items[last]
+            self.keys[idx] = self.keys[last]
+            self.position[self.items[idx]] = idx
+        self.items.pop()
+        self.keys.pop()
+        if idx < len(self.items):
+            self.sift_up(idx)
+            self.sift_down(idx)
+
+    def sift_up(self, idx):
+        while idx > 0:
+            parent = (idx - 1) // 2
+            if not self.keys[idx] < self.keys[parent]: return
+            self.swap(idx, parent)
+            idx = parent
+
+    def sift_down(self, idx):
+        size = len(self.items)
+        while True:
+            smallest = idx
+            for child in (2 * idx + 1, 2 * idx + 2):
+                if child < size and self.keys[child] < self.keys[smallest]: smallest = child
+            if smallest == idx: return
+            self.swap(idx, smallest)
+            idx = smallest
+
+    def swap(self, i, j):
+        self.items[i], self.items[j] = self.items[j], self.items[i]
+        self.keys[i], self.keys[j] = self.keys[j], self.keys[i]
+        self.position[self.items[i]] = i
+        self.position[self.items[j]] = j
+
+
+class IndexedFrontier:
+    # class_weight(feature class) -> weight of the class, from the crawl
+    # counts of its country, language and domain. When it is 0, the
+    # entries are weighted by their size weight (see score_node)
+    def __init__(self, class_weight, spill_dir, name="frontier", metrics=None):
+        self.class_weight = class_weight
+        self.spill_dir = spill_dir
+        self.name = name
+        # times push and pop, when given (see metrics.py)
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        # feature class -> heap of (-size weight, url) of its entries
+        self.classes = {}
+        # feature class -> its weight, as last computed
+        self.weights = {}
+        # (position in the class, feature) -> feature classes holding it
+        self.index = {}
+        # feature classes by the best entry each holds
+        self.class_heap = IndexedHeap()
+        self.size = 0
+        self.rescored = 0
+        self.next_snapshot_id = 0
+        # the entries saved by the last checkpoint
+        self.snapshot = None
+        self.pending_removal = []
+
+    def push(self, entry):
+        if self.metrics is None: return self.push_entry(entry)
+        with self.metrics.timer("frontier_push"): self.push_entry(entry)
+
+    def pop(self):
+        if self.metrics is None: return self.pop_entry()
+        with self.metrics.timer("frontier_pop"): return self.pop_entry()
+
+    def push_entry(self, entry):
+        # entries without a class (-weight, url) keep their weight
+        feature_class = entry[2] if len(entry) > 2 else None
+        size_weight = entry[3] if len(entry) > 3 else -entry[0]
+        with self.lock:
+            entries = self.classes.get(feature_class)
+            if entries is None:
+                entries = []
+                self.classes[feature_class] = entries
+                self.weights[feature_class] = self.weight_of(feature_class)
+                self.add_to_index(feature_class)
+            heapq.heappush(entries, (-size_weight, entry[1]))
+            self.size = self.size + 1
+            # the class only moves if the new entry is its best one
+            if entries[0][1] == entry[1]: self.update_class(feature_class)
+
+    def pop_entry(self):
+        with self.lock:
+            feature_class, _ = self.class_heap.peek()
+            entries = self.classes[feature_class]
+            negative_size_weight, url = heapq.heappop(entries)
+            self.size = self.size - 1
+            weight = self.weights[feature_class]
+            if len(entries) == 0: self.remove_class(feature_class)
+            else: self.update_class(feature_class)
+        return self.entry(weight, url, feature_class, -negative_size_weight)
+
+    def peek(self):
+        with self.lock:
+            feature_class, _ = self.class_heap.peek()
+            negative_size_weight, url = self.classes[feature_class][0]
+            return self.entry(self.weights[feature_class], url, feature_class, -negative_size_weight)
+
+    def __len__(self):
+        return self.size
+
+    # The counts of these features changed, e.g. [(1, "fr")] for the
+    # language fr: recompute the weight of only the classes holding them
+    def rescore(self, features):
+        with self.lock:
+            for feature in features:
+                for feature_class in list(self.index.get(feature, ())):
+                    weight = self.weight_of(feature_class)
+                    if weight == self.weights[feature_class]: continue
+                    self.weights[feature_class] = weight
+                    self.update_class(feature_class)
+                    self.rescored = self.rescored + 1
+
+    def weight_of(self, feature_class):
+        if feature_class is None: return 0
+        return self.class_weight(feature_class)
+
+    def entry(self, weight, url, feature_class, size_weight):
+        if weight == 0: weight = size_weight
+        return (-weight, url, feature_class, size_weight)
+
+    # Key of a class in the class heap, from its weight and best entry
+    def update_class(self, feature_class):
+        negative_size_weight, url = self.classes[feature_class][0]
+        weight = self.weights[feature_class]
+        self.class_heap.set(feature_class, (-weight if weight != 0 else negative_size_weight, url))
+
+    def add_to_index(self, feature_class):
+        if feature_class is None: return
+        for feature in enumerate(feature_class):
+            self.index.setdefault(feature, set()).add(feature_class)
+
+    def remove_class(self, feature_class):
+        self.class_heap.remove(feature_class)
+        del self.classes[feature_class]
+        del self.weights[feature_class]
+        if feature_class is None: return
+        for feature in enumerate(feature_class):
+            holders = self.index[feature]
+            holders.discard(feature_class)
+            if len(holders) == 0: del self.index[feature]
+
+    # Save the frontier, returns a json-able description used by restore.
+    # Call checkpoint_saved once the description is safely on disk
+    def checkpoint(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, "{}-indexed-{:06d}.seg".format(self.name, self.next_snapshot_id))
+        self.next_snapshot_id = self.next_snapshot_id + 1
+        with self.lock:
+            entries = [(0, url, feature_class, -negative_size_weight)
+                       for feature_class, class_entries in self.classes.items()
+                       for negative_size_weight, url in class_entries]
+        write_segment(path, entries)
+        if self.snapshot is not None: self.pending_removal.append(self.snapshot)
+        self.snapshot = path
+        return {"type": "INDEXED", "name": self.name, "entries": path, "next_snapshot_id": self.next_snapshot_id}
+
+    # The new checkpoint is saved, the file of the previous one can go
+    def checkpoint_saved(self):
+        remove_files(self.pending_removal)
+        self.pending_removal = []
+
+    @classmethod
+    def restore(cls, state, class_weight, spill_dir, metrics=None):
+        frontier = cls(class_weight, spill_dir, state["name"], metrics)
+        frontier.next_snapshot_id = state["next_snapshot_id"]
+        frontier.snapshot = state["entries"]
+        for entry in iterate_file(state["entries"]): frontier.push_entry(entry)
+        return frontier
+
+    # Close and remove the files of the frontier
+    def close(self):
+        remove_files(self.pending_removal + ([self.snapshot] if self.snapshot is not None else []))
+        self.pending_removal = []
+        self.snapshot = None
+        with self.lock:
+            self.classes = {}
+            self.weights = {}
+            self.index = {}
+            self.class_heap = IndexedHeap()
+            self.size = 0
@@ -0,0 +1,74 @@
+"""
+geo_locator.py
+----------------------------
+This is a class to find the country of an IPv4 address offline.
+It loads an IP range -> country table from a csv file, with rows of the
+form start_ip,end_ip,country (dotted or integer ips, the format used by
+the free ip-to-country databases), into sorted arrays and finds the
+range holding an ip with a binary search.
+"""
+import csv
+import ipaddress
+from array import array
+from bisect import bisect_right
+
+
+class GeoLocator:
+    def __init__(self, ranges):
+        # ranges: iterable of (start, end, country) with integer ips
+        ranges = sorted(ranges)
+        self.starts = array('I', (r[0] for r in ranges))
+        self.ends = array('I', (r[1] for r in ranges))
+        # countries are stored once, the ranges only keep an index
+        self.countries = []
+        country_idx = {}
+        self.country_of_range = array('H')
+        for r in ranges:
+            if r[2] not in country_idx:
+                country_idx[r[2]] = len(self.countries)
+                self.countries.append(r[2])
+            self.country_of_range.append(country_idx[r[2]])
+
+    @classmethod
+    def from_csv(cls, file_path):
+        ranges = []
+        with open(file_path, 'r', newline='') as file:
+            for row in csv.reader(file):
+                # skip the header, comments and malformed rows
+                if len(row) < 3 or row[0].startswith('#'): continue
+                try:
+                    start = to_int_ip(row[0])
+                    end = to_int_ip(row[1])
+                except ValueError:
+                    continue
+                country = row[2].strip().upper()
+                if start is None or end is None or not country: continue
+                ranges.append((start, end, country))
+        return cls(ranges)
+
+    # Returns the country code of the ip, or None if it is not in any range
+    def lookup(self, ip):
+        try:
+            ip = to_int_ip(ip)
+        except ValueError:
+            return None
+        if ip is None: return None
+        idx = bisect_right(self.starts, ip) - 1
+        if idx < 0 or ip > self.ends[idx]: return None
+        return self.countries[self.country_of_range[idx]]
+
+    def __len__(self):
+        return len(self.starts)
+
+
+# Convert a dotted or integer IPv4 address to an int.
+# Returns None for IPv6 addresses, which the table does not hold
+def to_int_ip(value):
+    if isinstance(value, int): return value
+    value = value.strip()
+    if value.isdigit():
+        ip = int(value)
+        return ip if ip < 2**32 else None
+    ip = ipaddress.ip_address(value)
+    if ip.version != 4: return None
+    return int(ip)
@@ -0,0 +1,213 @@
+"""
+http_pool.py
+----------------------------
+This is a class to share http connections between all the requests
+sent by the crawler. Every host gets its own requests.Session, whose
+connection pool keeps connections alive between requests, so a HEAD
+followed by GETs to the same page reuses one TCP/TLS connection.
+The no of connections per host and the no of hosts kept are bounded,
+and hosts idle for longer than idle_timeout have their connections closed.
+get_limited streams a page and drops the connection as soon as the page
+is disqualified: unsupported content type, body too big or too slow.
+It can send extra headers, e.g. to make the GET conditional.
+requests is only imported when the first session is opened, so importing
+the crawler stays fast.
+"""
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+
+class HttpPool:
+    def __init__(self, max_connections_per_host, max_hosts, idle_timeout):
+        self.max_connections_per_host = max_connections_per_host
+        self.max_hosts = max_hosts
+        self.idle_timeout = idle_timeout
+        # scheme://host -> [session, last used time, requests in flight]
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.last_sweep = time.monotonic()
+        # counters of the sessions already closed
+        self.closed_requests = 0
+        self.closed_connections = 0
+        self.evictions = 0
+        # reason -> no of downloads aborted by get_limited
+        self.aborted = {}
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    # GET the url, streaming the body. Raises FetchAborted, and closes the
+    # connection, as soon as the content type (from the headers, or sniffed
+    # from the first bytes) is not in content_types, the body goes over
+    # max_bytes, or the download takes longer than time_budget seconds
+    def get_limited(self, url, timeout, max_bytes, time_budget, content_types, headers=None):
+        started = time.monotonic()
+        response = self.get(url, timeout=timeout, stream=True, headers=headers)
+        try:
+            # errors and 304 Not Modified have no page to check
+            if response.status_code >= 400 or response.status_code == 304:
+                response.close()
+                response._content = b""
+                response._content_consumed = True
+                return response
+            content_type = (response.headers.get('content-type') or "").split(";")[0].strip().lower()
+            if content_type and content_type not in content_types: self.abort(response, "content_type")
+            declared = response.headers.get('content-length')
+            if declared is not None and declared.isdigit() and int(declared) > max_bytes: self.abort(response, "too_big")
+
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=65536):
+                body.extend(chunk)
+                if not content_type and len(body) >= 512:
+                    # no content type sent, guess it from the first bytes
+                    content_type = sniff_content_type(bytes(body[:512]))
+                    if content_type not in content_types: self.abort(response, "content_type")
+                if len(body) > max_bytes: self.abort(response, "too_big")
+                if time.monotonic() - started > time_budget: self.abort(response, "too_slow")
+            if not content_type and sniff_content_type(bytes(body[:512])) not in content_types:
+                self.abort(response, "content_type")
+        except FetchAborted:
+            raise
+        except Exception:
+            response.close()
+            raise
+        # the whole body is read, the connection goes back to the pool
+        response._content = bytes(body)
+        response._content_consumed = True
+        return response
+
+    def abort(self, response, reason):
+        response.close()
+        with self.lock:
+            self.aborted[reason] = self.aborted.get(reason, 0) + 1
+        raise FetchAborted(reason)
+
+    def request(self, method, url, **kwargs):
+        parts = urlparse(url)
+        key = parts.scheme + "://" + parts.netloc
+        entry = self.checkout(key)
+        try:
+            return entry[0].request(method, url, **kwargs)
+        finally:
+            with self.lock:
+                entry[1] = time.monotonic()
+                entry[2] = entry[2] - 1
+
+    def checkout(self, key):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_sweep > self.idle_timeout: self.evict_idle(now)
+            entry = self.sessions.get(key)
+            if entry is None:
+                entry = [self.new_session(), now, 0]
+                self.sessions[key] = entry
+                # the new host is in use, it must not be the one evicted
+                self.evict_over_limit(key)
+            self.sessions.move_to_end(key)
+            entry[1] = now
+            entry[2] = entry[2] + 1
+            return entry
+
+    def new_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        # One pool per session (the session only talks to one host),
+        # blocking once max_connections_per_host are busy
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=self.max_connections_per_host,
+                              pool_block=True,
+                              max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    # Close the hosts that have been idle for too long
+    def evict_idle(self, now):
+        self.last_sweep = now
+        for key in list(self.sessions):
+            session, last_used, in_flight = self.sessions[key]
+            if in_flight == 0 and now - last_used > self.idle_timeout: self.close_session(key)
+
+    # Close the least recently used idle hosts, other than keep, till within max_hosts
+    def evict_over_limit(self, keep=None):
+        for key in list(self.sessions):
+            if len(self.sessions) <= self.max_hosts: break
+            if key != keep and self.sessions[key][2] == 0: self.close_session(key)
+
+    def close_session(self, key):
+        session = self.sessions.pop(key)[0]
+        requests_sent, connections_opened, idle = session_counters(session)
+        self.closed_requests = self.closed_requests + requests_sent
+        self.closed_connections = self.closed_connections + connections_opened
+        self.evictions = self.evictions + 1
+        session.close()
+
+    # Requests sent, connections opened, share of requests that reused
+    # a kept alive connection, and connections currently kept alive
+    def stats(self):
+        with self.lock:
+            requests_sent = self.closed_requests
+            connections_opened = self.closed_connections
+            open_connections = 0
+            for entry in self.sessions.values():
+                counters = session_counters(entry[0])
+                requests_sent = requests_sent + counters[0]
+                connections_opened = connections_opened + counters[1]
+                open_connections = open_connections + counters[2]
+            reuse_ratio = 1 - connections_opened / requests_sent if requests_sent > 0 else 0
+            return {"requests": requests_sent,
+                    "connections_opened": connections_opened,
+                    "reuse_ratio": reuse_ratio,
+                    "open_connections": open_connections,
+                    "hosts": len(self.sessions),
+                    "evicted_hosts": self.evictions,
+                    "aborted": dict(self.aborted)}
+
+    def close(self):
+        with self.lock:
+            for key in list(self.sessions): self.close_session(key)
+
+
+class FetchAborted(Exception):
+    # the page was dropped on purpose, not a failure of the host
+    def __init__(self, reason):
+        super().__init__("fetch aborted: " + reason)
+        self.reason = reason
+
+
+# True for the failures of a host that is slow or overloaded
+# (timeouts, dropped connections), worth a retry later
+def is_transient_error(error):
+    import requests
+    return isinstance(error, (requests.Timeout, requests.ConnectionError))
+
+
+# Guess the content type of a body without a content-type header
+def sniff_content_type(head):
+    text = head.lstrip().lower()
+    for marker in (b"<!doctype html", b"<html", b"<head", b"<body", b"<title", b"<!--"):
+        if text.startswith(marker): return "text/html"
+    if b"<html" in text or b"<a " in text: return "text/html"
+    return "application/octet-stream"
+
+
+# Read the counters of the urllib3 pools of a session
+def session_counters(session):
+    requests_sent = 0
+    connections_opened = 0
+    idle = 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools[pool_key]
+            requests_sent = requests_sent + getattr(pool, "num_requests", 0)
+            connections_opened = connections_opened + getattr(pool, "num_connections", 0)
+            # the pool's queue is padded with None for the connections not opened yet
+            if pool.pool is not None: idle = idle + sum(1 for conn in list(pool.pool.queue) if conn is not None)
+    return requests_sent, connections_opened, idle
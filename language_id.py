@@ -0,0 +1,247 @@
+"""
+language_id.py
+----------------------------
+This is a class to tell the language of page titles, fast and always
+with the same answer for the same text.
+The script of the letters comes first: text mostly written in a script
+used by a single language (kana, hangul, thai, greek, hebrew and most
+indic scripts) gets that language without running a detector. Other
+text goes to langdetect, with a fixed seed so its sampling gives the
+same probabilities on every run. langdetect reads the seed from a class
+attribute shared by the whole process, so the seed is set and the texts
+detected under one process wide lock, and threads (or identifiers with
+another seed) cannot change it in between. The probabilities of every
+text are kept in an LRU cache, keyed by a hash of the text, so a title
+seen again (the same page scored and parsed, boilerplate titles of a
+site) is not detected again. detect_batch classifies many texts at once:
+the cache is looked up once for all of them, each distinct text is
+detected once, and langdetect runs for all of them under a single
+acquisition of the lock.
+Short titles are often ambiguous, so the languages already seen on a
+domain act as a prior: among the candidates langdetect gives, the ones
+common on the domain are favoured, and a title with no letters gets
+the main language of its domain.
+"""
+import hashlib
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+# (first code point, last code point, script) of the scripts told apart
+SCRIPT_RANGES = sorted([
+    (0x0041, 0x024F, "Latin"),
+    (0x0370, 0x03FF, "Greek"),
+    (0x0400, 0x052F, "Cyrillic"),
+    (0x0530, 0x058F, "Armenian"),
+    (0x0590, 0x05FF, "Hebrew"),
+    (0x0600, 0x06FF, "Arabic"),
+    (0x0900, 0x097F, "Devanagari"),
+    (0x0980, 0x09FF, "Bengali"),
+    (0x0A00, 0x0A7F, "Gurmukhi"),
+    (0x0A80, 0x0AFF, "Gujarati"),
+    (0x0B80, 0x0BFF, "Tamil"),
+    (0x0C00, 0x0C7F, "Telugu"),
+    (0x0C80, 0x0CFF, "Kannada"),
+    (0x0D00, 0x0D7F, "Malayalam"),
+    (0x0E00, 0x0E7F, "Thai"),
+    (0x10A0, 0x10FF, "Georgian"),
+    (0x1100, 0x11FF, "Hangul"),
+    (0x1E00, 0x1EFF, "Latin"),
+    (0x1F00, 0x1FFF, "Greek"),
+    (0x3040, 0x309F, "Kana"),
+    (0x30A0, 0x30FF, "Kana"),
+    (0x3130, 0x318F, "Hangul"),
+    (0x3400, 0x4DBF, "Han"),
+    (0x4E00, 0x9FFF, "Han"),
+    (0xAC00, 0xD7AF, "Hangul"),
+    (0xFF66, 0xFF9F, "Kana"),
+])
+RANGE_STARTS = [start for start, _, _ in SCRIPT_RANGES]
+
+# held while langdetect's process wide seed is set and used
+DETECTOR_LOCK = threading.Lock()
+
+# scripts written by one language (of the languages langdetect knows)
+SCRIPT_LANGUAGES = {
+    "Greek": "el", "Hebrew": "he", "Bengali": "bn", "Gurmukhi": "pa",
+    "Gujarati": "gu", "Tamil": "ta", "Telugu": "te", "Kannada": "kn",
+    "Malayalam": "ml", "Thai": "th", "Hangul": "ko", "Kana": "ja",
+}
+
+
+def script_of(char):
+    code = ord(char)
+    idx = bisect_right(RANGE_STARTS, code) - 1
+    if idx >= 0 and code <= SCRIPT_RANGES[idx][1]: return SCRIPT_RANGES[idx][2]
+    return None
+
+
+# The language of the script most letters of the text are written in,
+# if only one language uses it. None when the detector has to decide
+def language_of_script(text):
+    counts = {}
+    letters = 0
+    for char in text:
+        if not char.isalpha(): continue
+        letters = letters + 1
+        script = script_of(char)
+        if script is not None: counts[script] = counts.get(script, 0) + 1
+    if letters == 0: return None
+    # japanese mixes kana in with the han characters
+    if counts.get("Kana", 0) > 0 and counts.get("Kana", 0) + counts.get("Han", 0) > letters / 2: return "ja"
+    script = max(counts, key=counts.get) if counts else None
+    if script is None or counts[script] <= letters / 2: return None
+    return SCRIPT_LANGUAGES.get(script)
+
+
+class LanguageIdentifier:
+    def __init__(self, seed=0, cache_size=100000, max_text_length=200, max_domains=100000,
+                 prior_weight=1.0, min_prior_pages=3):
+        self.seed = seed
+        self.cache_size = cache_size
+        # longer texts are cut, the first words are enough to tell the language
+        self.max_text_length = max_text_length
+        self.max_domains = max_domains
+        self.prior_weight = prior_weight
+        self.min_prior_pages = min_prior_pages
+        # text hash -> ((language, probability), ...), least recently used first
+        self.cache = OrderedDict()
+        # domain -> {language: no of pages}, least recently used first
+        self.priors = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.script_shortcuts = 0
+
+    # The arguments to make an identifier with the same settings, e.g. in
+    # a worker process. The cache and the priors are not carried over
+    def settings(self):
+        return (self.seed, self.cache_size, self.max_text_length, self.max_domains,
+                self.prior_weight, self.min_prior_pages)
+
+    def detect(self, text, domain=None):
+        return self.choose(self.scores(text), domain)
+
+    def detect_batch(self, texts, domains=None):
+        if domains is None: domains = [None] * len(texts)
+        return [self.choose(scores, domain) for scores, domain in zip(self.scores_batch(texts), domains)]
+
+    # Candidate languages of the text with their probabilities, most
+    # likely first. () if there is nothing to detect
+    def scores(self, text):
+        return self.scores_batch([text])[0]
+
+    def scores_batch(self, texts):
+        keys = [self.key(text) for text in texts]
+        results = [None] * len(texts)
+        # idx of the texts to detect, one per distinct text
+        missing = {}
+        with self.lock:
+            for idx, key in enumerate(keys):
+                if key is None:
+                    results[idx] = ()
+                    continue
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.cache.move_to_end(key)
+                    self.hits = self.hits + 1
+                    results[idx] = cached
+                elif key not in missing:
+                    self.misses = self.misses + 1
+                    missing[key] = idx
+        detected = dict(zip(missing, self.compute_batch([texts[idx].strip()[:self.max_text_length] for idx in missing.values()])))
+        with self.lock:
+            for key, scores in detected.items():
+                self.cache[key] = scores
+                while len(self.cache) > self.cache_size: self.cache.popitem(last=False)
+        for idx, key in enumerate(keys):
+            if results[idx] is None: results[idx] = detected[key]
+        return results
+
+    def key(self, text):
+        if text is None: return None
+        text = text.strip()[:self.max_text_length]
+        if len(text) == 0: return None
+        return hashlib.blake2b(text.encode("utf-8", "replace"), digest_size=8).digest()
+
+    # The candidates of every text, the texts the script does not
+    # tell detected by langdetect, all under one hold of the lock
+    def compute_batch(self, texts):
+        results = [None] * len(texts)
+        to_detect = []
+        for idx, text in enumerate(texts):
+            # no letters to go by, e.g. a title of digits
+            if not any(char.isalpha() for char in text):
+                results[idx] = ()
+                continue
+            language = language_of_script(text)
+            if language is not None:
+                with self.lock: self.script_shortcuts = self.script_shortcuts + 1
+                results[idx] = ((language, 1.0),)
+            else: to_detect.append(idx)
+        if len(to_detect) == 0: return results
+        # imported here, so worker processes only load it when used
+        from langdetect import DetectorFactory, detect_langs
+        with DETECTOR_LOCK:
+            # langdetect samples the text, seeding it makes its answer repeatable
+            DetectorFactory.seed = self.seed
+            for idx in to_detect:
+                try:
+                    results[idx] = tuple((candidate.lang, candidate.prob) for candidate in detect_langs(texts[idx]))
+                except Exception as e:
+                    print(e)
+                    results[idx] = ()
+        return results
+
+    # The language of the candidates, given what was seen on the domain.
+    # Each candidate's probability is scaled up by the share of the
+    # domain's pages in its language, once the domain has a few pages
+    def choose(self, scores, domain=None):
+        prior = self.prior(domain)
+        if prior is None: return scores[0][0] if len(scores) > 0 else 'NA'
+        total = sum(prior.values())
+        if len(scores) == 0: return max(sorted(prior), key=prior.get)
+        best = None
+        best_weight = -1
+        for language, probability in scores:
+            weight = probability * (1 + self.prior_weight * prior.get(language, 0) / total)
+            if weight > best_weight:
+                best = language
+                best_weight = weight
+        return best
+
+    def prior(self, domain):
+        if domain is None: return None
+        with self.lock:
+            prior = self.priors.get(domain)
+            if prior is None or sum(prior.values()) < self.min_prior_pages: return None
+            return dict(prior)
+
+    # Count a page of the domain in the language, for its prior
+    def observe(self, domain, language):
+        if domain is None or language is None or language == 'NA': return
+        with self.lock:
+            prior = self.priors.get(domain)
+            if prior is None:
+                prior = {}
+                self.priors[domain] = prior
+                while len(self.priors) > self.max_domains: self.priors.popitem(last=False)
+            else: self.priors.move_to_end(domain)
+            prior[language] = prior.get(language, 0) + 1
+
+
+# Compare texts/sec of single calls, batches and the cache
+if __name__ == '__main__':
+    import time
+
+    titles = ["A short guide to the history of the old city {}".format(i) for i in range(200)]
+    titles = titles + ["旧市街の歴史への短いガイド {}".format(i) for i in range(200)]
+    titles = titles + ["Краткий путеводитель по истории города {}".format(i) for i in range(200)]
+    for name, run in (("single", lambda identifier: [identifier.detect(title) for title in titles]),
+                      ("batch", lambda identifier: identifier.detect_batch(titles))):
+        identifier = LanguageIdentifier()
+        for attempt in ("cold", "cached"):
+            started = time.time()
+            languages = run(identifier)
+            elapsed = time.time() - started
+            print("{:>6} {:>6}: {:.0f} texts/sec, {} languages".format(name, attempt, len(titles) / elapsed, len(set(languages))))
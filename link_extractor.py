@@ -0,0 +1,126 @@
+"""
+link_extractor.py
+----------------------------
+This is a set of functions to pull the only two things the crawler
+needs out of a page: its <title> and a random sample of its links.
+The streaming extractor tokenizes the html once with a regex, instead
+of building the full DOM with BeautifulSoup, and samples the links with
+reservoir sampling as it goes, so the full list of anchors is never
+kept in memory. It can also stop early after max_anchor_scan anchors.
+A body is decoded with the charset of its Content-Type header if the
+header gives one, else with the one its <meta charset> (or http-equiv)
+tag declares near the start of the page, else as utf-8, falling back
+to windows-1252 if it is not valid utf-8, as BeautifulSoup would.
+"""
+import codecs
+import html
+import random
+import re
+
+# comments, script/style blocks (skipped), the title and anchor tags
+TOKEN_PATTERN = re.compile(r'<!--.*?-->'
+                           r'|<(script|style)\b[^>]*>.*?</\1\s*>'
+                           r'|<title\b[^>]*>(.*?)</title\s*>'
+                           r'|<a(\s[^>]*)?>',
+                           re.IGNORECASE | re.DOTALL)
+
+HREF_PATTERN = re.compile(r'''(?:^|\s)href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.IGNORECASE)
+
+TAG_PATTERN = re.compile(r'<[^>]*>')
+
+# charset= of a Content-Type header, or of a <meta> tag of the page
+HEADER_CHARSET_PATTERN = re.compile(r'''charset\s*=\s*["']?\s*([\w.:-]+)''', re.IGNORECASE)
+META_CHARSET_PATTERN = re.compile(rb'''<meta\b[^>]*?charset\s*=\s*["']?\s*([\w.:-]+)''', re.IGNORECASE)
+
+# bytes of the page searched for a <meta> charset
+META_SCAN_BYTES = 4096
+
+
+class PageSummary:
+    # title: text of the first <title>, None if there is none
+    # links: hrefs of up to max_links anchors, picked at random
+    # language, size, timings, simhash: filled in by the cpu stage (see cpu_stage.py)
+    def __init__(self, title, links, language=None, size=None):
+        self.title = title
+        self.links = links
+        self.language = language
+        # (language, probability) candidates of the title, most likely first
+        self.language_scores = None
+        self.size = size
+        self.timings = {}
+        self.simhash = None
+        # set by the crawler in the incremental_recrawl mode: the page did
+        # not change since the last crawl, or is a near duplicate of a url
+        self.unchanged = False
+        self.duplicate_of = None
+
+
+# The charset a Content-Type header declares, or None. Not the ISO-8859-1
+# requests assumes for a text/* type without one
+def header_encoding(content_type):
+    if not content_type: return None
+    match = HEADER_CHARSET_PATTERN.search(content_type)
+    return match.group(1) if match else None
+
+
+# The charset the page itself declares, by a byte order mark or
+# a <meta> tag near its start, or None
+def declared_encoding(content):
+    if content.startswith(codecs.BOM_UTF8): return "utf-8-sig"
+    if content.startswith(codecs.BOM_UTF16_LE) or content.startswith(codecs.BOM_UTF16_BE): return "utf-16"
+    match = META_CHARSET_PATTERN.search(content[:META_SCAN_BYTES])
+    return match.group(1).decode("ascii") if match else None
+
+
+# Decode the body the same way for every extractor. encoding is the
+# charset of the Content-Type header, None if it declares none
+def decode_body(content, encoding):
+    if encoding is None: encoding = declared_encoding(content)
+    if encoding is not None:
+        try:
+            return content.decode(encoding, errors="replace")
+        except LookupError:
+            pass
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content.decode("windows-1252", errors="replace")
+
+
+def extract_streaming(content, encoding, max_links, max_anchor_scan=0, rng=random):
+    text = decode_body(content, encoding)
+    title = None
+    reservoir = []
+    anchors_seen = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        if match.group(2) is not None:
+            if title is None: title = html.unescape(TAG_PATTERN.sub("", match.group(2)))
+            continue
+        if match.group(0)[:2].lower() != "<a": continue
+        href = HREF_PATTERN.search(match.group(3) or "")
+        if href is None: continue
+        href = html.unescape(next(value for value in href.groups() if value is not None))
+        anchors_seen = anchors_seen + 1
+        # reservoir sampling, every anchor has the same chance to be kept
+        if len(reservoir) < max_links:
+            reservoir.append(href)
+        else:
+            idx = rng.randrange(anchors_seen)
+            if idx < max_links: reservoir[idx] = href
+        # enough anchors seen, stop once the title is known too
+        if max_anchor_scan > 0 and anchors_seen >= max_anchor_scan and title is not None: break
+    return PageSummary(title, reservoir)
+
+
+# Same summary, using a BeautifulSoup tree of the page
+def extract_from_soup(soup, max_links, rng=random):
+    title_tag = soup.find('title')
+    title = title_tag.text if title_tag is not None else None
+    all_child_list = soup.find_all('a', href=True)
+    child_node_count = len(all_child_list)
+    if(max_links <= child_node_count):
+        random_indexes = rng.sample(range(child_node_count), max_links)
+        random_elements = [all_child_list[i] for i in random_indexes]
+    else:
+        random_elements = all_child_list
+    return PageSummary(title, [child_link['href'] for child_link in random_elements])
@@ -0,0 +1,160 @@
+"""
+metrics.py
+----------------------------
+This is a class to time every stage of the crawl pipeline (DNS, robots,
+HEAD, GET, html parsing, language detection, geolocation, disk write,
+frontier push/pop) and count events such as the reasons urls are
+rejected. Stage timings go to fixed bucket histograms, so they cost
+the same no matter how long the crawl runs.
+A snapshot can be rendered as Prometheus text or json, and
+MetricsExporter writes both to disk every few seconds.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# upper bounds (seconds) of the histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+           0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        idx = 0
+        while seconds > BUCKETS[idx]: idx = idx + 1
+        self.counts[idx] = self.counts[idx] + 1
+        self.count = self.count + 1
+        self.total = self.total + seconds
+
+    # Upper bound of the bucket holding the q-th quantile
+    def quantile(self, q):
+        if self.count == 0: return 0
+        target = q * self.count
+        cumulative = 0
+        for idx, bucket_count in enumerate(self.counts):
+            cumulative = cumulative + bucket_count
+            if cumulative >= target: return BUCKETS[idx]
+        return BUCKETS[-1]
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # stage -> Histogram of its durations
+        self.stages = {}
+        # (counter name, label) -> count
+        self.counters = {}
+        self.started = time.time()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = Histogram()
+                self.stages[stage] = histogram
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def count(self, name, label="", by=1):
+        with self.lock:
+            self.counters[(name, label)] = self.counters.get((name, label), 0) + by
+
+    def to_json(self):
+        with self.lock:
+            stages = {stage: {"count": histogram.count,
+                              "total_seconds": histogram.total,
+                              "mean_seconds": histogram.total / histogram.count if histogram.count else 0,
+                              "p50_seconds": histogram.quantile(0.5),
+                              "p95_seconds": histogram.quantile(0.95),
+                              "buckets": dict(zip(("+Inf" if b == float("inf") else str(b) for b in BUCKETS), histogram.counts))}
+                      for stage, histogram in self.stages.items()}
+            counters = {}
+            for (name, label), value in self.counters.items():
+                counters.setdefault(name, {})[label] = value
+        return {"time": time.time(), "uptime_seconds": time.time() - self.started,
+                "stages": stages, "counters": counters}
+
+    def to_prometheus(self):
+        lines = ["# TYPE crawler_stage_seconds histogram"]
+        with self.lock:
+            for stage, histogram in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS, histogram.counts):
+                    cumulative = cumulative + bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append('crawler_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(stage, le, cumulative))
+                lines.append('crawler_stage_seconds_sum{{stage="{}"}} {}'.format(stage, histogram.total))
+                lines.append('crawler_stage_seconds_count{{stage="{}"}} {}'.format(stage, histogram.count))
+            names = sorted(set(name for name, label in self.counters))
+            for name in names:
+                lines.append("# TYPE crawler_{}_total counter".format(name))
+                for (counter_name, label), value in sorted(self.counters.items()):
+                    if counter_name != name: continue
+                    lines.append('crawler_{}_total{{reason="{}"}} {}'.format(name, label, value))
+        return "\n".join(lines) + "\n"
+
+    # One line per stage and counter, for the crawl summary
+    def summary_lines(self):
+        snapshot = self.to_json()
+        lines = []
+        for stage, stats in sorted(snapshot["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+            lines.append("Stage: {}, Count: {}, Total: {:.3f}s, Mean: {:.4f}s, p50 <= {}s, p95 <= {}s".format(
+                stage, stats["count"], stats["total_seconds"], stats["mean_seconds"], stats["p50_seconds"], stats["p95_seconds"]))
+        for name, values in sorted(snapshot["counters"].items()):
+            for label, value in sorted(values.items()):
+                lines.append("Counter: {}, Reason: {}, Count: {}".format(name, label, value))
+        return lines
+
+
+class MetricsExporter:
+    # Writes path.prom and path.json every interval seconds
+    def __init__(self, metrics, path, interval):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            write_atomic(self.path + ".prom", self.metrics.to_prometheus())
+            write_atomic(self.path + ".json", json.dumps(self.metrics.to_json()))
+        except OSError as e:
+            print(e)
+
+    # Stop the thread and write the last snapshot. Only the first call
+    # does anything, and the thread is joined first, so it is not
+    # writing the same files at the same time
+    def stop(self):
+        if self.stopped.is_set(): return
+        self.stopped.set()
+        if self.thread.is_alive(): self.thread.join()
+        self.write()
+
+
+def write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file: file.write(text)
+    os.replace(tmp_path, path)
@@ -0,0 +1,188 @@
+"""
+politeness.py
+----------------------------
+This is a class to keep the crawler polite per host, instead of
+throttling the whole crawler with a global sleep.
+Every host (registered domain, the same key as domain_frequency) gets
+a token bucket refilled at max_requests_per_second. A request to a
+host takes a token, and waits only if that host is out of tokens.
+pop_ready picks the best url of the frontier whose host has budget,
+so the crawler moves on to ready hosts instead of sleeping.
+The rate of every host adapts to how the host copes (AIMD): it is cut
+by backoff on a 429, 503 or timeout, the host is not sent anything till
+its Retry-After has passed, and the rate grows back by increase after
+every success, up to max_rate (never below the start rate). The caller
+cuts the rate once per url: retries of a url that failed again only
+pause the host for their Retry-After, so a single broken page does not
+take its host down to min_rate. LatencyTracker sets the timeout of every
+host from its observed latency.
+"""
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+
+class HostScheduler:
+    # rate is the rate every host starts at. Without min_rate/max_rate
+    # the rate of a host never changes
+    def __init__(self, rate, burst, max_hosts, min_rate=None, max_rate=None, increase=0, backoff=0.5):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_hosts = max_hosts
+        self.min_rate = min(rate, min_rate) if min_rate is not None else rate
+        # a host that answers fine grows back to at least the start rate
+        self.max_rate = max(rate, max_rate) if max_rate is not None else rate
+        self.increase = increase
+        self.backoff = backoff
+        # host -> [tokens, last refill time, rate, no request before].
+        # tokens go below zero when requests are queued up behind the bucket
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.waits = 0
+        self.backoffs = 0
+
+    def refill(self, key, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_hosts: self.evict_idle(now)
+            bucket = [self.burst, now, self.rate, 0]
+            self.buckets[key] = bucket
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * bucket[2])
+            bucket[1] = now
+        return bucket
+
+    # A full bucket at the start rate is the same as a missing one,
+    # so drop them to keep memory bounded on crawls over many hosts
+    def evict_idle(self, now):
+        for key in list(self.buckets):
+            tokens, last, rate, blocked_until = self.buckets[key]
+            if blocked_until > now or rate < self.rate: continue
+            if tokens + (now - last) * rate >= self.burst: del self.buckets[key]
+
+    # Seconds until the host has a token, 0 if it has one now
+    def wait_time(self, key):
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.refill(key, now)
+            blocked = max(0, bucket[3] - now)
+            if bucket[0] >= 1: return blocked
+            return max(blocked, (1 - bucket[0]) / bucket[2])
+
+    # Take a token for the host. Returns the seconds the
+    # caller has to wait before sending its request
+    def reserve(self, key):
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.refill(key, now)
+            blocked = max(0, bucket[3] - now)
+            bucket[0] = bucket[0] - 1
+            if bucket[0] >= 0 and blocked == 0: return 0
+            self.waits = self.waits + 1
+            return max(blocked, -bucket[0] / bucket[2])
+
+    # The host answered fine: grow its rate a little (additive increase)
+    def on_success(self, key):
+        with self.lock:
+            bucket = self.refill(key, time.monotonic())
+            bucket[2] = min(self.max_rate, bucket[2] + self.increase)
+
+    # The host is overloaded (429, 503, timeout): cut its rate
+    # (multiplicative decrease), and pause it for retry_after seconds
+    def on_throttle(self, key, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.refill(key, now)
+            bucket[2] = max(self.min_rate, bucket[2] * self.backoff)
+            if retry_after is not None: bucket[3] = max(bucket[3], now + retry_after)
+            self.backoffs = self.backoffs + 1
+
+    # Do not send the host anything for retry_after seconds, keeping its rate
+    def pause(self, key, retry_after):
+        if retry_after is None: return
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.refill(key, now)
+            bucket[3] = max(bucket[3], now + retry_after)
+
+    # Current request rate of the host
+    def rate_of(self, key):
+        with self.lock:
+            bucket = self.buckets.get(key)
+            return bucket[2] if bucket is not None else self.rate
+
+    # No of hosts running below the start rate
+    def slowed_hosts(self):
+        with self.lock:
+            return sum(1 for bucket in self.buckets.values() if bucket[2] < self.rate)
+
+    # Block till the host has budget for one more request.
+    # Returns the seconds waited
+    def acquire(self, key):
+        delay = self.reserve(key)
+        if delay > 0: time.sleep(delay)
+        return delay
+
+
+class LatencyTracker:
+    # Timeout of a host from its smoothed latency and latency deviation,
+    # the way TCP sets its retransmission timeout, kept within
+    # [min_timeout, max_timeout]. Hosts not seen yet get default_timeout
+    def __init__(self, default_timeout, min_timeout, max_timeout, max_hosts):
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.max_hosts = max_hosts
+        # host -> [smoothed latency, latency deviation], least recently used first
+        self.hosts = OrderedDict()
+        self.lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self.lock:
+            stats = self.hosts.get(key)
+            if stats is None:
+                self.hosts[key] = [seconds, seconds / 2]
+                while len(self.hosts) > self.max_hosts: self.hosts.popitem(last=False)
+                return
+            self.hosts.move_to_end(key)
+            stats[1] = 0.75 * stats[1] + 0.25 * abs(stats[0] - seconds)
+            stats[0] = 0.875 * stats[0] + 0.125 * seconds
+
+    def timeout(self, key):
+        with self.lock:
+            stats = self.hosts.get(key)
+            if stats is None: return self.default_timeout
+            return min(self.max_timeout, max(self.min_timeout, stats[0] + 4 * stats[1]))
+
+
+# Seconds to wait from a Retry-After header, given in seconds or as
+# an http date. None if missing or not understood
+def parse_retry_after(value):
+    if value is None: return None
+    value = value.strip()
+    if value.isdigit(): return int(value)
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Pop the highest priority entry of the frontier whose host is ready,
+# looking at most max_scan entries deep. Entries of busy hosts are put back.
+# Returns (entry, 0), or (None, seconds till the first scanned host is ready)
+def pop_ready(frontier, wait_time_of, max_scan):
+    deferred = []
+    ready_entry = None
+    wait = 0
+    while len(frontier) > 0 and len(deferred) < max_scan:
+        entry = frontier.pop()
+        entry_wait = wait_time_of(entry[1])
+        if entry_wait <= 0:
+            ready_entry = entry
+            break
+        if len(deferred) == 0 or entry_wait < wait: wait = entry_wait
+        deferred.append(entry)
+    for entry in deferred: frontier.push(entry)
+    if ready_entry is not None: return ready_entry, 0
+    return None, wait
@@ -0,0 +1,153 @@
+"""
+recrawl_store.py
+----------------------------
+This is a class to remember the pages of previous crawls, so a crawl
+run again only downloads and stores what changed.
+Every page fetched is saved in a sqlite database with its ETag and
+Last-Modified headers, a hash of its body, a simhash of its text, and
+its title, language, sampled links and size. The next crawl sends
+If-None-Match/If-Modified-Since, and on a 304 (or a body with the same
+hash) the saved summary stands in for the page, so it is neither parsed
+nor stored again, but its links are still followed.
+Pages whose simhash is within a few bits of a page under another url
+are near duplicates. The 64 bit simhashes are split in 4 bands of 16
+bits, indexed, so a page within 3 bits of another shares at least one
+band with it and is found without comparing against every page.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from link_extractor import PageSummary, decode_body
+from visited_set import fingerprint
+
+BANDS = 4
+BAND_BITS = 64 // BANDS
+MAX_SHINGLES = 4096
+TAG_PATTERN = re.compile(r'<(script|style)\b[^>]*>.*?</\1\s*>|<[^>]*>', re.IGNORECASE | re.DOTALL)
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def content_hash(content):
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+# 64 bit simhash of the text of an html page, over 3 word shingles
+def simhash(content, encoding):
+    words = WORD_PATTERN.findall(TAG_PATTERN.sub(" ", decode_body(content, encoding)).lower())
+    if len(words) >= 3: shingles = [" ".join(words[i:i + 3]) for i in range(min(len(words) - 2, MAX_SHINGLES))]
+    else: shingles = words
+    counts = [0] * 64
+    for shingle in shingles:
+        value = fingerprint(shingle)
+        for bit in range(64):
+            if value >> bit & 1: counts[bit] = counts[bit] + 1
+            else: counts[bit] = counts[bit] - 1
+    result = 0
+    for bit in range(64):
+        if counts[bit] > 0: result = result | (1 << bit)
+    return result
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+# sqlite integers are signed 64 bit
+def to_signed(value):
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class RecrawlStore:
+    def __init__(self, path, commit_every=200):
+        self.path = path
+        self.commit_every = commit_every
+        self.lock = threading.Lock()
+        # shared by the fetch threads of the ASYNC crawl mode, under the lock
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                        "content_hash TEXT, simhash INTEGER, title TEXT, language TEXT, links TEXT, "
+                        "size INTEGER, fetch_time REAL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS simhash_bands (band INTEGER, value INTEGER, url TEXT, "
+                        "PRIMARY KEY (band, value, url)) WITHOUT ROWID")
+        self.db.commit()
+        self.pending = 0
+
+    # Headers to make the GET of the url conditional, from its last fetch
+    def conditional_headers(self, url):
+        with self.lock:
+            row = self.db.execute("SELECT etag, last_modified FROM pages WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row is None: return headers
+        if row[0]: headers["If-None-Match"] = row[0]
+        if row[1]: headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def content_hash_of(self, url):
+        with self.lock:
+            row = self.db.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row is not None else None
+
+    # The summary of the url's page saved by its last fetch, or None
+    def page(self, url):
+        with self.lock:
+            row = self.db.execute("SELECT title, links, language, size FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None: return None
+        return PageSummary(row[0], json.loads(row[1]), row[2], row[3])
+
+    def save(self, url, etag, last_modified, body_hash, page_simhash, page):
+        with self.lock:
+            old = self.db.execute("SELECT simhash FROM pages WHERE url = ?", (url,)).fetchone()
+            if old is not None and old[0] is not None: self.remove_bands(url, to_unsigned(old[0]))
+            self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (url, etag, last_modified, body_hash,
+                             to_signed(page_simhash) if page_simhash is not None else None,
+                             page.title, page.language, json.dumps(page.links), page.size, time.time()))
+            if page_simhash is not None:
+                self.db.executemany("INSERT OR IGNORE INTO simhash_bands VALUES (?, ?, ?)",
+                                    [(band, value, url) for band, value in enumerate(bands(page_simhash))])
+            self.pending = self.pending + 1
+            if self.pending >= self.commit_every: self.commit()
+
+    def remove_bands(self, url, page_simhash):
+        self.db.executemany("DELETE FROM simhash_bands WHERE band = ? AND value = ? AND url = ?",
+                            [(band, value, url) for band, value in enumerate(bands(page_simhash))])
+
+    # A url other than this one whose page is within max_distance bits
+    # of the simhash (max_distance < BANDS), or None
+    def find_near_duplicate(self, url, page_simhash, max_distance):
+        with self.lock:
+            for band, value in enumerate(bands(page_simhash)):
+                rows = self.db.execute("SELECT p.url, p.simhash FROM simhash_bands b JOIN pages p ON p.url = b.url "
+                                       "WHERE b.band = ? AND b.value = ? AND b.url != ? LIMIT 64",
+                                       (band, value, url)).fetchall()
+                for other_url, other_simhash in rows:
+                    if hamming_distance(page_simhash, to_unsigned(other_simhash)) <= max_distance: return other_url
+        return None
+
+    def commit(self):
+        self.db.commit()
+        self.pending = 0
+
+    def flush(self):
+        with self.lock: self.commit()
+
+    def close(self):
+        with self.lock:
+            self.commit()
+            self.db.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+
+def bands(page_simhash):
+    mask = (1 << BAND_BITS) - 1
+    return [(page_simhash >> (band * BAND_BITS)) & mask for band in range(BANDS)]
@@ -0,0 +1,68 @@
+"""
+response_store.py
+----------------------------
+This is a class to keep the pages fetched while scoring a url, so that
+the same response (body, headers and extracted title/links) can be reused when
+the url is dequeued and parsed, instead of downloading it again.
+The store is bounded by number of entries, total body bytes and age,
+so memory stays flat on long crawls.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseStore:
+    def __init__(self, max_entries, max_bytes, max_age):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        # url -> (time stored, size, response, page summary)
+        # kept in insertion order, so the oldest entries are evicted first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, url, response, page):
+        size = len(response.content)
+        # A single page bigger than the whole budget is not worth keeping
+        if size > self.max_bytes: return
+        with self.lock:
+            if url in self.entries: self.remove_entry(url)
+            self.entries[url] = (time.monotonic(), size, response, page)
+            self.total_bytes = self.total_bytes + size
+            self.evict()
+
+    # Returns (response, page) and removes the entry, as a page
+    # is only parsed once. Returns None if the page is not stored
+    def take(self, url):
+        with self.lock:
+            self.evict()
+            if url not in self.entries:
+                self.misses = self.misses + 1
+                return None
+            stored_at, size, response, page = self.remove_entry(url)
+            self.hits = self.hits + 1
+            return response, page
+
+    def remove_entry(self, url):
+        entry = self.entries.pop(url)
+        self.total_bytes = self.total_bytes - entry[1]
+        return entry
+
+    # Drop expired entries, then the oldest ones till within budget
+    def evict(self):
+        now = time.monotonic()
+        while len(self.entries) > 0:
+            url, entry = next(iter(self.entries.items()))
+            too_old = now - entry[0] > self.max_age
+            too_big = len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes
+            if not (too_old or too_big): break
+            self.remove_entry(url)
+            self.evictions = self.evictions + 1
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,96 @@
+"""
+robots_cache.py
+----------------------------
+This is a class to cache the robots.txt rules of every host visited,
+so that a host's robots.txt is downloaded once per TTL instead of once
+for every link found on it.
+Entries are keyed by scheme + host, expire after a TTL and the least
+recently used ones are evicted once the cache is full. Hosts whose
+robots.txt could not be fetched are cached as well (negative caching),
+for a shorter TTL.
+robots.txt is downloaded with http_get (e.g. the crawler's HttpPool.get)
+when one is given, with urllib otherwise.
+"""
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from urllib import robotparser
+from urllib.parse import urlparse
+
+
+class RobotsCache:
+    def __init__(self, ttl, negative_ttl, max_entries, timeout=3, user_agent="*", http_get=None):
+        self.ttl = ttl
+        self.http_get = http_get
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.user_agent = user_agent
+        # scheme://host -> (expiry time, parser or None if unreachable)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_entries = 0
+
+    # Returns True if the robots.txt of the url's host allows crawling it
+    def can_fetch(self, url):
+        parts = urlparse(url)
+        key = parts.scheme + "://" + parts.netloc
+        parser = self.get_parser(key)
+        # robots.txt was unreachable, do not crawl the host
+        if parser is None: return False
+        return parser.can_fetch(self.user_agent, url)
+
+    def get_parser(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits = self.hits + 1
+                return entry[1]
+            self.misses = self.misses + 1
+
+        # Fetch outside the lock, so other hosts are not blocked.
+        # Two threads may fetch the same host at once, the later one wins
+        parser = self.fetch_robots(key)
+        ttl = self.ttl if parser is not None else self.negative_ttl
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, parser)
+            self.entries.move_to_end(key)
+            if parser is None: self.negative_entries = self.negative_entries + 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return parser
+
+    # Same handling of the http status as RobotFileParser.read,
+    # but with a timeout. Returns None if the host is unreachable
+    def fetch_robots(self, key):
+        parser = robotparser.RobotFileParser()
+        parser.set_url(key + "/robots.txt")
+        try:
+            status, text = self.download(key + "/robots.txt")
+        except Exception:
+            return None
+        if status in (401, 403): parser.disallow_all = True
+        elif status >= 400 and status < 500: parser.allow_all = True
+        elif status >= 300: return None
+        else: parser.parse(text.splitlines())
+        return parser
+
+    # Returns (http status, body text) of the robots.txt url
+    def download(self, robots_url):
+        if self.http_get is not None:
+            response = self.http_get(robots_url, timeout=self.timeout)
+            return response.status_code, response.text
+        try:
+            with urllib.request.urlopen(robots_url, timeout=self.timeout) as f:
+                return f.status, f.read().decode("utf-8", errors="ignore")
+        except urllib.error.HTTPError as err:
+            return err.code, ""
+
+    def __len__(self):
+        return len(self.entries)
@@ -3,30 +3,210 @@ seed_loader.py
 Mehran Ali Banka - Sep 2023
 ----------------------------
 This is a class to deal with operations involving a initial seed list
-
+The seeds are streamed through a pipeline of generators, so a list of
+tens of millions of urls is never held in memory:
+ - read: lines of a plain, gzip or zstd file (told apart by their first
+   bytes), or the results of a search engine (SearchEngineSource)
+ - normalize: skip blank and comment lines, lower case the scheme and
+   host, drop default ports and fragments, keep http(s) urls only
+ - shard: keep the seeds of shard i of n, by host, so parallel workers
+   reading the same list crawl different hosts
+ - dedup: drop urls already seen, in a bloom filter of fixed size, no
+   bigger than needed for max_number_of_seeds urls (only the urls kept
+   are added to it)
+ - limit: stop after max_number_of_seeds, and release the file and the
+   bloom filter of the stages above right away
+LocalSearchService answers search queries from a list of urls, as a
+stand-in for a search engine: run seed_loader.py <url file> [port]
 """
+import gzip
+import io
+import itertools
+import json
+import logging
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit, urlencode, parse_qs
+from visited_set import BloomSlice, fingerprint
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
 
-def get_seeder_list(file_path, seeding_strategy):
-   
-  if(seeding_strategy == "READ_FROM_PRE_CREATED_LIST"): return load_seeds_from_file(file_path)
-  elif(seeding_strategy == "GET_FROM_SEARCH_ENGINE"): return load_seeds_from_search_engine()
-  
+# The seeds of the seeding strategy, as a generator.
+# search_source is any object with a seeds() method yielding urls
+def get_seeder_list(file_path, seeding_strategy, max_seeds=None, shard_index=0, shard_count=1,
+                    dedup_capacity=1 << 24, dedup_error_rate=0.001, search_source=None):
+    if(seeding_strategy == "READ_FROM_PRE_CREATED_LIST"): urls = load_seeds_from_file(file_path)
+    elif(seeding_strategy == "GET_FROM_SEARCH_ENGINE"): urls = load_seeds_from_search_engine(search_source)
+    else: raise ValueError("Unknown seeding strategy: {}".format(seeding_strategy))
+    urls = normalize_urls(urls)
+    if(shard_count > 1): urls = shard(urls, shard_index, shard_count)
+    if(max_seeds is not None): dedup_capacity = max(1, min(dedup_capacity, max_seeds))
+    urls = dedup(urls, dedup_capacity, dedup_error_rate)
+    if(max_seeds is not None): urls = limit(urls, max_seeds)
+    return urls
 
+
+# The lines of the file, read line by line
 def load_seeds_from_file(file_path):
-   # read all the seeds line by line
-   # Open the file in read mode
-   # Create an empty list to store the lines
-   seed_list = []
-   with open(file_path, 'r') as file:
-        # Iterate over the lines of the file
-        for line in file:
-          # Remove the newline character at the end of the line
-          line = line.strip()
-          # Append the line to the list
-          seed_list.append(line)
-   
-   return seed_list
-
-
-def load_seeds_from_search_engine():
-   return None
\ No newline at end of file
+    with open_seed_file(file_path) as file:
+        for line in file: yield line
+
+
+def load_seeds_from_search_engine(search_source):
+    if(search_source is None): raise ValueError("GET_FROM_SEARCH_ENGINE needs a search source")
+    yield from search_source.seeds()
+
+
+# A text file, decompressed on the fly if it is gzip or zstd
+def open_seed_file(file_path):
+    raw = open(file_path, "rb")
+    magic = raw.read(4)
+    raw.seek(0)
+    if(magic.startswith(GZIP_MAGIC)):
+        stream = gzip.GzipFile(fileobj=raw)
+    elif(magic == ZSTD_MAGIC):
+        # imported here, as only zstd files need it
+        import zstandard
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+    else: stream = raw
+    return io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+
+
+def normalize_urls(urls):
+    for url in urls:
+        url = normalize_url(url)
+        if(url is not None): yield url
+
+
+# The url in a single form, or None if it is not an http(s) url
+def normalize_url(url):
+    url = url.strip()
+    if(len(url) == 0 or url.startswith("#")): return None
+    if("://" not in url): url = "http://" + url
+    try:
+        parts = urlsplit(url)
+        host = parts.hostname
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if(scheme not in DEFAULT_PORTS or not(host) or any(char.isspace() for char in host)): return None
+    netloc = "[" + host + "]" if ":" in host else host
+    if(port is not None and port != DEFAULT_PORTS[scheme]): netloc = netloc + ":" + str(port)
+    return urlunsplit((scheme, netloc, parts.path, parts.query, ""))
+
+
+# The urls of shard shard_index of shard_count, every url of a host in the same shard
+def shard(urls, shard_index, shard_count):
+    for url in urls:
+        if(fingerprint(urlsplit(url).netloc) % shard_count == shard_index): yield url
+
+
+# The urls not seen before. A bloom filter sized for capacity urls keeps
+# the memory fixed, at the cost of dropping a share error_rate of new urls
+def dedup(urls, capacity, error_rate):
+    seen = BloomSlice(None, capacity, error_rate)
+    try:
+        for url in urls:
+            value = fingerprint(url)
+            if(value in seen): continue
+            seen.add(value)
+            yield url
+    finally:
+        seen.close()
+
+
+# The first max_seeds urls. The generators the urls come from are
+# closed as soon as the last one is taken, not when garbage collected
+def limit(urls, max_seeds):
+    try:
+        if(max_seeds > 0): yield from itertools.islice(urls, max_seeds)
+    finally:
+        urls.close()
+
+
+class SearchEngineSource:
+    # Every query is sent as GET endpoint?q=<query>&count=<results_per_query>,
+    # the answer is json, {"results": [{"url": ...}, ...]} or a list of urls.
+    # Failed queries are logged to logger, any object with a warning method
+    def __init__(self, endpoint, queries, results_per_query, timeout=10, logger=None):
+        self.endpoint = endpoint
+        self.queries = queries
+        self.results_per_query = results_per_query
+        self.timeout = timeout
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+
+    def search(self, query):
+        separator = "&" if "?" in self.endpoint else "?"
+        url = self.endpoint + separator + urlencode({"q": query, "count": self.results_per_query})
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            answer = json.load(response)
+        results = answer.get("results", []) if isinstance(answer, dict) else answer
+        return [result["url"] if isinstance(result, dict) else result for result in results]
+
+    def seeds(self):
+        for query in self.queries:
+            try:
+                yield from self.search(query)
+            except (OSError, ValueError, KeyError) as e:
+                # the other queries may still give seeds
+                self.logger.warning("Search query {!r} failed: {!r}".format(query, e))
+
+
+class LocalSearchService:
+    # Answers GET /search?q=<query>&count=<n> with the first n urls
+    # containing the query, in the format SearchEngineSource reads
+    def __init__(self, urls, port=0):
+        self.urls = list(urls)
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if(parts.path != "/search"):
+                    self.send_error(404)
+                    return
+                query = parse_qs(parts.query)
+                body = json.dumps({"results": [{"url": url} for url in service.search(query.get("q", [""])[0], int(query.get("count", ["10"])[0]))]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.endpoint = "http://127.0.0.1:{}/search".format(self.port)
+
+    def search(self, query, count):
+        query = query.lower()
+        return list(itertools.islice((url for url in self.urls if query in url.lower()), count))
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Serve the urls of a seed file as a stand-in search engine
+if __name__ == '__main__':
+    import sys
+
+    if(len(sys.argv) < 2):
+        print("Run: python seed_loader.py <url file> [port]")
+        sys.exit(2)
+    service = LocalSearchService(normalize_urls(load_seeds_from_file(sys.argv[1])),
+                                 int(sys.argv[2]) if len(sys.argv) > 2 else 8765)
+    print("Serving {} urls at {}".format(len(service.urls), service.endpoint))
+    service.server.serve_forever()
@@ -0,0 +1,185 @@
+"""
+seed_scheduler.py
+----------------------------
+This is a class to crawl several seeds at once, instead of one after
+the other. Up to max_active seeds are crawled at a time, each with its
+own queue of urls and budgets (max pages, max seconds). To the crawl
+loop the scheduler is the one frontier: urls are pushed to the seed
+whose page they were found on, and the next url is picked from the
+seeds by deficit round robin, so every seed gets the same share of the
+crawler's time (quantum seconds per turn) and a slow seed cannot hold
+the others up. When a seed runs out of urls or budget, the next seed of
+the list takes its place. The seeds are read one at a time, so they can
+be streamed (see seed_loader.py).
+"""
+import time
+from politeness import pop_ready
+
+
+class SeedCrawl:
+    def __init__(self, idx, seed, frontier, pages=0, elapsed=0.0):
+        self.idx = idx
+        self.seed = seed
+        self.frontier = frontier
+        self.pages = pages
+        # seconds active before a restart, and the time it (re)started
+        self.elapsed = elapsed
+        self.started = time.time()
+        # seconds of crawling this seed can still take in its turn
+        self.deficit = 0.0
+        self.time_spent = 0.0
+        self.stop_reason = None
+
+    def seconds_active(self):
+        return self.elapsed + time.time() - self.started
+
+
+class SeedScheduler:
+    # seeds: an iterable of seed urls, new_frontier(name) -> an empty frontier,
+    # start_seed(seed, frontier) -> queues the seed, False if it was already crawled
+    def __init__(self, seeds, new_frontier, start_seed, max_active, max_pages, max_seconds, quantum):
+        self.seeds = iter(seeds)
+        # no of seeds read from seeds
+        self.seeds_read = 0
+        self.seeds_done = False
+        self.new_frontier = new_frontier
+        self.start_seed = start_seed
+        self.max_active = max(1, max_active)
+        self.max_pages = max_pages
+        self.max_seconds = max_seconds
+        self.quantum = quantum
+        self.active = []
+        # seeds done, their frontiers are closed by close_finished
+        self.finished = []
+        self.to_close = []
+        # idx of the next seed of the list to start
+        self.next_seed = 0
+        # position of the seed whose turn it is, and the seed of the
+        # page being parsed, which gets the urls pushed
+        self.turn = 0
+        self.current = None
+
+    # The next seed of the list to start, or None once the list is done.
+    # Seeds before next_seed (started before a restart) are skipped
+    def take_seed(self):
+        for seed in self.seeds:
+            self.seeds_read = self.seeds_read + 1
+            if self.seeds_read <= self.next_seed: continue
+            self.next_seed = self.seeds_read
+            return seed
+        self.seeds_done = True
+        return None
+
+    # Start seeds till max_active are active, or the list is done
+    def fill(self):
+        while len(self.active) < self.max_active and not self.seeds_done:
+            idx = self.next_seed
+            seed = self.take_seed()
+            if seed is None: break
+            crawl = SeedCrawl(idx, seed, self.new_frontier("seed-{}".format(idx)))
+            self.active.append(crawl)
+            self.current = crawl
+            if not self.start_seed(crawl.seed, crawl.frontier): self.finish(crawl, "already crawled")
+            elif len(crawl.frontier) == 0: self.finish(crawl, "seed rejected")
+        self.current = None
+
+    # Carry on a seed, e.g. the one a checkpoint was taken in
+    def resume_seed(self, idx, seed, frontier, pages=0, elapsed=0.0):
+        self.active.append(SeedCrawl(idx, seed, frontier, pages, elapsed))
+        self.next_seed = max(self.next_seed, idx + 1)
+
+    def push(self, entry):
+        self.current.frontier.push(entry)
+
+    def __len__(self):
+        return sum(len(crawl.frontier) for crawl in self.active)
+
+    # The next url of the seeds whose turn it is, whose host has budget.
+    # Returns (entry, 0), or (None, seconds to wait) if every host is busy
+    def pop_ready(self, wait_time_of, max_scan):
+        wait = None
+        for _ in range(2 * len(self.active)):
+            crawl = self.active[self.turn % len(self.active)]
+            if crawl.deficit <= 0 or len(crawl.frontier) == 0:
+                # next seed's turn, an empty seed keeps no credit
+                if len(crawl.frontier) == 0: crawl.deficit = 0.0
+                self.turn = (self.turn + 1) % len(self.active)
+                crawl = self.active[self.turn]
+                crawl.deficit = crawl.deficit + self.quantum
+                if len(crawl.frontier) == 0: continue
+            entry, entry_wait = pop_ready(crawl.frontier, wait_time_of, max_scan)
+            if entry is not None:
+                self.current = crawl
+                return entry, 0
+            # every host of this seed is busy, try the next one
+            crawl.deficit = 0.0
+            if wait is None or entry_wait < wait: wait = entry_wait
+        return None, wait or 0
+
+    # The page popped last was parsed, in seconds. Charges its seed and
+    # returns the seeds that are done, which are replaced by new ones
+    def page_done(self, seconds):
+        crawl = self.current
+        crawl.pages = crawl.pages + 1
+        crawl.deficit = crawl.deficit - seconds
+        crawl.time_spent = crawl.time_spent + seconds
+        done = []
+        for crawl in list(self.active):
+            if len(crawl.frontier) == 0: reason = "frontier empty"
+            elif crawl.pages > self.max_pages: reason = "page budget"
+            elif crawl.seconds_active() > self.max_seconds: reason = "time budget"
+            else: continue
+            self.finish(crawl, reason)
+            done.append(crawl)
+        self.current = None
+        self.fill()
+        return done
+
+    def finish(self, crawl, reason):
+        crawl.stop_reason = reason
+        crawl.elapsed = crawl.seconds_active()
+        self.active.remove(crawl)
+        self.finished.append(crawl)
+        self.to_close.append(crawl)
+        if len(self.active) > 0: self.turn = self.turn % len(self.active)
+        else: self.turn = 0
+
+    # Close the frontiers of the seeds that are done. With checkpoints,
+    # only once a checkpoint without them is saved
+    def close_finished(self):
+        for crawl in self.to_close: crawl.frontier.close()
+        self.to_close = []
+
+    # One line per seed started, in the order of the list
+    def progress_lines(self):
+        lines = []
+        for crawl in sorted(self.active + self.finished, key=lambda crawl: crawl.idx):
+            lines.append("Seed {}: {}, Pages: {}/{}, Queued: {}, Seconds: {:.0f}/{}, Crawl Time: {:.1f}s, State: {}".format(
+                crawl.idx, crawl.seed, crawl.pages, self.max_pages,
+                len(crawl.frontier) if crawl.stop_reason is None else 0,
+                crawl.seconds_active() if crawl.stop_reason is None else crawl.elapsed, self.max_seconds,
+                crawl.time_spent, "active" if crawl.stop_reason is None else "done ({})".format(crawl.stop_reason)))
+        return lines
+
+    # Save the active seeds, returns a json-able description used by resume.
+    # Call checkpoint_saved once the description is safely on disk
+    def checkpoint(self):
+        return {"type": "SEEDS",
+                "next_seed": self.next_seed,
+                "active": [{"idx": crawl.idx, "seed": crawl.seed, "pages": crawl.pages, "elapsed": crawl.seconds_active(),
+                            "frontier": crawl.frontier.checkpoint()} for crawl in self.active]}
+
+    def checkpoint_saved(self):
+        for crawl in self.active: crawl.frontier.checkpoint_saved()
+        self.close_finished()
+
+    # restore_frontier(state) -> a frontier saved by checkpoint
+    def resume(self, state, restore_frontier):
+        for crawl in state["active"]:
+            self.resume_seed(crawl["idx"], crawl["seed"], restore_frontier(crawl["frontier"]),
+                             crawl["pages"], crawl["elapsed"])
+        self.next_seed = state["next_seed"]
+
+    def close(self):
+        for crawl in self.active: crawl.frontier.close()
+        self.close_finished()
@@ -0,0 +1,163 @@
+"""
+segment_store.py
+----------------------------
+This is a set of classes to store the crawled pages packed into large,
+append only segment files (in the spirit of WARC), instead of one small
+file per page.
+Every record holds the url, fetch time, http status and headers, and the
+body, optionally compressed. Records are written through a large buffer
+and segments roll over at max_segment_bytes. Every segment has a sidecar
+index (segment-NNNNN.idx, one "offset<TAB>url" line per record), so a
+record can be read back by url without scanning the segments.
+
+Record layout: MAGIC, header length (4 bytes), body length (8 bytes),
+the header as utf-8 json, then the body.
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b"CRSR"
+RECORD_HEADER = struct.Struct("<4sIQ")
+
+
+class Record:
+    def __init__(self, url, fetch_time, status, headers, body, title=None):
+        self.url = url
+        self.fetch_time = fetch_time
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.title = title
+
+
+class SegmentWriter:
+    def __init__(self, root, max_segment_bytes, compress=True, buffer_bytes=1 << 20):
+        self.root = root
+        self.max_segment_bytes = max_segment_bytes
+        self.compress = compress
+        self.buffer_bytes = buffer_bytes
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        # never append to the segments of a previous run, start a new one
+        existing = [segment_number(path) for path in glob.glob(os.path.join(root, "segment-*.seg"))]
+        self.segment_no = max(existing) + 1 if existing else 0
+        self.segment = None
+        self.index = None
+        self.offset = 0
+        self.records = 0
+        self.bytes_written = 0
+
+    def open_segment(self):
+        path = os.path.join(self.root, "segment-{:05d}".format(self.segment_no))
+        self.segment = open(path + ".seg", "ab", buffering=self.buffer_bytes)
+        self.index = open(path + ".idx", "a", encoding="utf-8", buffering=self.buffer_bytes)
+        self.offset = self.segment.tell()
+
+    def close_segment(self):
+        if self.segment is None: return
+        self.segment.close()
+        self.index.close()
+        self.segment = None
+        self.index = None
+        self.segment_no = self.segment_no + 1
+
+    def write(self, url, status, headers, body, title=None, fetch_time=None):
+        header = {"url": url,
+                  "fetch_time": fetch_time if fetch_time is not None else time.time(),
+                  "status": status,
+                  "headers": dict(headers),
+                  "title": title,
+                  "encoding": "deflate" if self.compress else "identity"}
+        header_bytes = json.dumps(header).encode("utf-8")
+        if self.compress: body = zlib.compress(body)
+        with self.lock:
+            if self.segment is None: self.open_segment()
+            offset = self.offset
+            self.segment.write(RECORD_HEADER.pack(MAGIC, len(header_bytes), len(body)))
+            self.segment.write(header_bytes)
+            self.segment.write(body)
+            self.index.write("{}\t{}\n".format(offset, url))
+            size = RECORD_HEADER.size + len(header_bytes) + len(body)
+            self.offset = self.offset + size
+            self.records = self.records + 1
+            self.bytes_written = self.bytes_written + size
+            if self.offset >= self.max_segment_bytes: self.close_segment()
+
+    # Push the buffered records to disk
+    def flush(self):
+        with self.lock:
+            if self.segment is None: return
+            self.segment.flush()
+            self.index.flush()
+
+    def close(self):
+        with self.lock:
+            self.close_segment()
+
+
+class SegmentReader:
+    def __init__(self, root):
+        self.root = root
+        self.segments = sorted(glob.glob(os.path.join(root, "segment-*.seg")), key=segment_number)
+        self.index = None
+
+    # Iterate over every record of every segment, in write order
+    def __iter__(self):
+        for path in self.segments:
+            for record in iterate_segment(path): yield record
+
+    # Returns the last record written for the url, or None
+    def lookup(self, url):
+        if self.index is None: self.load_index()
+        location = self.index.get(url)
+        if location is None: return None
+        path, offset = location
+        with open(path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return read_record(data, offset)[0]
+
+    def load_index(self):
+        self.index = {}
+        for path in self.segments:
+            index_path = path[:-len(".seg")] + ".idx"
+            if not os.path.exists(index_path): continue
+            with open(index_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    offset, url = line.rstrip("\n").split("\t", 1)
+                    self.index[url] = (path, int(offset))
+
+
+def segment_number(path):
+    return int(os.path.basename(path)[len("segment-"):-len(".seg")])
+
+
+def iterate_segment(path):
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0: return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset + RECORD_HEADER.size <= len(data):
+                record, offset = read_record(data, offset)
+                # a record cut short by a crash ends the segment
+                if record is None: return
+                yield record
+
+
+# Read the record at offset, returns (record, offset of the next one)
+def read_record(data, offset):
+    magic, header_length, body_length = RECORD_HEADER.unpack_from(data, offset)
+    start = offset + RECORD_HEADER.size
+    end = start + header_length + body_length
+    if magic != MAGIC or end > len(data): return None, len(data)
+    header = json.loads(bytes(data[start:start + header_length]).decode("utf-8"))
+    body = bytes(data[start + header_length:end])
+    if header.get("encoding") == "deflate": body = zlib.decompress(body)
+    record = Record(header["url"], header["fetch_time"], header["status"],
+                    header["headers"], body, header.get("title"))
+    return record, end
@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# the crawler modules live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Site:
+    # A small web site on a local port, for crawls that need no network.
+    # Page n links to pages 2n+1 and 2n+2, and every page has an ETag,
+    # so conditional GETs get a 304. The titles are in kana, which the
+    # language identifier tells without langdetect. The pages are utf-8,
+    # declared in the Content-Type header, or with header_charset False
+    # only in a <meta charset> tag
+    def __init__(self, pages=15):
+        self.pages = pages
+        self.header_charset = True
+        self.lock = threading.Lock()
+        # (path, status) -> no of answers
+        self.served = {}
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.answer(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, page):
+        return "http://127.0.0.1:{}/page/{}".format(self.port, page)
+
+    def answer(self, request):
+        if request.path == "/robots.txt":
+            self.reply(request, 200, "text/plain", b"User-agent: *\nAllow: /\n")
+            return
+        page = int(request.path.rsplit("/", 1)[1]) if request.path.startswith("/page/") else -1
+        if page < 0 or page >= self.pages:
+            self.reply(request, 404, "text/html", b"<html><head><title>Not Found</title></head></html>")
+            return
+        etag = '"page-{}"'.format(page)
+        if request.headers.get("If-None-Match") == etag:
+            self.reply(request, 304, None, b"", etag)
+            return
+        links = "".join('<a href="{}">link</a>'.format(self.url(child)) for child in (2 * page + 1, 2 * page + 2) if child < self.pages)
+        body = '<html><head><meta charset="utf-8"><title>ページ {}</title></head><body>{}<p>{}</p></body></html>'.format(
+            page, links, " ".join("word{}".format(page * 100 + i) for i in range(50))).encode("utf-8")
+        self.reply(request, 200, "text/html; charset=utf-8" if self.header_charset else "text/html", body, etag)
+
+    def reply(self, request, status, content_type, body, etag=None):
+        with self.lock:
+            key = (request.path, status)
+            self.served[key] = self.served.get(key, 0) + 1
+        request.send_response(status)
+        if content_type is not None: request.send_header("Content-Type", content_type)
+        if etag is not None: request.send_header("ETag", etag)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    # No of answers with the status, to the pages (not robots.txt)
+    def count(self, status):
+        with self.lock:
+            return sum(count for (path, served_status), count in self.served.items()
+                       if served_status == status and path.startswith("/page/"))
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def site():
+    site = Site()
+    yield site
+    site.close()
+
+
+# Parameters of a crawl of the site, every file under tmp_path
+@pytest.fixture
+def crawl_settings(tmp_path):
+    os.makedirs(tmp_path / "logs")
+    geo_table = tmp_path / "geo.csv"
+    geo_table.write_text("127.0.0.0,127.255.255.255,ZZ\n")
+    return {
+        "file_download_root": str(tmp_path / "files") + "/",
+        "log_file_path": str(tmp_path / "logs"),
+        "geo_ip_table_path": str(geo_table),
+        "public_suffix_list_path": str(tmp_path / "missing.dat"),
+        "visited_set_path": str(tmp_path / "state" / "visited_urls"),
+        "frontier_spill_dir": str(tmp_path / "state" / "frontier"),
+        "checkpoint_path": str(tmp_path / "state" / "checkpoint.json"),
+        "recrawl_db_path": str(tmp_path / "state" / "recrawl.sqlite"),
+        "metrics_snapshot_interval": 0,
+        "max_requests_per_second": 1000,
+        "max_pages_per_domain": 1000,
+        "random_seed": 1,
+    }
@@ -0,0 +1,170 @@
+import json
+
+import pytest
+
+from crawler import Crawler
+from segment_store import SegmentReader
+from visited_set import create_visited_set
+
+
+@pytest.mark.parametrize("visited_set_type", ["EXACT", "BLOOM", "MEMORY"])
+def test_a_completed_crawl_is_not_resumed(site, crawl_settings, visited_set_type):
+    # the default checkpoint settings
+    settings = dict(crawl_settings, visited_set_type=visited_set_type)
+    first = Crawler(seeds=[site.url(0)], **settings).run()
+    assert first["pages_explored"] > 0
+    with open(settings["checkpoint_path"], "r", encoding="utf-8") as file:
+        assert json.load(file)["completed"]
+    served = site.count(200)
+
+    second = Crawler(seeds=[site.url(0)], **settings).run()
+    # crawled again from the seed, not resumed after the last one,
+    # and not skipped as already visited by the saved visited set
+    assert site.count(200) == 2 * served
+    assert second["pages_explored"] == first["pages_explored"]
+    assert second["pages_sampled"] == first["pages_sampled"]
+
+
+def test_an_interrupted_crawl_is_resumed(site, crawl_settings):
+    Crawler(seeds=[site.url(0)], **crawl_settings).run()
+    with open(crawl_settings["checkpoint_path"], "r", encoding="utf-8") as file: state = json.load(file)
+    state["completed"] = False
+    with open(crawl_settings["checkpoint_path"], "w", encoding="utf-8") as file: json.dump(state, file)
+    assert Crawler(**crawl_settings).read_checkpoint() == state
+    # the urls visited before the interruption stay visited
+    crawler = Crawler(**crawl_settings)
+    crawler.open()
+    assert len(crawler.visited_nodes) == site.pages
+    crawler.close()
+    assert Crawler(resume_from_checkpoint=False, **crawl_settings).read_checkpoint() is None
+
+
+def test_the_process_pool_gives_the_same_crawl(site, crawl_settings):
+    settings = dict(crawl_settings, visited_set_type="MEMORY", checkpoint_interval=0)
+    in_process = Crawler(seeds=[site.url(0)], cpu_pool_size=0, **settings).run()
+    pooled = Crawler(seeds=[site.url(0)], cpu_pool_size=2, **settings).run()
+    assert pooled["pages_sampled"] == in_process["pages_sampled"] > 0
+    assert pooled["seen_languages"] == in_process["seen_languages"] == {"ja": in_process["pages_sampled"]}
+
+
+def test_distributed_workers_build_their_own_crawler(site, crawl_settings):
+    # the workers are spawned, so this also checks what is sent to them pickles
+    stats = Crawler(seeds=[site.url(0)], crawl_mode="DISTRIBUTED", distributed_workers=2,
+                    distributed_flush_interval=0.1, visited_set_type="MEMORY", **crawl_settings).run()
+    assert stats["pages_sampled"] == site.pages
+    assert stats["seen_languages"] == {"ja": site.pages}
+    # added up from the workers, the crawler itself saw no url
+    assert stats["urls_seen"] == site.pages
+
+
+def test_an_incremental_recrawl_sends_conditional_gets(site, crawl_settings):
+    # the default saved visited set and checkpoints
+    settings = dict(crawl_settings, incremental_recrawl=True)
+    first = Crawler(seeds=[site.url(0)], **settings).run()
+    assert first["pages_sampled"] == site.pages
+    assert site.count(304) == 0
+    served = site.count(200)
+
+    second_crawler = Crawler(seeds=[site.url(0)], **settings)
+    second = second_crawler.run()
+    # every page was asked for again, and none had changed
+    assert site.count(304) == site.pages
+    assert site.count(200) == served
+    assert second_crawler.metrics.counters[("recrawl", "not_modified")] == site.pages
+    assert second["pages_explored"] == first["pages_explored"]
+    assert second["seen_languages"] == first["seen_languages"]
+    # the unchanged pages are not stored again
+    assert second["pages_sampled"] == 0
+
+
+@pytest.mark.parametrize("visited_set_type", ["EXACT", "BLOOM"])
+def test_close_releases_the_visited_set(site, crawl_settings, visited_set_type):
+    settings = dict(crawl_settings, visited_set_type=visited_set_type, checkpoint_interval=0)
+    crawler = Crawler(seeds=[site.url(0)], **settings)
+    stats = crawler.run()
+    maps = [crawler.visited_nodes.map] if visited_set_type == "EXACT" else [bloom.map for bloom in crawler.visited_nodes.slices]
+    assert all(visited_map.closed for visited_map in maps)
+    # the counts stay readable after close
+    assert crawler.stats()["urls_seen"] == stats["urls_seen"] == site.pages
+    # and the saved set can be opened again
+    visited = create_visited_set(visited_set_type, settings["visited_set_path"], 16, 0.001)
+    assert len(visited) == site.pages
+    visited.close()
+
+
+def test_a_charset_declared_only_in_the_page_is_used(site, crawl_settings):
+    site.header_charset = False
+    settings = dict(crawl_settings, visited_set_type="MEMORY", checkpoint_interval=0)
+    stats = Crawler(seeds=[site.url(0)], **settings).run()
+    assert stats["pages_sampled"] == site.pages
+    # kana titles, not their utf-8 bytes read as latin-1
+    assert stats["seen_languages"] == {"ja": site.pages}
+    titles = sorted(record.title for record in SegmentReader(settings["file_download_root"] + "segments"))
+    assert titles == sorted("ページ {}".format(page) for page in range(site.pages))
+
+
+@pytest.mark.parametrize("crawl_mode", ["SYNC", "ASYNC"])
+def test_a_checkpoint_that_cannot_be_written_does_not_stop_the_crawl(site, crawl_settings, monkeypatch, crawl_mode):
+    def save_checkpoint(self, *args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(Crawler, "save_checkpoint", save_checkpoint)
+    settings = dict(crawl_settings, visited_set_type="MEMORY", checkpoint_interval=0.001, crawl_mode=crawl_mode)
+    crawler = Crawler(seeds=[site.url(0), site.url(1)], **settings)
+    stats = crawler.run()
+    assert stats["pages_sampled"] == site.pages
+    with open(crawler.log_path, "r", encoding="utf-8") as file: log = file.read()
+    assert "Failed to save the checkpoint: [Errno 28] No space left on device" in log
+
+
+def test_the_summary_is_logged_even_with_a_full_log_queue(site, crawl_settings):
+    settings = dict(crawl_settings, visited_set_type="MEMORY", checkpoint_interval=0, log_queue_size=1)
+    crawler = Crawler(seeds=[site.url(0)], **settings)
+    crawler.run()
+    with open(crawler.log_path, "r", encoding="utf-8") as file: log = file.read()
+    assert "Pages Visited : {} , Pages Sampled : {}".format(crawler.pages_explored, site.pages) in log
+    assert "Language: ja, Count: {}".format(site.pages) in log
+    assert "Country: ZZ, Count: {}".format(site.pages) in log
+
+
+def test_a_missing_geo_table_gives_na_without_asking_ipinfo(site, crawl_settings, tmp_path):
+    settings = dict(crawl_settings, visited_set_type="MEMORY", checkpoint_interval=0,
+                    geo_ip_table_path=str(tmp_path / "missing.csv"))
+    crawler = Crawler(seeds=[site.url(0)], **settings)
+    stats = crawler.run()
+    assert crawler.geolocation_strategy == "LOCAL_TABLE"
+    assert stats["seen_geographies"] == {"NA": site.pages}
+    assert crawler.ip_country_misses == 0
+    with open(crawler.log_path, "r", encoding="utf-8") as file: log = file.read()
+    assert "Failed to load the ip -> country table, every country is 'NA'" in log
+    assert "Geolocation Strategy : LOCAL_TABLE , Ip Ranges : 0" in log
+
+
+def test_ipinfo_is_asked_once_per_ip(crawl_settings, tmp_path):
+    class Answer:
+        def __init__(self, status_code, country=None):
+            self.status_code = status_code
+            self.country = country
+
+        def json(self):
+            return {"country": self.country}
+
+    asked = []
+    answers = {"1.1.1.1": Answer(200, "AU"), "2.2.2.2": Answer(429)}
+
+    def get(url, **kwargs):
+        asked.append(url)
+        return answers[url.split("/")[3]]
+
+    crawler = Crawler(**dict(crawl_settings, geo_ip_table_path=str(tmp_path / "missing.csv"), geolocation_fallback_to_api=True))
+    crawler.open()
+    try:
+        assert crawler.geolocation_strategy == "IPINFO_API"
+        crawler.http_pool.get = get
+        assert [crawler.ipinfo_country("1.1.1.1") for _ in range(3)] == ["AU"] * 3
+        # a failed lookup is asked again
+        assert [crawler.ipinfo_country("2.2.2.2") for _ in range(2)] == ["NA"] * 2
+        assert asked == ["https://ipinfo.io/1.1.1.1/json"] + ["https://ipinfo.io/2.2.2.2/json"] * 2
+        assert (crawler.ip_country_hits, crawler.ip_country_misses) == (2, 3)
+    finally:
+        crawler.close()
@@ -0,0 +1,153 @@
+import json
+import random
+
+from frontier import IndexedFrontier, IndexedHeap, TieredFrontier
+
+
+def entries(count, seed=0):
+    rng = random.Random(seed)
+    return [(-rng.random() * 100, "http://example.com/{}".format(i), ("ZZ", "en", "example.com"), 1.0)
+            for i in range(count)]
+
+
+def pop_all(frontier):
+    popped = []
+    while len(frontier) > 0: popped.append(frontier.pop())
+    return popped
+
+
+def test_spilled_entries_come_back_in_priority_order(tmp_path):
+    frontier = TieredFrontier(str(tmp_path), hot_capacity=8, max_segments=3)
+    pushed = entries(200)
+    for entry in pushed: frontier.push(entry)
+    assert frontier.spilled_entries > 0
+    # merged into one segment whenever there were more than max_segments
+    assert len(frontier.segment_heads) <= 3
+    assert len(frontier) == 200
+    assert pop_all(frontier) == sorted(pushed)
+    frontier.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_pushes_between_pops_keep_the_order(tmp_path):
+    frontier = TieredFrontier(str(tmp_path), hot_capacity=4, max_segments=2)
+    pushed = entries(60)
+    popped = []
+    for idx, entry in enumerate(pushed):
+        frontier.push(entry)
+        if idx % 3 == 2: popped.append(frontier.pop())
+    popped = popped + pop_all(frontier)
+    assert sorted(popped) == sorted(pushed)
+    # every pop returned the best entry queued at the time
+    queued = []
+    popped_iter = iter(popped)
+    for idx, entry in enumerate(pushed):
+        queued.append(entry)
+        if idx % 3 == 2:
+            best = min(queued)
+            assert next(popped_iter) == best
+            queued.remove(best)
+    frontier.close()
+
+
+def test_restore_from_a_checkpoint(tmp_path):
+    frontier = TieredFrontier(str(tmp_path), hot_capacity=8, max_segments=4, name="seed-0")
+    pushed = entries(100)
+    for entry in pushed: frontier.push(entry)
+    first = [frontier.pop() for _ in range(10)]
+    state = frontier.checkpoint()
+    frontier.checkpoint_saved()
+
+    restored = TieredFrontier.restore(state, str(tmp_path), 8, 4)
+    assert len(restored) == 90
+    assert first + pop_all(restored) == sorted(pushed)
+    restored.close()
+
+
+def test_indexed_heap_pops_by_key_after_updates_and_removals():
+    rng = random.Random(3)
+    heap = IndexedHeap()
+    keys = {}
+    for item in range(200):
+        keys[item] = rng.random()
+        heap.set(item, keys[item])
+    # change the key of arbitrary items, up and down
+    for item in rng.sample(range(200), 80):
+        keys[item] = rng.random()
+        heap.set(item, keys[item])
+    # remove arbitrary items, the last one included
+    for item in rng.sample(range(199), 50) + [199]:
+        heap.remove(item)
+        del keys[item]
+    assert len(heap) == len(keys)
+    assert all(heap.items[heap.position[item]] == item for item in keys)
+    popped = []
+    while len(heap) > 0:
+        item, key = heap.peek()
+        assert key == keys[item]
+        popped.append(item)
+        heap.remove(item)
+    assert popped == sorted(keys, key=keys.get)
+    assert heap.position == {}
+
+
+def indexed_entries():
+    # (-weight, url, (country, language, domain), size weight)
+    return [(-1.0, "http://{}.com/{}".format(domain, i), ("ZZ", language, domain), float(i))
+            for i, (language, domain) in enumerate([("en", "a"), ("en", "a"), ("fr", "b"), ("fr", "c"), ("de", "d"), ("en", "e")])]
+
+
+def test_indexed_frontier_reorders_the_classes_whose_features_changed(tmp_path):
+    class_weights = {}
+
+    def class_weight(feature_class):
+        return class_weights.get(feature_class[1], 0)
+
+    frontier = IndexedFrontier(class_weight, str(tmp_path))
+    for entry in indexed_entries(): frontier.push(entry)
+    assert len(frontier) == 6
+    # every class weighs 0: the entries come by size weight
+    assert frontier.peek()[1] == "http://e.com/5"
+
+    # french pages get scarce: both french classes move up, classes
+    # of the same weight by the url of their best entry
+    class_weights["fr"] = 10
+    frontier.rescore([(1, "fr")])
+    assert frontier.rescored == 2
+    assert [frontier.pop()[1] for _ in range(2)] == ["http://b.com/2", "http://c.com/3"]
+    # a rescore of a feature no class holds changes nothing
+    frontier.rescore([(1, "ja")])
+    assert frontier.rescored == 2
+
+    class_weights["en"] = 20
+    frontier.rescore([(1, "en")])
+    # within a class, by size weight
+    assert frontier.pop() == (-20, "http://a.com/1", ("ZZ", "en", "a"), 1.0)
+    assert [frontier.pop()[1] for _ in range(3)] == ["http://a.com/0", "http://e.com/5", "http://d.com/4"]
+    assert len(frontier) == 0 and frontier.classes == {} and frontier.index == {}
+    frontier.close()
+
+
+def test_indexed_frontier_restores_from_a_checkpoint(tmp_path):
+    def class_weight(feature_class):
+        return {"fr": 5}.get(feature_class[1], 0)
+
+    frontier = IndexedFrontier(class_weight, str(tmp_path), name="seed-0")
+    for entry in indexed_entries(): frontier.push(entry)
+    assert frontier.pop()[1] == "http://b.com/2"
+    frontier.checkpoint()
+    frontier.checkpoint_saved()
+    # the frontier goes on after the checkpoint, its next one replaces the file
+    assert frontier.pop()[1] == "http://c.com/3"
+    state = frontier.checkpoint()
+    frontier.checkpoint_saved()
+    assert [path.name for path in tmp_path.iterdir()] == ["seed-0-indexed-000001.seg"]
+
+    restored = IndexedFrontier.restore(json.loads(json.dumps(state)), class_weight, str(tmp_path))
+    assert len(restored) == 4
+    popped = pop_all(restored)
+    assert [entry[1] for entry in popped] == ["http://e.com/5", "http://d.com/4", "http://a.com/1", "http://a.com/0"]
+    # the feature classes come back as tuples, weighed by their size
+    assert popped[0] == (-5.0, "http://e.com/5", ("ZZ", "en", "e"), 5.0)
+    restored.close()
+    assert list(tmp_path.iterdir()) == []
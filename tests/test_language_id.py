@@ -0,0 +1,149 @@
+import sys
+import threading
+import types
+
+import pytest
+
+import language_id
+from language_id import LanguageIdentifier, language_of_script
+
+
+class FakeLangdetect:
+    # Stands in for langdetect: records the seed each text was detected
+    # with, and yields the thread in between to let others interleave
+    def __init__(self):
+        self.DetectorFactory = type("DetectorFactory", (), {"seed": None})
+        self.calls = []
+
+    def detect_langs(self, text):
+        seed = self.DetectorFactory.seed
+        threading.Event().wait(0.0005)
+        self.calls.append((text, seed, self.DetectorFactory.seed))
+        if text == "fails": raise ValueError("No features in text.")
+        return [types.SimpleNamespace(lang="en", prob=0.6), types.SimpleNamespace(lang="de", prob=0.4)]
+
+
+@pytest.fixture
+def langdetect(monkeypatch):
+    fake = FakeLangdetect()
+    module = types.ModuleType("langdetect")
+    module.DetectorFactory = fake.DetectorFactory
+    module.detect_langs = fake.detect_langs
+    monkeypatch.setitem(sys.modules, "langdetect", module)
+    return fake
+
+
+@pytest.mark.parametrize("text, language", [
+    ("ページ 1", "ja"),
+    ("東京の天気 ニュース", "ja"),
+    ("서울 날씨", "ko"),
+    ("ข่าววันนี้", "th"),
+    ("Καιρός σήμερα", "el"),
+    ("Cyrillic: Погода сегодня", None),
+    ("The weather today", None),
+    ("2023 - 10", None),
+])
+def test_the_script_tells_the_language(text, language):
+    assert language_of_script(text) == language
+
+
+def test_script_texts_are_not_sent_to_the_detector(langdetect):
+    identifier = LanguageIdentifier()
+    assert identifier.scores("서울 날씨") == (("ko", 1.0),)
+    assert identifier.detect("ページ 1") == "ja"
+    # nothing to detect
+    assert identifier.scores("2023 - 10") == ()
+    assert identifier.scores("   ") == ()
+    assert identifier.scores(None) == ()
+    assert identifier.detect("2023") == "NA"
+    assert identifier.script_shortcuts == 2
+    assert langdetect.calls == []
+
+
+def test_scores_are_cached(langdetect):
+    identifier = LanguageIdentifier(max_text_length=10)
+    assert identifier.scores("The weather today") == (("en", 0.6), ("de", 0.4))
+    # the same text cut to max_text_length, and surrounding space ignored
+    assert identifier.scores("  The weather tomorrow ") == (("en", 0.6), ("de", 0.4))
+    assert identifier.scores("ページ 1") == (("ja", 1.0),)
+    assert identifier.scores("ページ 1") == (("ja", 1.0),)
+    assert (identifier.hits, identifier.misses, identifier.script_shortcuts) == (2, 2, 1)
+    assert [text for text, _, _ in langdetect.calls] == ["The weathe"]
+
+
+def test_the_cache_keeps_the_most_recently_used(langdetect):
+    identifier = LanguageIdentifier(cache_size=2)
+    identifier.scores("first")
+    identifier.scores("second")
+    identifier.scores("first")
+    identifier.scores("third")
+    identifier.scores("first")
+    identifier.scores("second")
+    assert [text for text, _, _ in langdetect.calls] == ["first", "second", "third", "second"]
+    assert len(identifier.cache) == 2
+
+
+def test_a_batch_detects_each_distinct_text_once(langdetect):
+    identifier = LanguageIdentifier(seed=7)
+    texts = ["one", "ページ", "one", "two", "", "fails", "two"]
+    assert identifier.detect_batch(texts) == ["en", "ja", "en", "en", "NA", "NA", "en"]
+    assert [(text, seed) for text, seed, _ in langdetect.calls] == [("one", 7), ("two", 7), ("fails", 7)]
+    assert (identifier.hits, identifier.misses) == (0, 4)
+    # a text the detector failed on is cached as nothing to detect
+    assert identifier.scores("fails") == ()
+    assert len(langdetect.calls) == 3
+
+
+def test_each_identifier_detects_with_its_own_seed(langdetect):
+    identifiers = [LanguageIdentifier(seed=seed) for seed in (1, 2)]
+
+    def detect(identifier):
+        for i in range(50): identifier.scores("text {} of {}".format(i, identifier.seed))
+
+    threads = [threading.Thread(target=detect, args=(identifier,)) for identifier in identifiers]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert len(langdetect.calls) == 100
+    for text, seed, seed_after in langdetect.calls:
+        # set by the identifier of the text, and not changed while detecting
+        assert seed == seed_after == int(text.rsplit(" ", 1)[1])
+    assert not language_id.DETECTOR_LOCK.locked()
+
+
+def test_the_domain_prior_settles_ambiguous_titles():
+    identifier = LanguageIdentifier(min_prior_pages=3)
+    scores = (("en", 0.5), ("nl", 0.45))
+    # no prior yet, the detector's answer
+    assert identifier.choose(scores, "example.nl") == "en"
+    for _ in range(2): identifier.observe("example.nl", "nl")
+    assert identifier.choose(scores, "example.nl") == "en"
+    identifier.observe("example.nl", "nl")
+    assert identifier.choose(scores, "example.nl") == "nl"
+    # a clear answer is kept
+    assert identifier.choose((("en", 0.9), ("nl", 0.1)), "example.nl") == "en"
+    # nothing to detect gets the main language of the domain
+    assert identifier.choose((), "example.nl") == "nl"
+    assert identifier.choose((), "other.nl") == "NA"
+    assert identifier.choose(scores) == "en"
+    # pages with no language are not counted
+    identifier.observe("other.nl", "NA")
+    identifier.observe(None, "nl")
+    assert list(identifier.priors) == ["example.nl"]
+
+
+def test_only_the_most_recent_domains_keep_a_prior():
+    identifier = LanguageIdentifier(max_domains=2, min_prior_pages=1)
+    for domain in ("a.com", "b.com", "a.com", "c.com"): identifier.observe(domain, "de")
+    assert list(identifier.priors) == ["a.com", "c.com"]
+    assert identifier.choose((), "b.com") == "NA"
+    assert identifier.choose((), "a.com") == "de"
+
+
+def test_settings_make_the_same_identifier():
+    identifier = LanguageIdentifier(seed=3, cache_size=10, max_text_length=50, max_domains=20,
+                                    prior_weight=2.0, min_prior_pages=5)
+    identifier.observe("example.com", "en")
+    identifier.scores("ページ")
+    copy = LanguageIdentifier(*identifier.settings())
+    assert copy.settings() == identifier.settings()
+    assert len(copy.cache) == len(copy.priors) == 0
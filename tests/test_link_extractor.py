@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from link_extractor import decode_body, declared_encoding, extract_streaming, header_encoding
+
+TITLE = "旧市街の歴史への短いガイド"
+
+
+def page(head=""):
+    return "<html><head>{}<title>{}</title></head><body><a href='/a'>a</a><a href=\"/b?x=1&amp;y=2\">b</a></body></html>".format(head, TITLE)
+
+
+@pytest.mark.parametrize("content_type, encoding", [
+    ("text/html", None),
+    (None, None),
+    ("text/html; charset=utf-8", "utf-8"),
+    ('text/html; Charset="Shift_JIS"', "Shift_JIS"),
+])
+def test_header_encoding_is_only_a_declared_charset(content_type, encoding):
+    assert header_encoding(content_type) == encoding
+
+
+@pytest.mark.parametrize("head, encoding", [
+    ('<meta charset="shift_jis">', "shift_jis"),
+    ('<meta http-equiv="Content-Type" content="text/html; charset=euc-jp">', "euc-jp"),
+    ("", None),
+])
+def test_a_charset_declared_in_the_page_is_used(head, encoding):
+    content = page(head).encode(encoding or "utf-8")
+    assert declared_encoding(content) == encoding
+    assert extract_streaming(content, None, 10).title == TITLE
+
+
+def test_undeclared_bodies_are_utf8_or_windows_1252():
+    assert decode_body("café {}".format(TITLE).encode("utf-8"), None) == "café " + TITLE
+    assert decode_body("café".encode("windows-1252"), None) == "café"
+    assert decode_body(b"\xef\xbb\xbf" + TITLE.encode("utf-8"), None) == TITLE
+    # the header wins over the page, an unknown charset is ignored
+    assert decode_body(page('<meta charset="shift_jis">').encode("utf-8"), "utf-8") == page('<meta charset="shift_jis">')
+    assert decode_body(TITLE.encode("utf-8"), "no-such-charset") == TITLE
+
+
+def test_links_are_sampled_from_every_anchor():
+    content = "".join('<a href="/{0}">{0}</a>'.format(i) for i in range(100)).encode("utf-8")
+    summary = extract_streaming(content, None, 10, rng=random.Random(1))
+    assert summary.title is None
+    assert len(summary.links) == 10 and len(set(summary.links)) == 10
+    assert all(link.startswith("/") for link in summary.links)
+    assert extract_streaming(page().encode("utf-8"), None, 10).links == ["/a", "/b?x=1&y=2"]
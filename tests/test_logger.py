@@ -0,0 +1,47 @@
+import threading
+
+import Logger
+
+
+def test_queue_mode_writes_every_record_and_closes_the_file(tmp_path):
+    path = str(tmp_path / "crawl.log")
+    logger = Logger.Logger("test-queue-mode", path, queue_mode=True, queue_size=1000, flush_interval=0.05)
+    for i in range(100): logger.info("record {}", i)
+    logger.close()
+    assert logger.handler.stream.closed
+    with open(path, "r", encoding="utf-8") as file: lines = file.read().splitlines()
+    assert [line.rsplit(" - ", 1)[1] for line in lines] == ["record {}".format(i) for i in range(100)]
+    # a record logged after close is appended to the file directly
+    logger.handler.emit(logger.logger.makeRecord("test", 20, __file__, 1, "late", (), None))
+    with open(path, "r", encoding="utf-8") as file: lines = file.read().splitlines()
+    assert len(lines) == 101 and lines[-1].endswith(" - late")
+    assert logger.dropped() == 0
+
+
+def test_records_dropped_by_many_threads_are_all_counted(tmp_path):
+    path = str(tmp_path / "crawl.log")
+    logger = Logger.Logger("test-dropped", path, queue_mode=True, queue_size=2, flush_interval=0.05)
+    threads = [threading.Thread(target=lambda: [logger.info("record") for _ in range(500)]) for _ in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    logger.close()
+    with open(path, "r", encoding="utf-8") as file: written = len(file.read().splitlines())
+    assert written + logger.dropped() == 8 * 500
+
+
+def test_warnings_and_the_summary_are_never_dropped(tmp_path):
+    path = str(tmp_path / "crawl.log")
+    logger = Logger.Logger("test-kept", path, queue_mode=True, queue_size=2, flush_interval=0.05)
+    for i in range(300):
+        logger.info("info {}", i)
+        logger.warning("warning {}", i)
+        logger.summary("summary {}", i)
+    logger.end_section()
+    logger.close()
+    with open(path, "r", encoding="utf-8") as file: messages = [line.rsplit(" - ", 1)[1] for line in file.read().splitlines()]
+    infos = [message for message in messages if message.startswith("info")]
+    assert len(infos) + logger.dropped() == 300
+    # in the order they were logged
+    assert [message for message in messages if message.startswith("warning")] == ["warning {}".format(i) for i in range(300)]
+    assert [message for message in messages if message.startswith("summary")] == ["summary {}".format(i) for i in range(300)]
+    assert messages[-1] == "=" * 100
@@ -0,0 +1,46 @@
+import json
+import time
+
+import metrics
+from metrics import Metrics, MetricsExporter
+
+
+def test_stages_and_counters_are_summed():
+    stats = Metrics()
+    for seconds in (0.001, 0.002, 0.2): stats.observe("get", seconds)
+    stats.count("rejected", "too_long")
+    stats.count("rejected", "too_long", by=2)
+    snapshot = stats.to_json()
+    assert snapshot["stages"]["get"]["count"] == 3
+    assert abs(snapshot["stages"]["get"]["total_seconds"] - 0.203) < 1e-9
+    assert snapshot["stages"]["get"]["p50_seconds"] == 0.0025
+    assert snapshot["counters"] == {"rejected": {"too_long": 3}}
+    prometheus = stats.to_prometheus()
+    assert 'crawler_stage_seconds_count{stage="get"} 3' in prometheus
+    assert 'crawler_rejected_total{reason="too_long"} 3' in prometheus
+
+
+def test_stop_joins_the_writer_and_writes_once(tmp_path, monkeypatch):
+    writes = []
+    write_atomic = metrics.write_atomic
+
+    def slow_write_atomic(path, text):
+        writes.append(path)
+        # a snapshot still being written when stop is called
+        time.sleep(0.05)
+        write_atomic(path, text)
+
+    monkeypatch.setattr(metrics, "write_atomic", slow_write_atomic)
+    stats = Metrics()
+    exporter = MetricsExporter(stats, str(tmp_path / "metrics" / "crawler"), 0.01)
+    exporter.start()
+    time.sleep(0.03)
+    stats.count("pages", "sampled")
+    exporter.stop()
+    assert not exporter.thread.is_alive()
+    written = len(writes)
+    exporter.stop()
+    assert len(writes) == written
+    with open(str(tmp_path / "metrics" / "crawler.json"), "r", encoding="utf-8") as file:
+        assert json.load(file)["counters"] == {"pages": {"sampled": 1}}
+    assert sorted(path.name for path in (tmp_path / "metrics").iterdir()) == ["crawler.json", "crawler.prom"]
@@ -0,0 +1,95 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from crawler import Crawler
+from politeness import HostScheduler, parse_retry_after
+
+
+def scheduler(rate=4, min_rate=1, max_rate=8, increase=0.5, backoff=0.5):
+    return HostScheduler(rate, 1, 100, min_rate, max_rate, increase, backoff)
+
+
+def test_the_rate_is_cut_down_to_the_floor_and_grows_back():
+    hosts = scheduler()
+    hosts.on_throttle("example.com")
+    assert hosts.rate_of("example.com") == 2
+    for _ in range(5): hosts.on_throttle("example.com")
+    assert hosts.rate_of("example.com") == 1
+    assert hosts.backoffs == 6 and hosts.slowed_hosts() == 1
+    for _ in range(6): hosts.on_success("example.com")
+    assert hosts.rate_of("example.com") == 4
+    for _ in range(20): hosts.on_success("example.com")
+    assert hosts.rate_of("example.com") == 8
+    # other hosts are not slowed down
+    assert hosts.rate_of("example.org") == 4
+
+
+def test_the_max_rate_is_never_below_the_start_rate():
+    hosts = scheduler(rate=1000, max_rate=8)
+    hosts.on_success("example.com")
+    assert hosts.rate_of("example.com") == 1000
+    hosts.on_throttle("example.com")
+    for _ in range(1000): hosts.on_success("example.com")
+    assert hosts.rate_of("example.com") == 1000
+
+
+def test_a_pause_blocks_the_host_without_cutting_its_rate():
+    hosts = scheduler()
+    hosts.pause("example.com", 0.2)
+    assert hosts.rate_of("example.com") == 4
+    assert 0.1 < hosts.wait_time("example.com") <= 0.2
+    assert hosts.wait_time("example.org") == 0
+    started = time.monotonic()
+    waited = hosts.acquire("example.com")
+    assert 0.1 < waited <= 0.2 and time.monotonic() - started >= waited
+    assert hosts.backoffs == 0
+
+
+def test_tokens_are_taken_at_the_host_rate():
+    hosts = scheduler(rate=10)
+    assert hosts.reserve("example.com") == 0
+    assert 0.05 < hosts.reserve("example.com") <= 0.1
+    assert 0.15 < hosts.reserve("example.com") <= 0.2
+    assert hosts.waits == 2
+
+
+def test_retry_after_in_seconds_or_as_a_date():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+
+def test_a_url_that_keeps_failing_cuts_the_host_rate_once(crawl_settings):
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    crawler = Crawler(**dict(crawl_settings, max_requests_per_second=4, max_fetch_retries=2))
+    crawler.open()
+    try:
+        url = "http://127.0.0.1:{}/page".format(server.server_address[1])
+        host = crawler.get_domain_name(url)
+        assert crawler.submit_http_request(url) is None
+        assert requests == ["/page"] * 3
+        assert crawler.host_scheduler.rate_of(host) == 2
+        assert crawler.host_scheduler.backoffs == 1
+        assert crawler.metrics.counters[("fetch_retries", "503")] == 3
+        # the retries waited for the host's lowered rate
+        assert crawler.metrics.stages["politeness_wait"].count >= 1
+    finally:
+        crawler.close()
+        server.shutdown()
+        server.server_close()
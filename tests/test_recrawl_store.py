@@ -0,0 +1,66 @@
+from link_extractor import PageSummary
+from recrawl_store import RecrawlStore, content_hash, hamming_distance, simhash
+
+WORDS = " ".join("word{}".format(i) for i in range(200))
+
+
+def html(text):
+    return "<html><head><title>Page</title><style>p {{ color: red }}</style></head><body><p>{}</p></body></html>".format(text).encode("utf-8")
+
+
+def page(title="Page", links=None, size=100):
+    return PageSummary(title, links or [], "en", size)
+
+
+def test_conditional_headers_come_from_the_last_fetch(tmp_path):
+    store = RecrawlStore(str(tmp_path / "recrawl.sqlite"))
+    assert store.conditional_headers("http://example.com/a") == {}
+    store.save("http://example.com/a", '"v1"', "Wed, 21 Oct 2015 07:28:00 GMT", content_hash(b"body"), None, page())
+    store.save("http://example.com/b", None, "Wed, 21 Oct 2015 07:28:00 GMT", content_hash(b"body"), None, page())
+    assert store.conditional_headers("http://example.com/a") == {"If-None-Match": '"v1"', "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    assert store.conditional_headers("http://example.com/b") == {"If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    store.close()
+
+
+def test_saved_pages_survive_a_restart(tmp_path):
+    path = str(tmp_path / "recrawl.sqlite")
+    store = RecrawlStore(path)
+    store.save("http://example.com/a", '"v1"', None, content_hash(b"body"), None,
+               page("Title", ["http://example.com/b", "http://example.com/c"], 1234))
+    # saved again with a new version, replaces the first
+    store.save("http://example.com/a", '"v2"', None, content_hash(b"new body"), None,
+               page("New title", ["http://example.com/d"], 99))
+    store.close()
+
+    reopened = RecrawlStore(path)
+    assert len(reopened) == 1
+    saved = reopened.page("http://example.com/a")
+    assert (saved.title, saved.links, saved.language, saved.size) == ("New title", ["http://example.com/d"], "en", 99)
+    assert reopened.content_hash_of("http://example.com/a") == content_hash(b"new body")
+    assert reopened.conditional_headers("http://example.com/a") == {"If-None-Match": '"v2"'}
+    assert reopened.page("http://example.com/missing") is None
+    assert reopened.content_hash_of("http://example.com/missing") is None
+    reopened.close()
+
+
+def test_simhash_ignores_markup_and_moves_little_for_a_small_edit():
+    base = simhash(html(WORDS), "utf-8")
+    assert simhash(html(WORDS).replace(b"<p>", b"<p class='x'>"), "utf-8") == base
+    assert hamming_distance(simhash(html(WORDS + " word9999"), "utf-8"), base) <= 3
+    assert hamming_distance(simhash(html(" ".join("other{}".format(i) for i in range(200))), "utf-8"), base) > 10
+    assert hamming_distance(0b1011, 0b0110) == 3
+
+
+def test_near_duplicates_are_found_under_other_urls_only(tmp_path):
+    store = RecrawlStore(str(tmp_path / "recrawl.sqlite"))
+    base = simhash(html(WORDS), "utf-8")
+    store.save("http://example.com/a", None, None, content_hash(b"a"), base, page())
+    near = base ^ 0b101
+    assert store.find_near_duplicate("http://mirror.com/a", near, 3) == "http://example.com/a"
+    assert store.find_near_duplicate("http://mirror.com/a", base ^ 0b1111, 3) is None
+    # not a duplicate of itself
+    assert store.find_near_duplicate("http://example.com/a", base, 3) is None
+    # a page saved again under a new simhash is not found by the old one
+    store.save("http://example.com/a", None, None, content_hash(b"b"), ~base & ((1 << 64) - 1), page())
+    assert store.find_near_duplicate("http://mirror.com/a", base, 3) is None
+    store.close()
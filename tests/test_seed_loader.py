@@ -0,0 +1,110 @@
+import gzip
+from urllib.parse import urlsplit
+
+import pytest
+
+import seed_loader
+from seed_loader import (LocalSearchService, SearchEngineSource, dedup, get_seeder_list,
+                         normalize_url, shard)
+
+
+class WarningLog:
+    def __init__(self):
+        self.messages = []
+
+    def warning(self, message):
+        self.messages.append(message)
+
+
+@pytest.mark.parametrize("url, normalized", [
+    ("HTTP://Example.COM/Path?q=1#top", "http://example.com/Path?q=1"),
+    ("  example.com/a \n", "http://example.com/a"),
+    ("http://example.com:80/", "http://example.com/"),
+    ("https://example.com:443/", "https://example.com/"),
+    ("https://example.com:8443/", "https://example.com:8443/"),
+    ("http://[::1]:8080/", "http://[::1]:8080/"),
+    ("", None),
+    ("# a comment", None),
+    ("ftp://example.com/file", None),
+    ("http://example.com:port/", None),
+    ("http:///no-host", None),
+])
+def test_normalize_url(url, normalized):
+    assert normalize_url(url) == normalized
+
+
+def test_shards_are_disjoint_and_keep_each_host_together():
+    urls = ["http://host{}.com/{}".format(i % 37, i) for i in range(500)]
+    shards = [list(shard(urls, idx, 4)) for idx in range(4)]
+    assert sorted(url for urls_of_shard in shards for url in urls_of_shard) == sorted(urls)
+    hosts = [set(urlsplit(url).netloc for url in urls_of_shard) for urls_of_shard in shards]
+    for idx in range(4):
+        assert len(hosts[idx]) > 0
+        for other in range(idx + 1, 4): assert hosts[idx].isdisjoint(hosts[other])
+
+
+def test_dedup_keeps_the_first_of_every_url():
+    urls = ["http://example.com/{}".format(i % 100) for i in range(300)]
+    assert list(dedup(urls, 1000, 0.001)) == ["http://example.com/{}".format(i) for i in range(100)]
+
+
+def test_seed_files_are_read_plain_or_gzip(tmp_path):
+    lines = "# seeds\nexample.com/a\nHTTP://EXAMPLE.com/a\n\nhttp://example.org/b#x\nftp://example.net/\nhttp://example.net/c\n"
+    plain = tmp_path / "seeds.txt"
+    plain.write_text(lines, encoding="utf-8")
+    compressed = tmp_path / "seeds.txt.gz"
+    compressed.write_bytes(gzip.compress(lines.encode("utf-8")))
+    expected = ["http://example.com/a", "http://example.org/b", "http://example.net/c"]
+    for path in (plain, compressed):
+        assert list(get_seeder_list(str(path), "READ_FROM_PRE_CREATED_LIST")) == expected
+        assert list(get_seeder_list(str(path), "READ_FROM_PRE_CREATED_LIST", max_seeds=2)) == expected[:2]
+    with pytest.raises(ValueError):
+        get_seeder_list(str(plain), "ASK_A_FRIEND")
+
+
+def test_search_engine_seeds_and_failed_queries_are_logged():
+    service = LocalSearchService(["http://news.example.com/{}".format(i) for i in range(5)] +
+                                 ["http://weather.example.com/{}".format(i) for i in range(5)] +
+                                 ["http://news.example.com/0"]).start()
+    try:
+        log = WarningLog()
+        source = SearchEngineSource(service.endpoint, ["news", "weather"], 3, logger=log)
+        seeds = list(get_seeder_list(None, "GET_FROM_SEARCH_ENGINE", search_source=source))
+        assert seeds == ["http://news.example.com/{}".format(i) for i in range(3)] + \
+                        ["http://weather.example.com/{}".format(i) for i in range(3)]
+        assert log.messages == []
+
+        # a query to a missing page fails, the others still give seeds
+        broken = SearchEngineSource(service.endpoint.replace("/search", "/missing"), ["news"], 3, logger=log)
+        assert list(broken.seeds()) == []
+        assert len(log.messages) == 1 and "'news'" in log.messages[0] and "404" in log.messages[0]
+    finally:
+        service.stop()
+    with pytest.raises(ValueError):
+        list(get_seeder_list(None, "GET_FROM_SEARCH_ENGINE"))
+
+
+def test_the_dedup_filter_is_sized_for_max_seeds_and_released(tmp_path, monkeypatch):
+    filters = []
+
+    class RecordedBloomSlice(seed_loader.BloomSlice):
+        def __init__(self, path, capacity, error_rate):
+            super().__init__(path, capacity, error_rate)
+            self.closed = False
+            filters.append(self)
+
+        def close(self):
+            self.closed = True
+            super().close()
+
+    monkeypatch.setattr(seed_loader, "BloomSlice", RecordedBloomSlice)
+    path = tmp_path / "seeds.txt"
+    path.write_text("".join("http://example.com/{}\n".format(i) for i in range(1000)), encoding="utf-8")
+    seeds = get_seeder_list(str(path), "READ_FROM_PRE_CREATED_LIST", max_seeds=5)
+    # the first seed is enough to resume after it
+    assert next(seeds) == "http://example.com/0"
+    assert list(seeds) == ["http://example.com/{}".format(i) for i in range(1, 5)]
+    assert filters[0].capacity == 5 and filters[0].closed
+    # without a limit, the configured capacity
+    assert len(list(get_seeder_list(str(path), "READ_FROM_PRE_CREATED_LIST", dedup_capacity=5000))) == 1000
+    assert filters[1].capacity == 5000 and filters[1].closed
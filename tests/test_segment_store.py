@@ -0,0 +1,61 @@
+import glob
+import os
+
+import pytest
+
+from segment_store import SegmentReader, SegmentWriter
+
+
+def body(i):
+    return "<html><head><title>page {0}</title></head><body>{1}</body></html>".format(i, "text " * i).encode("utf-8")
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_records_read_back_in_write_order(tmp_path, compress):
+    writer = SegmentWriter(str(tmp_path), max_segment_bytes=1 << 20, compress=compress)
+    for i in range(20):
+        writer.write("http://example.com/{}".format(i), 200, {"Content-Type": "text/html"}, body(i), "page {}".format(i))
+    writer.close()
+
+    records = list(SegmentReader(str(tmp_path)))
+    assert [record.url for record in records] == ["http://example.com/{}".format(i) for i in range(20)]
+    assert [record.body for record in records] == [body(i) for i in range(20)]
+    assert records[3].status == 200
+    assert records[3].headers == {"Content-Type": "text/html"}
+    assert records[3].title == "page 3"
+
+
+def test_segments_roll_over_and_are_found_by_url(tmp_path):
+    writer = SegmentWriter(str(tmp_path), max_segment_bytes=2000, compress=False)
+    for i in range(50):
+        writer.write("http://example.com/{}".format(i), 200, {}, body(i))
+    # a page written again is found at its last write
+    writer.write("http://example.com/7", 200, {}, b"new body")
+    writer.close()
+    assert len(glob.glob(os.path.join(str(tmp_path), "segment-*.seg"))) > 1
+
+    reader = SegmentReader(str(tmp_path))
+    assert reader.lookup("http://example.com/42").body == body(42)
+    assert reader.lookup("http://example.com/7").body == b"new body"
+    assert reader.lookup("http://example.com/missing") is None
+
+
+def test_a_new_writer_starts_a_new_segment(tmp_path):
+    for run in range(2):
+        writer = SegmentWriter(str(tmp_path), max_segment_bytes=1 << 20)
+        writer.write("http://example.com/run-{}".format(run), 200, {}, body(run))
+        writer.close()
+    assert sorted(os.path.basename(path) for path in glob.glob(os.path.join(str(tmp_path), "segment-*.seg"))) == \
+        ["segment-00000.seg", "segment-00001.seg"]
+    assert [record.url for record in SegmentReader(str(tmp_path))] == ["http://example.com/run-0", "http://example.com/run-1"]
+
+
+def test_a_record_cut_short_ends_the_segment(tmp_path):
+    writer = SegmentWriter(str(tmp_path), max_segment_bytes=1 << 20)
+    for i in range(3):
+        writer.write("http://example.com/{}".format(i), 200, {}, body(i))
+    writer.close()
+    path = os.path.join(str(tmp_path), "segment-00000.seg")
+    # as if the crawler crashed in the middle of the last record
+    with open(path, "r+b") as file: file.truncate(os.path.getsize(path) - 5)
+    assert [record.url for record in SegmentReader(str(tmp_path))] == ["http://example.com/0", "http://example.com/1"]
@@ -0,0 +1,85 @@
+from url_filter import PublicSuffixList, UrlFilter
+
+RULES = """// a few rules of the public suffix list
+com
+uk
+co.uk
+jp
+*.kawasaki.jp
+!city.kawasaki.jp
+"""
+
+
+class WarningLog:
+    def __init__(self):
+        self.messages = []
+
+    def warning(self, message):
+        self.messages.append(message)
+
+
+def suffixes(tmp_path):
+    path = tmp_path / "public_suffix_list.dat"
+    path.write_text(RULES, encoding="utf-8")
+    return PublicSuffixList.load(str(path))
+
+
+def test_registered_domains_follow_the_suffix_rules(tmp_path):
+    url_filter = UrlFilter(suffixes(tmp_path), max_hosts=100)
+    assert url_filter.domain_of("http://www.bbc.co.uk/news") == "bbc.co.uk"
+    assert url_filter.domain_of("http://news.example.com/") == "example.com"
+    # every label under a wildcard rule is a suffix, but not its exceptions
+    assert url_filter.domain_of("http://www.shop.nakahara.kawasaki.jp/") == "shop.nakahara.kawasaki.jp"
+    assert url_filter.domain_of("http://www.city.kawasaki.jp/") == "city.kawasaki.jp"
+    # with no matching rule the suffix is the last label
+    assert url_filter.domain_of("http://a.b.example.dev/") == "example.dev"
+    # an ip address is its own domain, one per port
+    assert url_filter.domain_of("http://127.0.0.1:8001/page") == "127.0.0.1:8001"
+    assert url_filter.domain_of("http://user@127.0.0.1:8002/page") == "127.0.0.1:8002"
+
+
+def test_a_missing_list_is_logged_and_uses_the_last_two_labels(tmp_path):
+    log = WarningLog()
+    url_filter = UrlFilter(PublicSuffixList.load(str(tmp_path / "missing.dat"), log), max_hosts=100)
+    assert len(log.messages) == 1 and "public suffix list" in log.messages[0]
+    assert url_filter.suffixes.rules == 0
+    assert url_filter.domain_of("http://www.bbc.co.uk/news") == "co.uk"
+
+
+def test_a_capped_domain_stays_rejected_for_its_hosts_only(tmp_path):
+    url_filter = UrlFilter(suffixes(tmp_path), max_hosts=100)
+    capped = set()
+    checked = []
+
+    def domain_cap(record):
+        checked.append(record.url)
+        return record.domain in capped
+
+    url_filter.add_rule("domain_cap", 1, domain_cap, memo="REJECTION")
+    assert url_filter.check("http://www.example.com/a") is None
+    capped.add("example.com")
+    assert url_filter.check("http://www.example.com/b") == "domain_cap"
+    # remembered for the domain: another host of it is rejected without a check
+    capped.clear()
+    assert url_filter.check("http://blog.example.com/c") == "domain_cap"
+    assert checked == ["http://www.example.com/a", "http://www.example.com/b"]
+
+    # the ports of an ip address are different domains
+    capped.add("127.0.0.1:8001")
+    assert url_filter.check("http://127.0.0.1:8001/a") == "domain_cap"
+    assert url_filter.check("http://127.0.0.1:8002/a") is None
+    assert url_filter.check("http://127.0.0.1:8001/b") == "domain_cap"
+
+
+def test_host_rules_run_once_per_host(tmp_path):
+    url_filter = UrlFilter(suffixes(tmp_path), max_hosts=100)
+    hosts = []
+    url_filter.add_rule("too_long", 0, lambda record: len(record.url) > 40)
+    url_filter.add_rule("sensitive", 1, lambda record: hosts.append(record.host) or record.host.endswith(".uk"), memo="HOST")
+    assert url_filter.check("http://www.bbc.co.uk/a") == "sensitive"
+    assert url_filter.check("http://www.bbc.co.uk/b") == "sensitive"
+    assert url_filter.check("http://example.com/a") is None
+    assert url_filter.check("http://example.com/b") is None
+    assert url_filter.check("http://example.com/" + "x" * 40) == "too_long"
+    assert url_filter.check("http:///nohost") == "unparsable"
+    assert hosts == ["www.bbc.co.uk", "example.com"]
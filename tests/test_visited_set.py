@@ -0,0 +1,84 @@
+import pytest
+from visited_set import ExactFingerprintSet, ScalableBloomFilter, create_visited_set, fingerprint
+
+
+def test_fingerprint_is_stable_and_never_zero():
+    assert fingerprint("http://example.com/") == fingerprint("http://example.com/")
+    assert fingerprint("http://example.com/") != fingerprint("http://example.com/a")
+    assert all(fingerprint("http://example.com/{}".format(i)) != 0 for i in range(1000))
+
+
+def test_exact_set_survives_a_restart(tmp_path):
+    path = str(tmp_path / "visited")
+    values = [fingerprint("http://example.com/{}".format(i)) for i in range(500)]
+    visited = ExactFingerprintSet(path, initial_capacity=16)
+    for value in values: visited.add(value)
+    # adding again does not count twice
+    visited.add(values[0])
+    # grown from 16 slots, past the max load
+    assert visited.capacity > 500 / ExactFingerprintSet.MAX_LOAD
+    visited.close()
+
+    reopened = ExactFingerprintSet(path, initial_capacity=16)
+    assert len(reopened) == 500
+    assert all(value in reopened for value in values)
+    assert fingerprint("http://example.com/not-added") not in reopened
+    reopened.close()
+
+
+def test_exact_set_rejects_another_file(tmp_path):
+    path = tmp_path / "visited"
+    path.write_bytes(b"not a visited set" + b"\0" * 64)
+    with pytest.raises(ValueError):
+        ExactFingerprintSet(str(path))
+
+
+def test_bloom_filter_adds_slices_and_survives_a_restart(tmp_path):
+    path = str(tmp_path / "visited")
+    values = [fingerprint("http://example.com/{}".format(i)) for i in range(1000)]
+    visited = ScalableBloomFilter(path, initial_capacity=100, error_rate=0.001)
+    for value in values: visited.add(value)
+    assert len(visited.slices) > 1
+    # a false positive can take a new url for one already added
+    count = len(visited)
+    assert count > 990
+    visited.close()
+
+    reopened = ScalableBloomFilter(path, initial_capacity=100, error_rate=0.001)
+    assert len(reopened.slices) == len(visited.slices)
+    assert len(reopened) == count
+    assert all(value in reopened for value in values)
+    false_positives = sum(1 for i in range(10000) if fingerprint("http://other.com/{}".format(i)) in reopened)
+    assert false_positives < 50
+    reopened.close()
+
+
+def test_create_visited_set(tmp_path):
+    path = str(tmp_path / "state" / "visited")
+    assert isinstance(create_visited_set("MEMORY", path, 16, 0.01), set)
+    visited = create_visited_set("EXACT", path, 16, 0.01)
+    assert isinstance(visited, ExactFingerprintSet)
+    visited.close()
+    visited = create_visited_set("BLOOM", path + "-bloom", 16, 0.01)
+    assert isinstance(visited, ScalableBloomFilter)
+    visited.close()
+
+
+@pytest.mark.parametrize("set_type", ["EXACT", "BLOOM"])
+def test_a_reset_set_starts_empty(tmp_path, set_type):
+    path = str(tmp_path / "visited")
+    visited = create_visited_set(set_type, path, 16, 0.01)
+    for i in range(100): visited.add(fingerprint("http://example.com/{}".format(i)))
+    visited.close()
+    # the set of another worker, next to it, is kept
+    other = create_visited_set(set_type, path + ".worker-0", 16, 0.01)
+    other.add(fingerprint("http://example.com/0"))
+    other.close()
+
+    reset = create_visited_set(set_type, path, 16, 0.01, reset=True)
+    assert len(reset) == 0
+    assert fingerprint("http://example.com/0") not in reset
+    reset.close()
+    other = create_visited_set(set_type, path + ".worker-0", 16, 0.01)
+    assert len(other) == 1
+    other.close()
@@ -0,0 +1,210 @@
+"""
+url_filter.py
+----------------------------
+This is a set of classes to decide if a url should be crawled.
+Every url is parsed once into a UrlRecord (scheme, host, path and the
+registered domain of the host), and the rules of the filter run on that
+record, cheapest first, so the rules that need a network round trip
+(robots.txt, HEAD) only run for urls every cheap rule let through.
+Rules that only depend on the host (e.g. a sensitive top level domain)
+are decided once per host, and rules whose rejections are final (e.g. a
+domain that reached its page cap) remember them per registered domain
+(per ip:port for an ip address), in bounded LRU caches of hosts and domains.
+The registered domain is found with a trie of the public suffix list
+(https://publicsuffix.org/list/public_suffix_list.dat), loaded from a
+local file, so bbc.co.uk and example.co.jp are told apart. Without the
+file it falls back to the last two labels of the host.
+"""
+import ipaddress
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# trie markers, of a rule ending at a node, and of an exception rule
+RULE = "$"
+EXCEPTION = "!"
+
+
+class PublicSuffixList:
+    def __init__(self):
+        # label -> child node, from the last label of the suffix to the first
+        self.root = {}
+        self.rules = 0
+
+    @classmethod
+    def from_file(cls, file_path):
+        suffixes = cls()
+        with open(file_path, "r", encoding="utf-8") as file:
+            for line in file:
+                # a rule is the first word of the line, skip comments
+                line = line.strip()
+                if len(line) == 0 or line.startswith("//"): continue
+                suffixes.add_rule(line.split()[0])
+        return suffixes
+
+    # The list at file_path, or an empty one (last two labels) if missing.
+    # logger is any object with a warning method, e.g. the crawler's
+    @classmethod
+    def load(cls, file_path, logger=None):
+        try:
+            return cls.from_file(file_path)
+        except OSError as e:
+            if logger is None: logger = logging.getLogger(__name__)
+            logger.warning("Failed to load the public suffix list, using the last two labels of hosts: {}".format(e))
+            return cls()
+
+    def add_rule(self, rule):
+        marker = RULE
+        if rule.startswith("!"):
+            marker = EXCEPTION
+            rule = rule[1:]
+        node = self.root
+        for label in reversed(rule.lower().split(".")):
+            node = node.setdefault(label, {})
+        node[marker] = True
+        self.rules = self.rules + 1
+
+    # No of labels of the public suffix of the host, given its labels
+    # from the last one. With no matching rule the suffix is the last label
+    def suffix_length(self, labels):
+        node = self.root
+        length = 1
+        for depth, label in enumerate(labels):
+            child = node.get(label)
+            # an exception rule makes the suffix one label shorter
+            if child is not None and EXCEPTION in child: return depth
+            if child is None: child = node.get("*")
+            if child is None: break
+            if RULE in child: length = depth + 1
+            node = child
+        return length
+
+    def registered_domain(self, host):
+        labels = host.split(".")
+        length = self.suffix_length(list(reversed(labels)))
+        if len(labels) <= length: return host
+        return ".".join(labels[-(length + 1):])
+
+
+class UrlRecord:
+    __slots__ = ("url", "scheme", "host", "path", "domain")
+
+    def __init__(self, url, scheme, host, path, domain):
+        self.url = url
+        self.scheme = scheme
+        self.host = host
+        self.path = path
+        self.domain = domain
+
+
+class HostEntry:
+    # What is known of a host: its registered domain, and the
+    # verdicts of the host level rules (rule name -> rejected)
+    __slots__ = ("domain", "verdicts")
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.verdicts = {}
+
+
+class UrlFilter:
+    def __init__(self, suffixes, max_hosts):
+        self.suffixes = suffixes
+        self.max_hosts = max_hosts
+        # (cost, order added, name, check, memo)
+        self.rules = []
+        # host -> HostEntry, least recently used first
+        self.hosts = OrderedDict()
+        # domain -> names of the "REJECTION" rules that rejected it,
+        # least recently used first
+        self.domains = OrderedDict()
+        self.lock = threading.Lock()
+        self.host_hits = 0
+        self.host_misses = 0
+
+    # check(record) -> True to reject the url. Rules run by increasing
+    # cost. memo is None (run for every url), "HOST" (the verdict only
+    # depends on the host, run once per host) or "REJECTION" (once the
+    # record's domain is rejected it stays rejected, e.g. a domain cap)
+    def add_rule(self, name, cost, check, memo=None):
+        self.rules.append((cost, len(self.rules), name, check, memo))
+        self.rules.sort()
+
+    # Returns the name of the first rule rejecting the url, or None
+    def check(self, url):
+        record = self.parse(url)
+        if record is None: return "unparsable"
+        verdicts = self.host_entry(record.host).verdicts
+        rejections = None
+        for _, _, name, check, memo in self.rules:
+            if memo == "HOST":
+                if name not in verdicts: verdicts[name] = check(record)
+                if verdicts[name]: return name
+                continue
+            if memo == "REJECTION":
+                if rejections is None: rejections = self.domain_rejections(record.domain)
+                if name in rejections: return name
+            if check(record):
+                if memo == "REJECTION": rejections.add(name)
+                return name
+        return None
+
+    def parse(self, url):
+        try:
+            parts = urlsplit(url)
+            host = parts.hostname
+        except ValueError:
+            return None
+        if not host: return None
+        return UrlRecord(url, parts.scheme, host, parts.path, self.domain_of_host(host, parts.netloc))
+
+    # Registered domain of the url's host, the key of the domain counts
+    def domain_of(self, url):
+        try:
+            parts = urlsplit(url)
+            host = parts.hostname
+        except ValueError:
+            return url
+        if not host: return url
+        return self.domain_of_host(host, parts.netloc)
+
+    def domain_of_host(self, host, netloc):
+        entry = self.host_entry(host)
+        # an ip address has no registered domain, every address:port is one
+        if entry.domain is None: return netloc.rsplit("@", 1)[-1].lower()
+        return entry.domain
+
+    def host_entry(self, host):
+        with self.lock:
+            entry = self.hosts.get(host)
+            if entry is not None:
+                self.hosts.move_to_end(host)
+                self.host_hits = self.host_hits + 1
+                return entry
+            self.host_misses = self.host_misses + 1
+        entry = HostEntry(None if is_ip_address(host) else self.suffixes.registered_domain(host))
+        with self.lock:
+            self.hosts[host] = entry
+            while len(self.hosts) > self.max_hosts: self.hosts.popitem(last=False)
+        return entry
+
+    # The set of "REJECTION" rules that rejected the domain
+    def domain_rejections(self, domain):
+        with self.lock:
+            rejections = self.domains.get(domain)
+            if rejections is not None:
+                self.domains.move_to_end(domain)
+                return rejections
+            rejections = set()
+            self.domains[domain] = rejections
+            while len(self.domains) > self.max_hosts: self.domains.popitem(last=False)
+            return rejections
+
+
+def is_ip_address(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
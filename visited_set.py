@@ -0,0 +1,251 @@
+"""
+visited_set.py
+----------------------------
+This is a set of classes to keep track of the urls visited by the crawler
+in a fixed amount of memory, and across restarts of the crawler.
+Urls are keyed by a stable 64 bit fingerprint (python's hash() is
+randomized per process, so it cannot be saved). Two structures are
+provided, both kept in memory mapped files so they survive a restart:
+ - ExactFingerprintSet: an open addressing hash table of fingerprints
+ - ScalableBloomFilter: a series of bloom filters, each bigger and
+   tighter than the last, with a configurable false positive rate
+"""
+import glob
+import math
+import mmap
+import os
+import struct
+import threading
+from hashlib import blake2b
+
+
+# Stable 64 bit fingerprint of a url. Never 0, as 0 marks an empty slot
+def fingerprint(url):
+    value = int.from_bytes(blake2b(url.encode("utf-8", errors="ignore"), digest_size=8).digest(), "little")
+    return value if value != 0 else 1
+
+
+# Create a file of the given size, filled with zeros, and map it
+def map_file(path, size):
+    exists = os.path.exists(path) and os.path.getsize(path) >= size
+    file = open(path, "r+b" if exists else "w+b")
+    if not exists: file.truncate(size)
+    return file, mmap.mmap(file.fileno(), size)
+
+
+class ExactFingerprintSet:
+    MAGIC = b"VSETEXT1"
+    # magic, no of fingerprints stored
+    HEADER = struct.Struct("<8sQ")
+    MAX_LOAD = 0.7
+
+    def __init__(self, path, initial_capacity=1 << 20):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            capacity = (os.path.getsize(path) - self.HEADER.size) // 8
+        else:
+            capacity = 1 << max(4, math.ceil(math.log2(initial_capacity)))
+        self.open_table(capacity)
+        magic, self.count = self.HEADER.unpack_from(self.map, 0)
+        if magic != self.MAGIC:
+            if magic.strip(b"\0"): raise ValueError("{} is not a visited set file".format(path))
+            self.count = 0
+            self.write_header()
+
+    def open_table(self, capacity):
+        self.capacity = capacity
+        self.file, self.map = map_file(self.path, self.HEADER.size + capacity * 8)
+        self.table = memoryview(self.map)[self.HEADER.size:].cast("Q")
+
+    def write_header(self):
+        self.HEADER.pack_into(self.map, 0, self.MAGIC, self.count)
+
+    # Returns the slot holding the fingerprint, or the empty slot where it goes
+    def find_slot(self, table, capacity, value):
+        idx = value & (capacity - 1)
+        while True:
+            slot = table[idx]
+            if slot == 0 or slot == value: return idx
+            idx = (idx + 1) & (capacity - 1)
+
+    def add(self, value):
+        with self.lock:
+            idx = self.find_slot(self.table, self.capacity, value)
+            if self.table[idx] == value: return
+            self.table[idx] = value
+            self.count = self.count + 1
+            self.write_header()
+            if self.count > self.capacity * self.MAX_LOAD: self.grow()
+
+    def __contains__(self, value):
+        with self.lock:
+            return self.table[self.find_slot(self.table, self.capacity, value)] == value
+
+    # Rehash into a table twice as big, written next to the current one
+    def grow(self):
+        new_capacity = self.capacity * 2
+        tmp_path = self.path + ".tmp"
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        tmp_file, tmp_map = map_file(tmp_path, self.HEADER.size + new_capacity * 8)
+        new_table = memoryview(tmp_map)[self.HEADER.size:].cast("Q")
+        for value in self.table:
+            if value != 0: new_table[self.find_slot(new_table, new_capacity, value)] = value
+        self.HEADER.pack_into(tmp_map, 0, self.MAGIC, self.count)
+        new_table.release()
+        tmp_map.flush()
+        tmp_map.close()
+        tmp_file.close()
+        self.close_table()
+        os.replace(tmp_path, self.path)
+        self.open_table(new_capacity)
+
+    def close_table(self):
+        self.table.release()
+        self.map.close()
+        self.file.close()
+
+    def flush(self):
+        with self.lock:
+            self.map.flush()
+
+    def close(self):
+        with self.lock:
+            self.map.flush()
+            self.close_table()
+
+    def __len__(self):
+        return self.count
+
+
+class BloomSlice:
+    MAGIC = b"VSETBLM1"
+    # magic, capacity, no of bits, no of hashes, no of fingerprints added
+    HEADER = struct.Struct("<8sQQQQ")
+
+    # With path None the filter is only kept in memory
+    def __init__(self, path, capacity, error_rate):
+        self.path = path
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as file:
+                magic, capacity, bits, hashes, count = self.HEADER.unpack(file.read(self.HEADER.size))
+            if magic != self.MAGIC: raise ValueError("{} is not a bloom filter file".format(path))
+        else:
+            bits = max(64, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+            hashes = max(1, math.ceil(-math.log2(error_rate)))
+            count = 0
+        self.capacity = capacity
+        self.bits = bits
+        self.hashes = hashes
+        self.count = count
+        if path is None:
+            self.file = None
+            self.map = mmap.mmap(-1, self.HEADER.size + (bits + 7) // 8)
+        else:
+            self.file, self.map = map_file(path, self.HEADER.size + (bits + 7) // 8)
+        self.write_header()
+
+    def write_header(self):
+        self.HEADER.pack_into(self.map, 0, self.MAGIC, self.capacity, self.bits, self.hashes, self.count)
+
+    # Bit positions of the fingerprint, using double hashing
+    def positions(self, value):
+        h1 = value & 0xFFFFFFFF
+        h2 = (value >> 32) | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, value):
+        offset = self.HEADER.size
+        for pos in self.positions(value):
+            if not (self.map[offset + (pos >> 3)] >> (pos & 7)) & 1: return False
+        return True
+
+    def add(self, value):
+        offset = self.HEADER.size
+        for pos in self.positions(value):
+            self.map[offset + (pos >> 3)] = self.map[offset + (pos >> 3)] | (1 << (pos & 7))
+        self.count = self.count + 1
+        self.write_header()
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        if self.file is not None: self.file.close()
+
+
+class ScalableBloomFilter:
+    # Each new slice holds growth times more urls than the last,
+    # with a false positive rate tightening times lower, so the
+    # overall false positive rate stays under error_rate
+    def __init__(self, path, initial_capacity=1 << 20, error_rate=0.001, growth=2, tightening=0.5):
+        self.path = path
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.lock = threading.Lock()
+        self.slices = []
+        # reopen the slices saved by a previous run, path.0, path.1, ...
+        for idx, slice_path in saved_slices(path):
+            self.slices.append(BloomSlice(slice_path, 0, 0))
+        if len(self.slices) == 0: self.add_slice()
+
+    def add_slice(self):
+        idx = len(self.slices)
+        capacity = int(self.initial_capacity * (self.growth ** idx))
+        error_rate = self.error_rate * (1 - self.tightening) * (self.tightening ** idx)
+        self.slices.append(BloomSlice("{}.{}".format(self.path, idx), capacity, error_rate))
+
+    def add(self, value):
+        with self.lock:
+            for bloom in self.slices:
+                if value in bloom: return
+            if self.slices[-1].is_full(): self.add_slice()
+            self.slices[-1].add(value)
+
+    def __contains__(self, value):
+        with self.lock:
+            for bloom in self.slices:
+                if value in bloom: return True
+            return False
+
+    def flush(self):
+        with self.lock:
+            for bloom in self.slices: bloom.map.flush()
+
+    def close(self):
+        with self.lock:
+            for bloom in self.slices: bloom.close()
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.slices)
+
+
+# Build the visited set selected in the parameters. With reset, the
+# set saved at path by a previous crawl is deleted and a new one started
+def create_visited_set(set_type, path, initial_capacity, error_rate, reset=False):
+    if set_type in ("BLOOM", "EXACT"): os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if reset: remove_visited_set(path)
+    if set_type == "BLOOM": return ScalableBloomFilter(path, initial_capacity, error_rate)
+    if set_type == "EXACT": return ExactFingerprintSet(path, initial_capacity)
+    return set()
+
+
+# (idx, path) of the bloom slices saved at path, path.0, path.1, ...
+# but not those of another set named after it, e.g. path.worker-0.0
+def saved_slices(path):
+    saved = []
+    for slice_path in glob.glob(glob.escape(path) + ".*"):
+        suffix = slice_path[len(path) + 1:]
+        if suffix.isdigit(): saved.append((int(suffix), slice_path))
+    return sorted(saved)
+
+
+# Delete the files of a saved visited set: the hash table at path (and
+# one left half grown), or its bloom slices
+def remove_visited_set(path):
+    for file_path in [path, path + ".tmp"] + [slice_path for _, slice_path in saved_slices(path)]:
+        if os.path.exists(file_path): os.remove(file_path)